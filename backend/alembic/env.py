@@ -0,0 +1,60 @@
+"""
+Alembic environment
+Migrations run on the app's async engine URL; init_db() passes its own connection in
+config.attributes["connection"] so startup migrations share the app's transaction
+"""
+import asyncio
+from logging.config import fileConfig
+
+from alembic import context
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from app.core.config import settings
+from app.core.database import async_database_url
+from app.models.base import Base
+import app.models  # noqa: F401  (registers all models on Base.metadata)
+
+config = context.config
+if config.config_file_name and not config.attributes.get("connection"):
+    fileConfig(config.config_file_name)
+
+target_metadata = Base.metadata
+
+
+def _configure(connection):
+    context.configure(
+        connection=connection,
+        target_metadata=target_metadata,
+        # SQLite can't alter columns in place; batch operations recreate the table
+        render_as_batch=connection.dialect.name == "sqlite",
+        compare_type=True
+    )
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+def run_migrations_offline():
+    """Emit the migration SQL without a database connection (alembic upgrade --sql)"""
+    context.configure(
+        url=async_database_url(settings.DATABASE_URL),
+        target_metadata=target_metadata,
+        literal_binds=True,
+        dialect_opts={"paramstyle": "named"}
+    )
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+async def run_migrations_online():
+    engine = create_async_engine(async_database_url(settings.DATABASE_URL))
+    async with engine.connect() as connection:
+        await connection.run_sync(_configure)
+    await engine.dispose()
+
+
+if context.is_offline_mode():
+    run_migrations_offline()
+elif config.attributes.get("connection") is not None:
+    _configure(config.attributes["connection"])
+else:
+    asyncio.run(run_migrations_online())
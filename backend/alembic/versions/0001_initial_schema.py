@@ -0,0 +1,125 @@
+"""
+Initial schema: users, documents, learning content and progress
+
+Databases created with create_all before migrations existed are stamped at this
+revision by init_db() and upgraded from here
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0001"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def _base_columns():
+    return [
+        sa.Column("id", sa.String(36), primary_key=True),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+        sa.Column("updated_at", sa.DateTime(), nullable=False),
+    ]
+
+
+def upgrade():
+    op.create_table(
+        "users",
+        *_base_columns(),
+        sa.Column("username", sa.String(100), nullable=False),
+        sa.Column("email", sa.String(255), nullable=False),
+        sa.Column("hashed_password", sa.String(255), nullable=False),
+        sa.Column(
+            "grade_level",
+            sa.Enum("ELEMENTARY", "MIDDLE", "HIGH_SCHOOL", name="gradelevel"),
+            nullable=False
+        ),
+        sa.Column(
+            "native_language",
+            sa.Enum("HEBREW", "ENGLISH", "BILINGUAL", name="language"),
+            nullable=False
+        ),
+        sa.Column("subjects", sa.JSON()),
+        sa.Column("preferences", sa.JSON()),
+    )
+    op.create_index("ix_users_username", "users", ["username"], unique=True)
+    op.create_index("ix_users_email", "users", ["email"], unique=True)
+
+    op.create_table(
+        "documents",
+        *_base_columns(),
+        sa.Column("user_id", sa.String(36), sa.ForeignKey("users.id"), nullable=False),
+        sa.Column(
+            "subject",
+            sa.Enum("MATHEMATICS", "ENGLISH", "HEBREW", name="subject"),
+            nullable=False
+        ),
+        sa.Column("raw_image_uri", sa.String(500), nullable=False),
+        sa.Column("ocr_data", sa.JSON()),
+        sa.Column("analysis_results", sa.JSON()),
+        sa.Column("generated_content", sa.JSON()),
+        sa.Column(
+            "processing_status",
+            sa.Enum("PENDING", "PROCESSING", "COMPLETED", "ERROR", name="processingstatus")
+        ),
+        sa.Column("error_message", sa.Text()),
+    )
+    op.create_index("ix_documents_user_id", "documents", ["user_id"])
+
+    op.create_table(
+        "learning_contents",
+        *_base_columns(),
+        sa.Column(
+            "document_id", sa.String(36), sa.ForeignKey("documents.id"), nullable=False
+        ),
+        sa.Column("user_id", sa.String(36), sa.ForeignKey("users.id"), nullable=False),
+        sa.Column(
+            "content_type",
+            sa.Enum("GAME", "QUIZ", "REVIEW", name="contenttype"),
+            nullable=False
+        ),
+        sa.Column("subject", sa.String(50), nullable=False),
+        sa.Column("title", sa.String(255), nullable=False),
+        sa.Column("description", sa.Text()),
+        sa.Column("content_json", sa.JSON(), nullable=False),
+        sa.Column("metadata", sa.JSON()),
+        sa.Column("views", sa.Integer()),
+        sa.Column("completions", sa.Integer()),
+        sa.Column("average_score", sa.Float()),
+        sa.Column("completion_rate", sa.Float()),
+    )
+    op.create_index("ix_learning_contents_document_id", "learning_contents", ["document_id"])
+    op.create_index("ix_learning_contents_user_id", "learning_contents", ["user_id"])
+
+    op.create_table(
+        "user_progress",
+        *_base_columns(),
+        sa.Column("user_id", sa.String(36), sa.ForeignKey("users.id"), nullable=False),
+        sa.Column(
+            "content_id", sa.String(36), sa.ForeignKey("learning_contents.id"), nullable=False
+        ),
+        sa.Column(
+            "status",
+            sa.Enum("STARTED", "IN_PROGRESS", "COMPLETED", name="progressstatus")
+        ),
+        sa.Column("score", sa.Float()),
+        sa.Column("time_spent_seconds", sa.Integer()),
+        sa.Column("answers", sa.JSON()),
+        sa.Column("feedback_provided", sa.JSON()),
+        sa.Column("completed_at", sa.DateTime()),
+    )
+    op.create_index("ix_user_progress_user_id", "user_progress", ["user_id"])
+    op.create_index("ix_user_progress_content_id", "user_progress", ["content_id"])
+
+
+def downgrade():
+    op.drop_table("user_progress")
+    op.drop_table("learning_contents")
+    op.drop_table("documents")
+    op.drop_table("users")
+    for name in ["progressstatus", "contenttype", "processingstatus", "subject", "language",
+                 "gradelevel"]:
+        sa.Enum(name=name).drop(op.get_bind(), checkfirst=True)
@@ -0,0 +1,99 @@
+"""
+Pipeline progress, content engagement totals, pregenerated content and user stats
+
+- documents: processing stage/progress/attempts for the job queue; generated_content
+  is dropped (responses derive it from learning_contents.document_id)
+- learning_contents: answer_key, pregenerated/claimed_at, and score_total, backfilled
+  from average_score * completions so averages stay exact
+- user_stats: per-user dashboard aggregates
+- composite indexes for keyset pagination and per-document content lookups
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table("documents") as batch:
+        batch.add_column(sa.Column("processing_stage", sa.String(50)))
+        batch.add_column(sa.Column("processing_progress", sa.Integer()))
+        batch.add_column(sa.Column("processing_attempts", sa.Integer()))
+        batch.drop_column("generated_content")
+    op.create_index(
+        "ix_documents_user_created", "documents", ["user_id", "created_at", "id"]
+    )
+
+    op.add_column("learning_contents", sa.Column("answer_key", sa.JSON()))
+    op.add_column(
+        "learning_contents",
+        sa.Column("pregenerated", sa.Boolean(), nullable=False, server_default=sa.false())
+    )
+    op.add_column("learning_contents", sa.Column("claimed_at", sa.DateTime()))
+    op.add_column(
+        "learning_contents",
+        sa.Column("score_total", sa.Float(), server_default=sa.text("0"))
+    )
+    op.execute(
+        "UPDATE learning_contents SET score_total = average_score * completions "
+        "WHERE average_score IS NOT NULL AND completions IS NOT NULL"
+    )
+    op.drop_index("ix_learning_contents_document_id", table_name="learning_contents")
+    op.create_index(
+        "ix_learning_contents_document_type",
+        "learning_contents",
+        ["document_id", "content_type", "created_at"]
+    )
+
+    op.create_index(
+        "ix_user_progress_user_created", "user_progress", ["user_id", "created_at", "id"]
+    )
+    op.create_index(
+        "ix_user_progress_content_created", "user_progress", ["content_id", "created_at", "id"]
+    )
+
+    op.create_table(
+        "user_stats",
+        sa.Column("id", sa.String(36), primary_key=True),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+        sa.Column("updated_at", sa.DateTime(), nullable=False),
+        sa.Column("user_id", sa.String(36), sa.ForeignKey("users.id"), nullable=False),
+        sa.Column("total_documents", sa.Integer(), nullable=False),
+        sa.Column("total_games_played", sa.Integer(), nullable=False),
+        sa.Column("total_quizzes_completed", sa.Integer(), nullable=False),
+        sa.Column("progress_count", sa.Integer(), nullable=False),
+        sa.Column("score_total", sa.Float(), nullable=False),
+        sa.Column("total_time_seconds", sa.Integer(), nullable=False),
+        sa.Column("recent_activities", sa.JSON()),
+        sa.Column("subject_breakdown", sa.JSON()),
+    )
+    op.create_index("ix_user_stats_user_id", "user_stats", ["user_id"], unique=True)
+
+
+def downgrade():
+    op.drop_table("user_stats")
+
+    op.drop_index("ix_user_progress_content_created", table_name="user_progress")
+    op.drop_index("ix_user_progress_user_created", table_name="user_progress")
+
+    op.drop_index("ix_learning_contents_document_type", table_name="learning_contents")
+    op.create_index("ix_learning_contents_document_id", "learning_contents", ["document_id"])
+    with op.batch_alter_table("learning_contents") as batch:
+        batch.drop_column("score_total")
+        batch.drop_column("claimed_at")
+        batch.drop_column("pregenerated")
+        batch.drop_column("answer_key")
+
+    op.drop_index("ix_documents_user_created", table_name="documents")
+    with op.batch_alter_table("documents") as batch:
+        batch.add_column(sa.Column("generated_content", sa.JSON()))
+        batch.drop_column("processing_attempts")
+        batch.drop_column("processing_progress")
+        batch.drop_column("processing_stage")
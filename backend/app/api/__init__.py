@@ -2,7 +2,7 @@
 API Routes
 """
 from fastapi import APIRouter
-from .endpoints import auth, documents, content, progress
+from .endpoints import auth, documents, content, progress, files
 
 api_router = APIRouter()
 
@@ -11,3 +11,4 @@ api_router.include_router(auth.router, prefix="/auth", tags=["Authentication"])
 api_router.include_router(documents.router, prefix="/documents", tags=["Documents"])
 api_router.include_router(content.router, prefix="/content", tags=["Learning Content"])
 api_router.include_router(progress.router, prefix="/progress", tags=["Progress & Analytics"])
+api_router.include_router(files.router, prefix="/files", tags=["Files"])
@@ -2,28 +2,175 @@
 Learning Content Generation Endpoints
 """
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from typing import List
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Any, AsyncIterator, Dict, List, Optional
+import functools
+import json
 
 from app.core import get_db
 from app.models import Document, LearningContent, User
-from app.schemas import ContentResponse, GameGenerate, QuizGenerate, ReviewGenerate
+from app.models.content import ContentType
+from app.schemas import (
+    ContentPackGenerate, ContentResponse, ContentSummary, GameGenerate, QuizGenerate, ReviewGenerate
+)
 from app.services import GameService
+from app.services.content_builder import build_content, generation_params
+from app.services.concurrency import ProviderBusyError
+from app.services.engagement import engagement_counters
+from app.services.pregeneration import content_pregenerator
 
 router = APIRouter()
 game_service = GameService()
 
+# Columns read for list views; content_json (the full game/quiz/review body) is
+# projected only when requested
+CONTENT_SUMMARY_COLUMNS = (
+    LearningContent.id,
+    LearningContent.document_id,
+    LearningContent.user_id,
+    LearningContent.content_type,
+    LearningContent.subject,
+    LearningContent.title,
+    LearningContent.description,
+    LearningContent.content_metadata,
+    LearningContent.views,
+    LearningContent.completions,
+    LearningContent.average_score,
+    LearningContent.completion_rate,
+    LearningContent.created_at,
+)
+
+
+async def _get_completed_document(db: AsyncSession, document_id: str) -> Document:
+    """Load a document that is ready for content generation"""
+    document = await db.get(Document, document_id)
+    if not document:
+        raise HTTPException(status_code=404, detail="Document not found")
+
+    if document.processing_status != "completed":
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Document processing not completed"
+        )
+    return document
+
+
+async def _save_contents(
+    db: AsyncSession, contents: List[LearningContent]
+) -> List[LearningContent]:
+    """Persist generated content in one transaction"""
+    db.add_all(contents)
+    await db.commit()
+    return contents
+
+
+async def _save_one(
+    db: AsyncSession,
+    document: Document,
+    content_type: str,
+    data: Dict[str, Any],
+    generation: Dict[str, Any]
+) -> LearningContent:
+    """Persist one generated game, quiz or review for a document"""
+    return (await _save_contents(db, [build_content(document, content_type, data, generation)]))[0]
+
+
+def _pack_generation(
+    content_type: str, pack_request: ContentPackGenerate, topics: List[str]
+) -> Dict[str, Any]:
+    return generation_params(content_type, pack_request.game_type, pack_request.difficulty, topics)
+
+
+async def _claim_pack(
+    db: AsyncSession, document: Document, pack_request: ContentPackGenerate, topics: List[str]
+) -> Dict[str, LearningContent]:
+    """Pre-built content for each requested type of a content pack, where available"""
+    claimed = {}
+    for content_type in dict.fromkeys(pack_request.content_types):
+        content = await content_pregenerator.claim(
+            db, document.id, content_type, _pack_generation(content_type, pack_request, topics)
+        )
+        if content is not None:
+            claimed[content_type] = content
+    return claimed
+
+
+async def _save_pack(
+    db: AsyncSession,
+    document: Document,
+    pack: Dict[str, Dict[str, Any]],
+    pack_request: ContentPackGenerate,
+    topics: List[str],
+    claimed: Dict[str, LearningContent]
+) -> List[LearningContent]:
+    """
+    Persist the generated parts of a content pack in one transaction
+    Returns them together with the claimed pre-built parts, in the requested order
+    """
+    saved = await _save_contents(db, [
+        build_content(
+            document, content_type, data, _pack_generation(content_type, pack_request, topics)
+        )
+        for content_type, data in pack.items()
+    ])
+    contents = {**claimed, **dict(zip(pack, saved))}
+    return [contents[content_type] for content_type in dict.fromkeys(pack_request.content_types)]
+
+
+async def _prebuilt(content: LearningContent, data: Dict[str, Any]) -> LearningContent:
+    # "save" callback for replayed pre-built content, which is already stored
+    return content
+
+
+async def _prebuilt_events(content: LearningContent):
+    """Generator events that replay pre-built content for the streaming endpoints"""
+    for question in content.content_json.get("questions", []):
+        yield "question", question
+    yield "complete", content.content_json
+
+
+def _sse_event(event: str, data: Dict[str, Any]) -> str:
+    """Format one Server-Sent Events message"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False, default=str)}\n\n"
+
+
+async def _stream_generation(events, save) -> AsyncIterator[str]:
+    """
+    Relay generator events as SSE and persist the content when the stream completes
+    Questions (or pack parts) are sent as soon as they are parsed; the final event
+    carries the saved content, or a list of it for content packs
+    """
+    try:
+        async for event, data in events:
+            if event != "complete":
+                yield _sse_event(event, data)
+                continue
+
+            saved = await save(data)
+            if isinstance(saved, list):
+                payload = [
+                    ContentResponse.model_validate(content).model_dump(mode="json")
+                    for content in saved
+                ]
+            else:
+                payload = ContentResponse.model_validate(saved).model_dump(mode="json")
+            yield _sse_event("complete", payload)
+    except ProviderBusyError as e:
+        yield _sse_event("error", {"detail": str(e), "retry_after": e.retry_after})
+
 
 @router.post("/{document_id}/games", response_model=ContentResponse, status_code=status.HTTP_201_CREATED)
 async def generate_game(
     document_id: str,
     game_request: GameGenerate,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Generate an interactive game based on document content
     """
-    document = db.query(Document).filter(Document.id == document_id).first()
+    document = await db.get(Document, document_id)
     if not document:
         raise HTTPException(status_code=404, detail="Document not found")
 
@@ -33,6 +180,11 @@ async def generate_game(
             detail="Document processing not completed"
         )
 
+    generation = generation_params("game", game_type=game_request.game_type)
+    content = await content_pregenerator.claim(db, document.id, "game", generation)
+    if content is not None:
+        return content
+
     # Generate game using Claude
     homework_content = document.ocr_data.get("raw_text", "")
     game_data = await game_service.generate_game(
@@ -43,32 +195,7 @@ async def generate_game(
     )
 
     # Save to database
-    content = LearningContent(
-        document_id=document.id,
-        user_id=document.user_id,
-        content_type="game",
-        subject=document.subject,
-        title=game_data.get("title", "Interactive Game"),
-        description=game_data.get("description", ""),
-        content_json=game_data,
-        metadata={
-            "estimated_duration_minutes": 10,
-            "learning_objectives": document.analysis_results.get("learning_objectives", []),
-            "topics": document.analysis_results.get("topics", [])
-        }
-    )
-
-    db.add(content)
-
-    # Update document's generated content
-    generated = document.generated_content
-    if "games" not in generated:
-        generated["games"] = []
-    generated["games"].append(content.id)
-    document.generated_content = generated
-
-    db.commit()
-    db.refresh(content)
+    content = await _save_one(db, document, "game", game_data, generation)
 
     return content
 
@@ -77,20 +204,17 @@ async def generate_game(
 async def generate_quiz(
     document_id: str,
     quiz_request: QuizGenerate,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Generate a quiz based on document content
     """
-    document = db.query(Document).filter(Document.id == document_id).first()
-    if not document:
-        raise HTTPException(status_code=404, detail="Document not found")
+    document = await _get_completed_document(db, document_id)
 
-    if document.processing_status != "completed":
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Document processing not completed"
-        )
+    generation = generation_params("quiz", difficulty=quiz_request.difficulty)
+    content = await content_pregenerator.claim(db, document.id, "quiz", generation)
+    if content is not None:
+        return content
 
     # Generate quiz using Claude
     homework_content = document.ocr_data.get("raw_text", "")
@@ -102,59 +226,95 @@ async def generate_quiz(
     )
 
     # Save to database
-    content = LearningContent(
-        document_id=document.id,
-        user_id=document.user_id,
-        content_type="quiz",
-        subject=document.subject,
-        title=quiz_data.get("title", "Practice Quiz"),
-        description="Test your knowledge with this interactive quiz",
-        content_json=quiz_data,
-        metadata={
-            "estimated_duration_minutes": quiz_data.get("estimated_duration_minutes", 10),
-            "learning_objectives": document.analysis_results.get("learning_objectives", []),
-            "topics": document.analysis_results.get("topics", [])
-        }
-    )
+    content = await _save_one(db, document, "quiz", quiz_data, generation)
+
+    return content
 
-    db.add(content)
 
-    # Update document's generated content
-    generated = document.generated_content
-    if "quizzes" not in generated:
-        generated["quizzes"] = []
-    generated["quizzes"].append(content.id)
-    document.generated_content = generated
+@router.post("/{document_id}/games/stream")
+async def stream_game(
+    document_id: str,
+    game_request: GameGenerate,
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Generate a game and stream its challenges over Server-Sent Events
+    Emits a "question" event per challenge and a final "complete" event with the saved content
+    """
+    document = await _get_completed_document(db, document_id)
+
+    generation = generation_params("game", game_type=game_request.game_type)
+    prebuilt = await content_pregenerator.claim(db, document.id, "game", generation)
+    if prebuilt is not None:
+        events, save = _prebuilt_events(prebuilt), functools.partial(_prebuilt, prebuilt)
+    else:
+        events = game_service.stream_game(
+            homework_content=document.ocr_data.get("raw_text", ""),
+            subject=document.subject,
+            analysis_results=document.analysis_results,
+            game_type=game_request.game_type
+        )
+        save = functools.partial(_save_one, db, document, "game", generation=generation)
 
-    db.commit()
-    db.refresh(content)
+    return StreamingResponse(
+        _stream_generation(events, save),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
-    return content
+
+@router.post("/{document_id}/quizzes/stream")
+async def stream_quiz(
+    document_id: str,
+    quiz_request: QuizGenerate,
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Generate a quiz and stream its questions over Server-Sent Events
+    Emits a "question" event per question and a final "complete" event with the saved content
+    """
+    document = await _get_completed_document(db, document_id)
+
+    generation = generation_params("quiz", difficulty=quiz_request.difficulty)
+    prebuilt = await content_pregenerator.claim(db, document.id, "quiz", generation)
+    if prebuilt is not None:
+        events, save = _prebuilt_events(prebuilt), functools.partial(_prebuilt, prebuilt)
+    else:
+        events = game_service.stream_quiz(
+            homework_content=document.ocr_data.get("raw_text", ""),
+            subject=document.subject,
+            analysis_results=document.analysis_results,
+            difficulty=quiz_request.difficulty
+        )
+        save = functools.partial(_save_one, db, document, "quiz", generation=generation)
+
+    return StreamingResponse(
+        _stream_generation(events, save),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
 
 @router.post("/{document_id}/review-materials", response_model=ContentResponse, status_code=status.HTTP_201_CREATED)
 async def generate_review_material(
     document_id: str,
     review_request: ReviewGenerate,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Generate review/study material based on document content
     """
-    document = db.query(Document).filter(Document.id == document_id).first()
-    if not document:
-        raise HTTPException(status_code=404, detail="Document not found")
-
-    if document.processing_status != "completed":
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Document processing not completed"
-        )
+    document = await _get_completed_document(db, document_id)
 
     # Generate review material using Claude
     homework_content = document.ocr_data.get("raw_text", "")
     topics = review_request.topics if review_request.topics else document.analysis_results.get("topics", [])
 
+    generation = generation_params("review", topics=topics)
+    content = await content_pregenerator.claim(db, document.id, "review", generation)
+    if content is not None:
+        return content
+
     review_data = await game_service.generate_review_material(
         homework_content=homework_content,
         subject=document.subject,
@@ -162,59 +322,128 @@ async def generate_review_material(
     )
 
     # Save to database
-    content = LearningContent(
-        document_id=document.id,
-        user_id=document.user_id,
-        content_type="review",
-        subject=document.subject,
-        title=review_data.get("title", "Study Guide"),
-        description="Comprehensive study guide for review",
-        content_json=review_data,
-        metadata={
-            "estimated_duration_minutes": review_data.get("estimated_study_time_minutes", 15),
-            "learning_objectives": document.analysis_results.get("learning_objectives", []),
-            "topics": topics
-        }
-    )
+    content = await _save_one(db, document, "review", review_data, generation)
+
+    return content
 
-    db.add(content)
 
-    # Update document's generated content
-    generated = document.generated_content
-    if "review_materials" not in generated:
-        generated["review_materials"] = []
-    generated["review_materials"].append(content.id)
-    document.generated_content = generated
+@router.post(
+    "/{document_id}/packs",
+    response_model=List[ContentResponse],
+    status_code=status.HTTP_201_CREATED
+)
+async def generate_content_pack(
+    document_id: str,
+    pack_request: ContentPackGenerate,
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Generate several content types (quiz, game, review) for a document in one model call
+    All parts are saved in one transaction and returned in the requested order
+    """
+    document = await _get_completed_document(db, document_id)
+    topics = pack_request.topics or document.analysis_results.get("topics", [])
+
+    claimed = await _claim_pack(db, document, pack_request, topics)
+    remaining = [
+        content_type for content_type in pack_request.content_types if content_type not in claimed
+    ]
+    pack = {}
+    if remaining:
+        pack = await game_service.generate_content_pack(
+            homework_content=document.ocr_data.get("raw_text", ""),
+            subject=document.subject,
+            analysis_results=document.analysis_results,
+            content_types=remaining,
+            game_type=pack_request.game_type,
+            difficulty=pack_request.difficulty,
+            topics=topics
+        )
 
-    db.commit()
-    db.refresh(content)
+    return await _save_pack(db, document, pack, pack_request, topics, claimed)
 
-    return content
+
+@router.post("/{document_id}/packs/stream")
+async def stream_content_pack(
+    document_id: str,
+    pack_request: ContentPackGenerate,
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Generate a content pack and stream it over Server-Sent Events
+    Emits a "part" event per content type as soon as it is generated and a final
+    "complete" event with the list of saved content
+    """
+    document = await _get_completed_document(db, document_id)
+    topics = pack_request.topics or document.analysis_results.get("topics", [])
+
+    claimed = await _claim_pack(db, document, pack_request, topics)
+    remaining = [
+        content_type for content_type in pack_request.content_types if content_type not in claimed
+    ]
+
+    async def events():
+        # Pre-built parts first, then the rest as the model generates them
+        for content_type, content in claimed.items():
+            yield "part", {"content_type": content_type, "content": content.content_json}
+        if not remaining:
+            yield "complete", {}
+            return
+        async for event in game_service.stream_content_pack(
+            homework_content=document.ocr_data.get("raw_text", ""),
+            subject=document.subject,
+            analysis_results=document.analysis_results,
+            content_types=remaining,
+            game_type=pack_request.game_type,
+            difficulty=pack_request.difficulty,
+            topics=topics
+        ):
+            yield event
+
+    return StreamingResponse(
+        _stream_generation(
+            events(), lambda pack: _save_pack(db, document, pack, pack_request, topics, claimed)
+        ),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
 
 @router.get("/{content_id}", response_model=ContentResponse)
-async def get_content(content_id: str, db: Session = Depends(get_db)):
+async def get_content(content_id: str, db: AsyncSession = Depends(get_db)):
     """
     Get learning content by ID
     """
-    content = db.query(LearningContent).filter(LearningContent.id == content_id).first()
+    content = await db.get(LearningContent, content_id)
     if not content:
         raise HTTPException(status_code=404, detail="Content not found")
 
-    # Increment view count
-    content.views += 1
-    db.commit()
+    # Counted in the engagement buffer; the row is updated by the next batched flush
+    await engagement_counters.record_view(content.id)
 
-    return content
+    response = ContentResponse.model_validate(content)
+    return response.model_copy(update=await engagement_counters.metrics(content))
 
 
-@router.get("/document/{document_id}/all", response_model=List[ContentResponse])
-async def list_document_content(document_id: str, db: Session = Depends(get_db)):
+@router.get("/document/{document_id}/all", response_model=List[ContentSummary])
+async def list_document_content(
+    document_id: str,
+    content_type: Optional[ContentType] = None,
+    include_content_json: bool = False,
+    db: AsyncSession = Depends(get_db)
+):
     """
-    List all generated content for a document
+    List generated content for a document, optionally only one content_type
+    content_json is left out (null) unless include_content_json is set
     """
-    contents = db.query(LearningContent).filter(
-        LearningContent.document_id == document_id
-    ).all()
+    columns = list(CONTENT_SUMMARY_COLUMNS)
+    if include_content_json:
+        columns.append(LearningContent.content_json)
 
-    return contents
+    query = select(*columns).where(LearningContent.document_id == document_id)
+    if content_type:
+        query = query.where(LearningContent.content_type == content_type)
+
+    rows = (await db.execute(query.order_by(LearningContent.created_at))).mappings()
+
+    return [dict(row) for row in rows]
@@ -1,181 +1,414 @@
 """
 Document Upload and Processing Endpoints
 """
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form, status
-from sqlalchemy.orm import Session
-from typing import List
+from fastapi import (
+    APIRouter, Depends, HTTPException, UploadFile, File, Form, Query, Response, status
+)
+from fastapi.responses import RedirectResponse
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
+from typing import Any, Dict, List, Optional
+import asyncio
+import hashlib
 import uuid
-import os
 from datetime import datetime
 
 from app.core import get_db, settings
-from app.models import Document, User
-from app.schemas import DocumentResponse, DocumentStatus
-from app.services import OCRService, ClaudeService
+from app.core.pagination import MAX_PAGE_SIZE, next_page, paginate
+from app.models import Document, LearningContent, User
+from app.models.content import GENERATED_CONTENT_KEYS
+from app.schemas import (
+    DocumentSummary, DocumentResponse, DocumentStatus, DocumentBulkDelete, DocumentBatchResponse
+)
+from app.services import document_processor
+from app.services.document_processor import estimate_remaining_seconds
+from app.services.storage import storage
+from app.services.user_stats import user_stats
 
 router = APIRouter()
-ocr_service = OCRService()
-claude_service = ClaudeService()
 
+# Columns read for list views; ocr_data (full text and per-page layout) is projected
+# only when requested
+DOCUMENT_SUMMARY_COLUMNS = (
+    Document.id,
+    Document.user_id,
+    Document.subject,
+    Document.raw_image_uri,
+    Document.processing_status,
+    Document.processing_stage,
+    Document.processing_progress,
+    Document.analysis_results,
+    Document.error_message,
+    Document.created_at,
+    Document.updated_at,
+)
 
-@router.post("/upload", response_model=DocumentResponse, status_code=status.HTTP_201_CREATED)
+
+def _size_exceeded() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+        detail=f"File size exceeds maximum allowed size of {settings.MAX_UPLOAD_SIZE} bytes"
+    )
+
+
+def _validate_upload(file: UploadFile) -> str:
+    """Check the content type and extension of an upload; returns the file extension"""
+    is_image = bool(file.content_type and file.content_type.startswith('image/'))
+    is_pdf_upload = file.content_type == 'application/pdf'
+    if not is_image and not is_pdf_upload:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="File must be an image or a PDF"
+        )
+
+    file_extension = 'pdf' if is_pdf_upload else 'jpg'
+    if file.filename and '.' in file.filename:
+        file_extension = file.filename.rsplit('.', 1)[-1].lower()
+    if file_extension not in settings.ALLOWED_EXTENSIONS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"File extension must be one of: {', '.join(settings.ALLOWED_EXTENSIONS)}"
+        )
+    return file_extension
+
+
+def _new_document(user: User, subject: str, uri: str) -> Document:
+    return Document(
+        user_id=user.id,
+        subject=subject,
+        raw_image_uri=uri,
+        processing_status="pending",
+        processing_stage="queued",
+        processing_progress=0,
+        ocr_data={},
+        analysis_results={}
+    )
+
+
+async def _generated_content(
+    db: AsyncSession,
+    document_ids: List[str]
+) -> Dict[str, Dict[str, List[str]]]:
+    """
+    Generated content ids per document and type, in creation order
+    One query on the (document_id, content_type, created_at) index for the whole page
+    """
+    generated = {
+        document_id: {key: [] for key in GENERATED_CONTENT_KEYS.values()}
+        for document_id in document_ids
+    }
+    if not document_ids:
+        return generated
+
+    rows = await db.execute(
+        select(LearningContent.document_id, LearningContent.content_type, LearningContent.id)
+        .where(LearningContent.document_id.in_(document_ids))
+        .order_by(LearningContent.created_at)
+    )
+    for document_id, content_type, content_id in rows:
+        generated[document_id][GENERATED_CONTENT_KEYS[content_type]].append(content_id)
+    return generated
+
+
+async def _store_upload(file: UploadFile, key: str) -> Dict[str, Any]:
+    """
+    Copy an upload to storage in UPLOAD_CHUNK_SIZE chunks
+    - Rejects oversized files as soon as the limit is crossed, without reading the rest
+    - Hashes the content on the fly for the OCR cache
+    Returns the storage URI, size and sha256 of the stored file
+    """
+    if file.size is not None and file.size > settings.MAX_UPLOAD_SIZE:
+        raise _size_exceeded()
+
+    writer = storage.writer(key, content_type=file.content_type)
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        while chunk := await file.read(settings.UPLOAD_CHUNK_SIZE):
+            size += len(chunk)
+            if size > settings.MAX_UPLOAD_SIZE:
+                raise _size_exceeded()
+            digest.update(chunk)
+            await writer.write(chunk)
+        uri = await writer.commit()
+    except BaseException:
+        await writer.abort()
+        raise
+
+    return {"uri": uri, "size": size, "sha256": digest.hexdigest()}
+
+
+@router.post("/upload", response_model=DocumentResponse, status_code=status.HTTP_202_ACCEPTED)
 async def upload_document(
     file: UploadFile = File(...),
     subject: str = Form(...),
-    db: Session = Depends(get_db)
+    ocr_engine: Optional[str] = Form(None),
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Upload a homework document image
+    Processing runs in the background; poll /{document_id}/status for progress
+    ocr_engine overrides the user's preferred engine ("auto", "tesseract", "google_vision")
     """
     # Get current user (simplified - in production, get from token)
-    user = db.query(User).first()
+    user = await db.scalar(select(User).limit(1))
     if not user:
         raise HTTPException(status_code=401, detail="User not authenticated")
 
     # Validate file type
-    if not file.content_type or not file.content_type.startswith('image/'):
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="File must be an image"
+    file_extension = _validate_upload(file)
+
+    # Stream the upload to storage, enforcing the size limit as chunks arrive
+    file_id = str(uuid.uuid4())
+    stored = await _store_upload(file, f"{file_id}.{file_extension}")
+
+    # Create document record
+    document = _new_document(user, subject, stored["uri"])
+
+    db.add(document)
+    await user_stats.record_documents(db, user.id, 1)
+    await db.commit()
+
+    # Hand off OCR and analysis to the background job queue
+    try:
+        await document_processor.submit(
+            document.id,
+            ocr_engine=ocr_engine or (user.preferences or {}).get("ocr_engine"),
+            content_hash=stored["sha256"]
         )
+    except Exception as e:
+        document.processing_status = "error"
+        document.error_message = f"Failed to queue document for processing: {e}"
+        await db.commit()
+
+    return document
+
 
-    # Read file content
-    file_content = await file.read()
+@router.post(
+    "/batch", response_model=DocumentBatchResponse, status_code=status.HTTP_202_ACCEPTED
+)
+async def upload_documents_batch(
+    files: List[UploadFile] = File(...),
+    subject: str = Form(...),
+    ocr_engine: Optional[str] = Form(None),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Upload a set of homework images (e.g. a class set of scans) in one request
+    - Files are streamed to storage concurrently (BATCH_UPLOAD_CONCURRENCY at a time)
+    - Images are OCR'd together by one batch job; PDFs get their own jobs
+    Returns a job handle and status URL per document
+    """
+    # Get current user (simplified - in production, get from token)
+    user = await db.scalar(select(User).limit(1))
+    if not user:
+        raise HTTPException(status_code=401, detail="User not authenticated")
 
-    # Validate file size
-    if len(file_content) > settings.MAX_UPLOAD_SIZE:
+    if len(files) > settings.BATCH_UPLOAD_MAX_FILES:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
-            detail=f"File size exceeds maximum allowed size of {settings.MAX_UPLOAD_SIZE} bytes"
+            detail=f"A batch can contain at most {settings.BATCH_UPLOAD_MAX_FILES} files"
         )
 
-    # Save file temporarily (in production, upload to cloud storage)
-    upload_dir = "uploads"
-    os.makedirs(upload_dir, exist_ok=True)
-    file_id = str(uuid.uuid4())
-    file_extension = file.filename.split('.')[-1] if file.filename else 'jpg'
-    file_path = f"{upload_dir}/{file_id}.{file_extension}"
+    # Validate every file before storing any of them
+    extensions = [_validate_upload(file) for file in files]
 
-    with open(file_path, "wb") as f:
-        f.write(file_content)
+    semaphore = asyncio.Semaphore(settings.BATCH_UPLOAD_CONCURRENCY)
 
-    # Create document record
-    document = Document(
-        user_id=user.id,
-        subject=subject,
-        raw_image_uri=file_path,
-        processing_status="pending",
-        ocr_data={},
-        analysis_results={},
-        generated_content={"games": [], "quizzes": [], "review_materials": []}
-    )
+    async def store(file: UploadFile, extension: str) -> Dict[str, Any]:
+        async with semaphore:
+            return await _store_upload(file, f"{uuid.uuid4()}.{extension}")
 
-    db.add(document)
-    db.commit()
-    db.refresh(document)
+    stored = await asyncio.gather(
+        *[store(file, extension) for file, extension in zip(files, extensions)],
+        return_exceptions=True
+    )
+    errors = [result for result in stored if isinstance(result, BaseException)]
+    if errors:
+        await storage.delete_many([
+            result["uri"] for result in stored if not isinstance(result, BaseException)
+        ])
+        raise errors[0]
 
-    # Start processing asynchronously (in production, use background tasks or queue)
-    try:
-        # Update status to processing
-        document.processing_status = "processing"
-        db.commit()
-
-        # Process OCR
-        ocr_result = await ocr_service.process_document(file_content)
-        document.ocr_data = ocr_result["ocr_data"]
-
-        # Analyze content with Claude
-        analysis = await claude_service.analyze_homework_content(
-            ocr_text=ocr_result["ocr_data"].get("raw_text", ""),
-            subject=subject
-        )
-        document.analysis_results = analysis
+    documents = [_new_document(user, subject, result["uri"]) for result in stored]
+    db.add_all(documents)
+    await user_stats.record_documents(db, user.id, len(documents))
+    await db.commit()
 
-        # Mark as completed
-        document.processing_status = "completed"
-        db.commit()
-        db.refresh(document)
+    engine = ocr_engine or (user.preferences or {}).get("ocr_engine")
+    images = [
+        (document, result) for document, result, extension
+        in zip(documents, stored, extensions) if extension != "pdf"
+    ]
+    pdfs = [
+        (document, result) for document, result, extension
+        in zip(documents, stored, extensions) if extension == "pdf"
+    ]
 
+    job_ids: Dict[str, Optional[str]] = {}
+    try:
+        if images:
+            job = await document_processor.submit_batch(
+                [document.id for document, _ in images],
+                ocr_engine=engine,
+                content_hashes={document.id: result["sha256"] for document, result in images}
+            )
+            job_ids.update({document.id: job.id for document, _ in images})
+        for document, result in pdfs:
+            job = await document_processor.submit(
+                document.id, ocr_engine=engine, content_hash=result["sha256"]
+            )
+            job_ids[document.id] = job.id
     except Exception as e:
-        document.processing_status = "error"
-        document.error_message = str(e)
-        db.commit()
+        for document in documents:
+            if document.id not in job_ids:
+                document.processing_status = "error"
+                document.error_message = f"Failed to queue document for processing: {e}"
+        await db.commit()
 
-    return document
+    return {
+        "count": len(documents),
+        "documents": [
+            {
+                "document_id": document.id,
+                "job_id": job_ids.get(document.id),
+                "processing_status": document.processing_status,
+                "status_url": f"/api/v1/documents/{document.id}/status"
+            }
+            for document in documents
+        ]
+    }
 
 
 @router.get("/{document_id}", response_model=DocumentResponse)
-async def get_document(document_id: str, db: Session = Depends(get_db)):
+async def get_document(document_id: str, db: AsyncSession = Depends(get_db)):
     """
     Get document details by ID
     """
-    document = db.query(Document).filter(Document.id == document_id).first()
+    document = await db.get(Document, document_id)
     if not document:
         raise HTTPException(status_code=404, detail="Document not found")
-    return document
+
+    generated = await _generated_content(db, [document.id])
+    response = DocumentResponse.model_validate(document)
+    return response.model_copy(update={"generated_content": generated[document.id]})
 
 
 @router.get("/{document_id}/status", response_model=DocumentStatus)
-async def get_document_status(document_id: str, db: Session = Depends(get_db)):
+async def get_document_status(document_id: str, db: AsyncSession = Depends(get_db)):
     """
     Get processing status of a document
     """
-    document = db.query(Document).filter(Document.id == document_id).first()
+    document = await db.get(Document, document_id)
     if not document:
         raise HTTPException(status_code=404, detail="Document not found")
 
-    progress = 0
-    if document.processing_status == "pending":
-        progress = 0
-    elif document.processing_status == "processing":
-        progress = 50
-    elif document.processing_status == "completed":
+    stage = document.processing_stage or "queued"
+    progress = document.processing_progress or 0
+    if document.processing_status == "completed":
         progress = 100
-    elif document.processing_status == "error":
-        progress = 0
 
     return {
         "status": document.processing_status,
+        "stage": stage,
         "progress_percentage": progress,
-        "estimated_time_seconds": 10 if progress < 100 else 0,
+        "attempts": document.processing_attempts or 0,
+        "estimated_time_seconds": estimate_remaining_seconds(stage) if progress < 100 else 0,
         "error_message": document.error_message
     }
 
 
+@router.get("/{document_id}/image")
+async def get_document_image(document_id: str, db: AsyncSession = Depends(get_db)):
+    """
+    Redirect to a short-lived presigned URL for the uploaded file
+    The bytes are served by the storage backend, not by the API
+    """
+    document = await db.get(Document, document_id)
+    if not document:
+        raise HTTPException(status_code=404, detail="Document not found")
+
+    url = await storage.presigned_url(document.raw_image_uri)
+    return RedirectResponse(url, status_code=status.HTTP_307_TEMPORARY_REDIRECT)
+
+
+@router.post("/bulk-delete", status_code=status.HTTP_204_NO_CONTENT)
+async def delete_documents(request: DocumentBulkDelete, db: AsyncSession = Depends(get_db)):
+    """
+    Delete several documents; their files are removed from storage concurrently
+    """
+    # Get current user (simplified)
+    user = await db.scalar(select(User).limit(1))
+    if not user:
+        raise HTTPException(status_code=401, detail="User not authenticated")
+
+    # Generated content is loaded in one query for all documents instead of one per
+    # document when the deletes are flushed
+    documents = (await db.scalars(
+        select(Document)
+        .where(
+            Document.user_id == user.id,
+            Document.id.in_(request.document_ids)
+        )
+        .options(selectinload(Document.learning_contents))
+    )).all()
+
+    await storage.delete_many([document.raw_image_uri for document in documents])
+
+    for document in documents:
+        await db.delete(document)
+    await user_stats.record_documents(db, user.id, -len(documents))
+    await db.commit()
+    return None
+
+
 @router.delete("/{document_id}", status_code=status.HTTP_204_NO_CONTENT)
-async def delete_document(document_id: str, db: Session = Depends(get_db)):
+async def delete_document(document_id: str, db: AsyncSession = Depends(get_db)):
     """
     Delete a document
     """
-    document = db.query(Document).filter(Document.id == document_id).first()
+    document = await db.get(Document, document_id)
     if not document:
         raise HTTPException(status_code=404, detail="Document not found")
 
     # Delete file from storage
-    if os.path.exists(document.raw_image_uri):
-        os.remove(document.raw_image_uri)
+    await storage.delete(document.raw_image_uri)
 
-    db.delete(document)
-    db.commit()
+    await db.delete(document)
+    await user_stats.record_documents(db, document.user_id, -1)
+    await db.commit()
     return None
 
 
-@router.get("/", response_model=List[DocumentResponse])
+@router.get("/", response_model=List[DocumentSummary])
 async def list_documents(
-    skip: int = 0,
-    limit: int = 20,
-    db: Session = Depends(get_db)
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: int = Query(20, ge=1, le=MAX_PAGE_SIZE),
+    include_ocr_data: bool = False,
+    db: AsyncSession = Depends(get_db)
 ):
     """
-    List user's documents
+    List user's documents, newest first
+    Pass the X-Next-Cursor response header as cursor to get the next page
+    ocr_data is left out (null) unless include_ocr_data is set
     """
     # Get current user (simplified)
-    user = db.query(User).first()
+    user = await db.scalar(select(User).limit(1))
     if not user:
         raise HTTPException(status_code=401, detail="User not authenticated")
 
-    documents = db.query(Document).filter(
-        Document.user_id == user.id
-    ).offset(skip).limit(limit).all()
+    columns = list(DOCUMENT_SUMMARY_COLUMNS)
+    if include_ocr_data:
+        columns.append(Document.ocr_data)
+
+    rows = (await db.execute(
+        paginate(select(*columns).where(Document.user_id == user.id), Document, cursor, limit)
+    )).mappings()
 
+    documents = next_page([dict(row) for row in rows], limit, response)
+    generated = await _generated_content(db, [document["id"] for document in documents])
+    for document in documents:
+        document["generated_content"] = generated[document["id"]]
     return documents
@@ -0,0 +1,25 @@
+"""
+Signed File Download Endpoint
+Serves local-storage files for presigned URLs; S3 storage hands out S3 URLs instead
+"""
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import FileResponse
+
+from app.services.storage import LocalStorageBackend, storage
+
+router = APIRouter()
+
+
+@router.get("/{key}")
+async def get_file(key: str, expires: int, signature: str):
+    """
+    Download a stored file through a URL issued by storage.presigned_url()
+    """
+    if not isinstance(storage, LocalStorageBackend):
+        raise HTTPException(status_code=404, detail="File not found")
+
+    path = storage.resolve_signed(key, expires, signature)
+    if not path:
+        raise HTTPException(status_code=403, detail="Invalid or expired file URL")
+
+    return FileResponse(path, headers={"Cache-Control": "private, max-age=300"})
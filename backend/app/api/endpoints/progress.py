@@ -1,16 +1,20 @@
 """
 Progress Tracking and Analytics Endpoints
 """
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from sqlalchemy import func
-from typing import List
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional
 from datetime import datetime
 
 from app.core import get_db
-from app.models import UserProgress, LearningContent, User, Document
+from app.core.pagination import MAX_PAGE_SIZE, next_page, paginate
+from app.models import UserProgress, LearningContent, User
 from app.schemas import ProgressSubmit, ProgressResponse, DashboardResponse
 from app.services import ClaudeService
+from app.services.answer_key import AnswerKey
+from app.services.engagement import engagement_counters
+from app.services.user_stats import user_stats
 
 router = APIRouter()
 claude_service = ClaudeService()
@@ -19,26 +23,24 @@ claude_service = ClaudeService()
 @router.post("/submit", response_model=ProgressResponse, status_code=status.HTTP_201_CREATED)
 async def submit_progress(
     progress_data: ProgressSubmit,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Submit user's progress for a learning content
     """
     # Get current user (simplified)
-    user = db.query(User).first()
+    user = await db.scalar(select(User).limit(1))
     if not user:
         raise HTTPException(status_code=401, detail="User not authenticated")
 
     # Get content
-    content = db.query(LearningContent).filter(
-        LearningContent.id == progress_data.content_id
-    ).first()
+    content = await db.get(LearningContent, progress_data.content_id)
     if not content:
         raise HTTPException(status_code=404, detail="Content not found")
 
-    # Calculate score
-    content_json = content.content_json
-    questions = content_json.get("questions", [])
+    # Calculate score against the precompiled answer key
+    questions = content.content_json.get("questions", [])
+    answer_key = AnswerKey.for_content(content)
 
     if not questions:
         raise HTTPException(
@@ -48,46 +50,49 @@ async def submit_progress(
 
     # Process answers
     processed_answers = []
+    feedback_requests = []
     correct_count = 0
     total_points = 0
     earned_points = 0
 
     for answer_submission in progress_data.answers:
         # Find the corresponding question
-        question = next(
-            (q for q in questions if q.get("id") == answer_submission.question_id),
-            None
-        )
-
-        if not question:
+        entry = answer_key.entry(answer_submission.question_id)
+        if not entry:
             continue
 
-        correct_answer = question.get("correct_answer", "")
-        is_correct = answer_submission.user_answer.strip().lower() == correct_answer.strip().lower()
+        question = questions[entry["index"]]
+        correct_answer = entry["correct_answer"]
+        is_correct = answer_key.is_correct(
+            answer_submission.question_id, answer_submission.user_answer
+        )
 
         if is_correct:
             correct_count += 1
-            points = question.get("points", 10)
-            earned_points += points
+            earned_points += entry["points"]
 
-        total_points += question.get("points", 10)
-
-        # Generate feedback using Claude
-        feedback = await claude_service.provide_feedback(
-            question=question.get("question", ""),
-            user_answer=answer_submission.user_answer,
-            correct_answer=correct_answer,
-            is_correct=is_correct
-        )
+        total_points += entry["points"]
 
         processed_answers.append({
             "question_id": answer_submission.question_id,
             "user_answer": answer_submission.user_answer,
             "correct_answer": correct_answer,
             "is_correct": is_correct,
-            "time_spent_seconds": answer_submission.time_spent_seconds,
-            "feedback": feedback
+            "time_spent_seconds": answer_submission.time_spent_seconds
         })
+        feedback_requests.append({
+            # Quizzes keep the question text under question, games under prompt
+            "question": question.get("question") or question.get("prompt", ""),
+            "user_answer": answer_submission.user_answer,
+            "correct_answer": correct_answer,
+            "is_correct": is_correct,
+            "explanation": question.get("explanation")
+        })
+
+    # Generate feedback for all answers in one batched Claude call
+    feedback_list = await claude_service.provide_feedback_batch(feedback_requests)
+    for processed, feedback in zip(processed_answers, feedback_list):
+        processed["feedback"] = feedback
 
     # Calculate final score
     final_score = (earned_points / total_points * 100) if total_points > 0 else 0
@@ -110,17 +115,11 @@ async def submit_progress(
     )
 
     db.add(progress)
+    await user_stats.record_progress(db, progress, content)
+    await db.commit()
 
-    # Update content engagement metrics
-    content.completions += 1
-    current_avg = content.average_score
-    content.average_score = (
-        (current_avg * (content.completions - 1) + final_score) / content.completions
-    )
-    content.completion_rate = content.completions / max(content.views, 1)
-
-    db.commit()
-    db.refresh(progress)
+    # Content engagement metrics are updated in batches by the engagement counters
+    await engagement_counters.record_completion(content.id, final_score)
 
     return progress
 
@@ -128,100 +127,68 @@ async def submit_progress(
 @router.get("/user/{user_id}", response_model=List[ProgressResponse])
 async def get_user_progress(
     user_id: str,
-    skip: int = 0,
-    limit: int = 50,
-    db: Session = Depends(get_db)
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=MAX_PAGE_SIZE),
+    db: AsyncSession = Depends(get_db)
 ):
     """
-    Get user's progress history
+    Get user's progress history, newest first
+    Pass the X-Next-Cursor response header as cursor to get the next page
     """
-    progress_records = db.query(UserProgress).filter(
-        UserProgress.user_id == user_id
-    ).order_by(UserProgress.created_at.desc()).offset(skip).limit(limit).all()
+    progress_records = (await db.scalars(
+        paginate(
+            select(UserProgress).where(UserProgress.user_id == user_id),
+            UserProgress, cursor, limit
+        )
+    )).all()
 
-    return progress_records
+    return next_page(progress_records, limit, response)
 
 
 @router.get("/user/{user_id}/dashboard", response_model=DashboardResponse)
-async def get_user_dashboard(user_id: str, db: Session = Depends(get_db)):
+async def get_user_dashboard(user_id: str, db: AsyncSession = Depends(get_db)):
     """
     Get aggregated dashboard data for a user
+    Served from the user's stats row, which progress submissions keep up to date
     """
-    user = db.query(User).filter(User.id == user_id).first()
-    if not user:
+    stats = await user_stats.get(db, user_id)
+    if not stats:
         raise HTTPException(status_code=404, detail="User not found")
 
-    # Total documents
-    total_documents = db.query(Document).filter(Document.user_id == user_id).count()
-
-    # Total games and quizzes
-    total_games = db.query(UserProgress).join(LearningContent).filter(
-        UserProgress.user_id == user_id,
-        LearningContent.content_type == "game"
-    ).count()
-
-    total_quizzes = db.query(UserProgress).join(LearningContent).filter(
-        UserProgress.user_id == user_id,
-        LearningContent.content_type == "quiz"
-    ).count()
-
-    # Average score
-    avg_score_result = db.query(func.avg(UserProgress.score)).filter(
-        UserProgress.user_id == user_id
-    ).scalar()
-    average_score = float(avg_score_result) if avg_score_result else 0.0
-
-    # Total study time
-    total_time_result = db.query(func.sum(UserProgress.time_spent_seconds)).filter(
-        UserProgress.user_id == user_id
-    ).scalar()
-    total_study_time_minutes = int(total_time_result / 60) if total_time_result else 0
-
-    # Recent activities
-    recent_progress = db.query(UserProgress).join(LearningContent).filter(
-        UserProgress.user_id == user_id
-    ).order_by(UserProgress.created_at.desc()).limit(10).all()
-
-    recent_activities = []
-    for progress in recent_progress:
-        recent_activities.append({
-            "content_title": progress.content.title,
-            "content_type": progress.content.content_type,
-            "score": progress.score,
-            "completed_at": progress.completed_at.isoformat() if progress.completed_at else None
-        })
+    return user_stats.dashboard(stats)
 
-    # Subject breakdown
-    subject_results = db.query(
-        LearningContent.subject,
-        func.count(UserProgress.id).label("count")
-    ).join(UserProgress).filter(
-        UserProgress.user_id == user_id
-    ).group_by(LearningContent.subject).all()
 
-    subject_breakdown = {subject: count for subject, count in subject_results}
+@router.post("/user/{user_id}/dashboard/rebuild", response_model=DashboardResponse)
+async def rebuild_user_dashboard(user_id: str, db: AsyncSession = Depends(get_db)):
+    """
+    Recompute a user's dashboard stats from their full progress history
+    """
+    stats = await user_stats.rebuild(db, user_id)
+    if not stats:
+        raise HTTPException(status_code=404, detail="User not found")
 
-    return {
-        "total_documents": total_documents,
-        "total_games_played": total_games,
-        "total_quizzes_completed": total_quizzes,
-        "average_score": average_score,
-        "total_study_time_minutes": total_study_time_minutes,
-        "recent_activities": recent_activities,
-        "subject_breakdown": subject_breakdown
-    }
+    await db.commit()
+    return user_stats.dashboard(stats)
 
 
 @router.get("/content/{content_id}", response_model=List[ProgressResponse])
 async def get_content_progress(
     content_id: str,
-    db: Session = Depends(get_db)
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=MAX_PAGE_SIZE),
+    db: AsyncSession = Depends(get_db)
 ):
     """
-    Get all progress records for a specific content
+    Get progress records for a specific content, newest first
+    Pass the X-Next-Cursor response header as cursor to get the next page
     """
-    progress_records = db.query(UserProgress).filter(
-        UserProgress.content_id == content_id
-    ).order_by(UserProgress.created_at.desc()).all()
+    progress_records = (await db.scalars(
+        paginate(
+            select(UserProgress).where(UserProgress.content_id == content_id),
+            UserProgress, cursor, limit
+        )
+    )).all()
 
-    return progress_records
+    return next_page(progress_records, limit, response)
@@ -2,13 +2,14 @@
 Core application components
 """
 from .config import settings
-from .database import get_db, init_db
+from .database import get_db, init_db, close_db
 from .security import verify_password, get_password_hash, create_access_token, decode_access_token
 
 __all__ = [
     "settings",
     "get_db",
     "init_db",
+    "close_db",
     "verify_password",
     "get_password_hash",
     "create_access_token",
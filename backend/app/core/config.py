@@ -2,7 +2,7 @@
 Application Configuration
 Manages all environment variables and settings
 """
-from typing import List
+from typing import Any, Dict, List
 from pydantic_settings import BaseSettings
 from pydantic import Field
 
@@ -21,13 +21,33 @@ class Settings(BaseSettings):
     PORT: int = 8000
 
     # Database
-    DATABASE_URL: str = "sqlite:///./homework_platform.db"
+    DATABASE_URL: str = "sqlite:///./homework_platform.db"  # mapped to aiosqlite / asyncpg
+    DB_ECHO: bool = False  # log every SQL statement; independent of DEBUG
+    DB_POOL_SIZE: int = 10
+    DB_MAX_OVERFLOW: int = 20
+    DB_POOL_TIMEOUT: float = 30.0  # seconds to wait for a pooled connection (SQLite busy timeout)
+    DB_POOL_RECYCLE: int = 1800  # reconnect after this many seconds
+    DB_POOL_PRE_PING: bool = True
+    DB_STATEMENT_CACHE_SIZE: int = 500  # compiled SQL and asyncpg prepared statements
+    DB_QUERY_COUNT_HEADER: bool = False  # X-DB-Query-Count on responses, for profiling
 
     # Redis
     REDIS_HOST: str = "localhost"
     REDIS_PORT: int = 6379
     REDIS_DB: int = 0
 
+    # Background Jobs
+    JOB_QUEUE_BACKEND: str = "redis"  # redis | sqlite
+    JOB_QUEUE_NAME: str = "homework:jobs"
+    JOB_QUEUE_SQLITE_PATH: str = "./job_queue.db"  # ":memory:" for in-process tests
+    JOB_STAGE_CONCURRENCY: Dict[str, int] = {
+        "ocr": 2, "ocr_batch": 1, "analysis": 4, "pregenerate": 1
+    }
+    JOB_MAX_ATTEMPTS: int = 3
+    JOB_RETRY_BACKOFF_SECONDS: float = 2.0
+    JOB_MAX_DEFERRALS: int = 30  # a job put back more often than this is dropped
+    JOB_VISIBILITY_TIMEOUT_SECONDS: int = 600
+
     # Security
     SECRET_KEY: str = Field(..., min_length=32)
     ALGORITHM: str = "HS256"
@@ -36,23 +56,122 @@ class Settings(BaseSettings):
     # Google Cloud Vision
     GOOGLE_CLOUD_PROJECT_ID: str = ""
     GOOGLE_APPLICATION_CREDENTIALS: str = ""
+    VISION_MAX_CONCURRENCY: int = 4
+    VISION_MAX_PENDING: int = 32
+    VISION_TIMEOUT_SECONDS: float = 30.0
+    VISION_BATCH_SIZE: int = 16  # images per batch_annotate_images request (API maximum)
 
     # Anthropic Claude
     ANTHROPIC_API_KEY: str = Field(default="")
+    FEEDBACK_BATCHING: bool = True  # one call per submission instead of one per answer
+    FEEDBACK_TEMPLATE_CORRECT: bool = True  # templated feedback for correct answers
+    ANTHROPIC_MAX_CONCURRENCY: int = 8
+    ANTHROPIC_MAX_PENDING: int = 64
+    ANTHROPIC_TIMEOUT_SECONDS: float = 60.0
+    PROMPT_CACHING: bool = True  # cache the system prompt and document blocks between calls
+    OCR_TEXT_TOKEN_BUDGET: int = 6000  # OCR text beyond this is trimmed before prompting
+    TOKEN_USAGE_LOG: bool = True  # print token counts for every Claude call
+    STRUCTURED_OUTPUT_MAX_RETRIES: int = 1  # re-asks when a reply has no parseable JSON
+    STRUCTURED_OUTPUT_MAX_REPAIRS: int = 3  # invalid fragments sent back for repair per reply
+
+    # Model Routing (tier per operation; max_tokens caps what an operation asks for)
+    MODEL_TIERS: Dict[str, Dict[str, Any]] = {
+        "small": {
+            "model": "claude-3-5-haiku-20241022",
+            "max_tokens": 4096,
+            "temperature": 0.3,
+            "timeout_seconds": 20.0,
+            "input_cost_per_mtok": 0.8,
+            "output_cost_per_mtok": 4.0
+        },
+        "large": {
+            "model": "claude-3-5-sonnet-20241022",
+            "max_tokens": 8192,
+            "temperature": 1.0,
+            "timeout_seconds": 60.0,
+            "input_cost_per_mtok": 3.0,
+            "output_cost_per_mtok": 15.0
+        }
+    }
+    MODEL_ROUTES: Dict[str, str] = {
+        "analysis": "large", "vision_analysis": "large", "quiz": "large", "game": "large",
+        "review": "large", "pack": "large", "hints": "small", "feedback": "small",
+        "feedback_batch": "small"
+    }
+    MODEL_DEFAULT_TIER: str = "large"  # operations missing from MODEL_ROUTES
+    MODEL_ESCALATION_TIER: str = "large"  # retried on when a reply fails validation; "" disables
 
     # AWS S3
     AWS_ACCESS_KEY_ID: str = ""
     AWS_SECRET_ACCESS_KEY: str = ""
     AWS_S3_BUCKET: str = ""
+    AWS_REGION: str = "us-east-1"
+    AWS_S3_ENDPOINT_URL: str = ""  # e.g. http://localhost:9000 for MinIO or a moto server
+    S3_MULTIPART_CHUNK_SIZE: int = 8388608  # 8MB parts; S3's minimum is 5MB
+    STORAGE_URL_EXPIRE_SECONDS: int = 900  # lifetime of presigned image URLs
 
     # File Upload
     MAX_UPLOAD_SIZE: int = 10485760  # 10MB
+    UPLOAD_CHUNK_SIZE: int = 1048576  # uploads are streamed to storage in 1MB chunks
+    BATCH_UPLOAD_MAX_FILES: int = 50
+    BATCH_UPLOAD_CONCURRENCY: int = 4  # files streamed to storage at once per batch request
+    STORAGE_BACKEND: str = "local"  # local | s3
+    UPLOAD_DIR: str = "uploads"
     ALLOWED_EXTENSIONS: List[str] = ["jpg", "jpeg", "png", "webp", "pdf"]
 
     # OCR Settings
     OCR_CONFIDENCE_THRESHOLD: float = 0.7
+    OCR_ENGINE_POLICY: str = "auto"  # auto (cheap-first) | tesseract | google_vision
+    OCR_LOCAL_LANGUAGES: str = "heb+eng"
+    OCR_LOCAL_WORKERS: int = 2
     MIN_IMAGE_RESOLUTION: int = 1080
 
+    # Image Preprocessing
+    PREPROCESS_WORKERS: int = 2
+    PREPROCESS_CROP: bool = True
+    PREPROCESS_DESKEW: bool = True
+    # Off by default: both always change the pixels, forcing a re-encode of every upload,
+    # and Google Vision thresholds on its own (binarized input hurts handwriting); they
+    # can help a Tesseract-only deployment
+    PREPROCESS_DENOISE: bool = False
+    PREPROCESS_BINARIZE: bool = False
+    PREPROCESS_MIN_SKEW_DEGREES: float = 0.5
+    # Laplacian variance around the writing, over its squared ink/paper separation,
+    # treated as fully sharp
+    IMAGE_SHARPNESS_THRESHOLD: float = 0.1
+    IMAGE_QUALITY_MIN_SCORE: float = 0.35  # images below this are rejected before OCR
+
+    # PDF Processing
+    PDF_OCR_CONCURRENCY: int = 4  # pages rasterized and OCR'd at once
+    PDF_RENDER_DPI: int = 200
+    PDF_MAX_PAGES: int = 100
+
+    # Caching
+    CACHE_DIR: str = "./cache"
+    OCR_CACHE_ENABLED: bool = True
+    OCR_CACHE_BACKEND: str = "memory"  # memory | disk | redis
+    OCR_CACHE_MAX_ENTRIES: int = 2048
+    OCR_CACHE_PHASH_DISTANCE: int = 6  # max differing bits of 256 for near-duplicates, 0 disables
+    OCR_CACHE_BAND_SIZE: int = 64
+    AI_CACHE_ENABLED: bool = True
+    AI_CACHE_BACKEND: str = "memory"  # memory | disk | redis
+    AI_CACHE_MAX_ENTRIES: int = 1024
+    AI_CACHE_TTL_SECONDS: int = 7 * 24 * 3600
+    AI_CACHE_VARIANTS: Dict[str, int] = {
+        "analysis": 1, "quiz": 3, "game": 3, "review": 1, "pack": 3
+    }
+    AI_CACHE_VARIATION_RATE: float = 0.3
+
+    # Engagement Counters
+    ENGAGEMENT_COUNTER_BACKEND: str = "memory"  # memory (per process) | redis (shared)
+    ENGAGEMENT_FLUSH_SECONDS: float = 5.0  # how often buffered views/completions are written
+
+    # Content Pre-generation
+    PREGENERATE_CONTENT: bool = False  # build recommended content right after analysis
+    PREGENERATE_DAILY_BUDGET: int = 6  # pre-built items per user per 24 hours
+    PREGENERATE_RESERVED_SLOTS: int = 2  # Anthropic slots always left free for live requests
+    PREGENERATE_DEFER_SECONDS: float = 10.0  # wait before retrying when Anthropic is busy
+
     # Document Retention
     DOCUMENT_RETENTION_DAYS: int = 90
 
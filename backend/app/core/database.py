@@ -1,38 +1,178 @@
 """
 Database Configuration and Session Management
+Async engine (aiosqlite for local SQLite, asyncpg for PostgreSQL) with a tuned connection pool
 """
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, Session
-from typing import Generator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+from alembic import command
+from alembic.config import Config
+from sqlalchemy import event, inspect
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from typing import Any, AsyncGenerator, Dict, Iterator, List, Optional
 from .config import settings
 
+# Plain URLs from .env are mapped to their async drivers
+ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "postgres": "postgresql+asyncpg",
+    "postgresql": "postgresql+asyncpg",
+}
+
+ALEMBIC_INI = Path(__file__).resolve().parents[2] / "alembic.ini"
+# Revision matching the schema create_all built before migrations were added
+INITIAL_REVISION = "0001"
+
+
+def async_database_url(url: str) -> str:
+    """Rewrite a database URL to use an async driver; explicit drivers are kept"""
+    parsed = make_url(url)
+    driver = ASYNC_DRIVERS.get(parsed.drivername)
+    if driver:
+        parsed = parsed.set(drivername=driver)
+    return parsed.render_as_string(hide_password=False)
+
+
+def _engine_options(url: str) -> Dict[str, Any]:
+    """
+    Engine options per backend
+    - SQLite: no pool tuning (one file, aiosqlite runs each connection in its own thread)
+    - PostgreSQL: sized pool with pre-ping and recycling, plus asyncpg's
+      prepared statement cache so repeated queries skip the parse/plan step
+    """
+    options: Dict[str, Any] = {
+        "echo": settings.DB_ECHO,
+        "query_cache_size": settings.DB_STATEMENT_CACHE_SIZE,
+    }
+    if url.startswith("sqlite"):
+        return options
+
+    options.update(
+        pool_size=settings.DB_POOL_SIZE,
+        max_overflow=settings.DB_MAX_OVERFLOW,
+        pool_timeout=settings.DB_POOL_TIMEOUT,
+        pool_recycle=settings.DB_POOL_RECYCLE,
+        pool_pre_ping=settings.DB_POOL_PRE_PING,
+    )
+    if "+asyncpg" in url:
+        options["connect_args"] = {
+            "prepared_statement_cache_size": settings.DB_STATEMENT_CACHE_SIZE
+        }
+    return options
+
+
+DATABASE_URL = async_database_url(settings.DATABASE_URL)
+
 # Create database engine
-engine = create_engine(
-    settings.DATABASE_URL,
-    connect_args={"check_same_thread": False} if settings.DATABASE_URL.startswith("sqlite") else {},
-    echo=settings.DEBUG
-)
+engine = create_async_engine(DATABASE_URL, **_engine_options(DATABASE_URL))
+
+
+if DATABASE_URL.startswith("sqlite"):
+    @event.listens_for(engine.sync_engine, "connect")
+    def _configure_sqlite(dbapi_connection, connection_record):
+        """WAL lets status polls read while the pipeline writes; NORMAL sync is safe under WAL"""
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute(f"PRAGMA busy_timeout={int(settings.DB_POOL_TIMEOUT * 1000)}")
+        cursor.close()
+
+
+class QueryCounter:
+    """Statements executed inside a count_queries() block"""
+
+    def __init__(self):
+        self.statements: List[str] = []
+
+    @property
+    def count(self) -> int:
+        return len(self.statements)
+
+
+_query_counter: ContextVar[Optional[QueryCounter]] = ContextVar("query_counter", default=None)
+
+
+@event.listens_for(engine.sync_engine, "before_cursor_execute")
+def _count_query(connection, cursor, statement, parameters, context, executemany):
+    counter = _query_counter.get()
+    if counter is not None:
+        counter.statements.append(statement)
+
+
+@contextmanager
+def count_queries() -> Iterator[QueryCounter]:
+    """
+    Count the SQL statements the current task executes, e.g. to keep list views
+    from regressing into one query per row:
+
+        with count_queries() as queries:
+            await list_documents(...)
+        assert queries.count <= 2
+    """
+    counter = QueryCounter()
+    token = _query_counter.set(counter)
+    try:
+        yield counter
+    finally:
+        _query_counter.reset(token)
+
 
 # Session factory
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# expire_on_commit=False keeps loaded attributes usable after commit without a lazy reload,
+# which an AsyncSession can't do implicitly
+AsyncSessionLocal = async_sessionmaker(
+    engine, class_=AsyncSession, expire_on_commit=False, autoflush=False
+)
 
 
-def get_db() -> Generator[Session, None, None]:
+async def get_db() -> AsyncGenerator[AsyncSession, None]:
     """
     Dependency for getting database session
     """
-    db = SessionLocal()
-    try:
+    async with AsyncSessionLocal() as db:
         yield db
-    finally:
-        db.close()
 
 
-def init_db():
+def _alembic_config(connection) -> Config:
+    config = Config(str(ALEMBIC_INI))
+    config.set_main_option("script_location", str(ALEMBIC_INI.parent / "alembic"))
+    config.attributes["connection"] = connection
+    return config
+
+
+def _migrate(connection):
     """
-    Initialize database tables
+    Bring the schema to the latest alembic revision
+    - Empty database: created from the models and stamped at head
+    - Created by create_all before migrations existed: stamped at the revision its
+      tables match (user_stats came with the current schema), then upgraded
+    - Otherwise: upgraded to head (a no-op when already current)
     """
     from app.models.base import Base
-    import app.models  # Import all models
+    import app.models  # noqa: F401  (registers all models on Base.metadata)
+
+    config = _alembic_config(connection)
+    tables = set(inspect(connection).get_table_names())
+    if not tables - {"alembic_version"}:
+        Base.metadata.create_all(connection)
+        command.stamp(config, "head")
+        return
+    if "alembic_version" not in tables:
+        command.stamp(config, "head" if "user_stats" in tables else INITIAL_REVISION)
+    command.upgrade(config, "head")
+
+
+async def init_db():
+    """
+    Create or migrate the database schema (see alembic/ for the migrations)
+    """
+    async with engine.begin() as connection:
+        await connection.run_sync(_migrate)
+
 
-    Base.metadata.create_all(bind=engine)
+async def close_db():
+    """
+    Close all pooled connections
+    """
+    await engine.dispose()
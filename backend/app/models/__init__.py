@@ -5,5 +5,6 @@ from .user import User
 from .document import Document
 from .content import LearningContent
 from .progress import UserProgress
+from .stats import UserStats
 
-__all__ = ["User", "Document", "LearningContent", "UserProgress"]
+__all__ = ["User", "Document", "LearningContent", "UserProgress", "UserStats"]
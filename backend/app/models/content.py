@@ -1,7 +1,9 @@
 """
 Learning Content Model
 """
-from sqlalchemy import Column, String, Enum, JSON, Float, Integer, ForeignKey, Text
+from sqlalchemy import (
+    Boolean, Column, DateTime, String, Enum, JSON, Float, Integer, ForeignKey, Text, Index
+)
 from sqlalchemy.orm import relationship
 import enum
 from .base import BaseModel
@@ -13,11 +15,23 @@ class ContentType(str, enum.Enum):
     REVIEW = "review"
 
 
+# Keys of a document's generated_content, per content type
+GENERATED_CONTENT_KEYS = {
+    ContentType.GAME: "games",
+    ContentType.QUIZ: "quizzes",
+    ContentType.REVIEW: "review_materials",
+}
+
+
 class LearningContent(BaseModel):
     """Learning content database model"""
     __tablename__ = "learning_contents"
+    __table_args__ = (
+        # A document's content by type, in creation order (also serves document_id lookups)
+        Index("ix_learning_contents_document_type", "document_id", "content_type", "created_at"),
+    )
 
-    document_id = Column(String(36), ForeignKey("documents.id"), nullable=False, index=True)
+    document_id = Column(String(36), ForeignKey("documents.id"), nullable=False)
     user_id = Column(String(36), ForeignKey("users.id"), nullable=False, index=True)
 
     content_type = Column(Enum(ContentType), nullable=False)
@@ -29,12 +43,23 @@ class LearningContent(BaseModel):
     # Full content as JSON
     content_json = Column(JSON, nullable=False)
 
-    # Metadata
-    metadata = Column(JSON, default=dict)  # {estimated_duration_minutes, learning_objectives, topics}
+    # Normalized accepted answers per question, compiled from content_json on creation
+    answer_key = Column(JSON, nullable=True)
+
+    # Speculatively generated after document processing; claimed_at is set when a content
+    # request is first served from it
+    pregenerated = Column(Boolean, nullable=False, default=False, server_default="0")
+    claimed_at = Column(DateTime, nullable=True)
+
+    # Metadata ("metadata" is reserved by the declarative API, so the attribute is renamed)
+    # {estimated_duration_minutes, learning_objectives, topics, generation}
+    content_metadata = Column("metadata", JSON, default=dict)
 
-    # Engagement metrics
+    # Engagement metrics, updated in batches by the engagement counters
+    # average_score is kept as score_total / completions so it stays exact
     views = Column(Integer, default=0)
     completions = Column(Integer, default=0)
+    score_total = Column(Float, default=0.0, server_default="0")
     average_score = Column(Float, default=0.0)
     completion_rate = Column(Float, default=0.0)
 
@@ -1,7 +1,7 @@
 """
 Document Model
 """
-from sqlalchemy import Column, String, Enum, JSON, Float, ForeignKey, Text
+from sqlalchemy import Column, String, Enum, JSON, Float, Integer, ForeignKey, Text, Index
 from sqlalchemy.orm import relationship
 import enum
 from .base import BaseModel
@@ -23,6 +23,10 @@ class ProcessingStatus(str, enum.Enum):
 class Document(BaseModel):
     """Document database model"""
     __tablename__ = "documents"
+    __table_args__ = (
+        # Keyset pagination of a user's documents, newest first
+        Index("ix_documents_user_created", "user_id", "created_at", "id"),
+    )
 
     user_id = Column(String(36), ForeignKey("users.id"), nullable=False, index=True)
     subject = Column(Enum(Subject), nullable=False)
@@ -36,11 +40,14 @@ class Document(BaseModel):
     # Analysis Results
     analysis_results = Column(JSON, default=dict)  # {topics, difficulty_level, learning_objectives}
 
-    # Generated Content References
-    generated_content = Column(JSON, default=dict)  # {games: [], quizzes: [], review_materials: []}
+    # Generated content is referenced from learning_contents.document_id;
+    # responses derive generated_content from that relation
 
     # Processing
     processing_status = Column(Enum(ProcessingStatus), default=ProcessingStatus.PENDING)
+    processing_stage = Column(String(50), nullable=True)  # queued, ocr, analysis, done
+    processing_progress = Column(Integer, default=0)  # 0-100
+    processing_attempts = Column(Integer, default=0)
     error_message = Column(Text, nullable=True)
 
     # Relationships
@@ -1,7 +1,7 @@
 """
 User Progress Model
 """
-from sqlalchemy import Column, String, Enum, JSON, Float, Integer, ForeignKey, DateTime
+from sqlalchemy import Column, String, Enum, JSON, Float, Integer, ForeignKey, DateTime, Index
 from sqlalchemy.orm import relationship
 import enum
 from .base import BaseModel
@@ -16,6 +16,11 @@ class ProgressStatus(str, enum.Enum):
 class UserProgress(BaseModel):
     """User progress tracking model"""
     __tablename__ = "user_progress"
+    __table_args__ = (
+        # Keyset pagination of progress history per user and per content, newest first
+        Index("ix_user_progress_user_created", "user_id", "created_at", "id"),
+        Index("ix_user_progress_content_created", "content_id", "created_at", "id"),
+    )
 
     user_id = Column(String(36), ForeignKey("users.id"), nullable=False, index=True)
     content_id = Column(String(36), ForeignKey("learning_contents.id"), nullable=False, index=True)
@@ -0,0 +1,38 @@
+"""
+User Stats Model
+"""
+from sqlalchemy import Column, String, JSON, Float, Integer, ForeignKey
+from .base import BaseModel
+
+# Recent activities kept on the stats row for the dashboard
+RECENT_ACTIVITY_LIMIT = 10
+
+
+class UserStats(BaseModel):
+    """
+    Per-user dashboard aggregates, one row per user
+    Updated in the same transaction as the progress/document change they reflect,
+    so the dashboard reads one row instead of aggregating the whole history
+    """
+    __tablename__ = "user_stats"
+
+    user_id = Column(String(36), ForeignKey("users.id"), nullable=False, unique=True, index=True)
+
+    total_documents = Column(Integer, default=0, nullable=False)
+    total_games_played = Column(Integer, default=0, nullable=False)
+    total_quizzes_completed = Column(Integer, default=0, nullable=False)
+
+    # Every progress record counts towards the average, whatever its content type
+    progress_count = Column(Integer, default=0, nullable=False)
+    score_total = Column(Float, default=0.0, nullable=False)
+    total_time_seconds = Column(Integer, default=0, nullable=False)
+
+    recent_activities = Column(JSON, default=list)  # newest first, RECENT_ACTIVITY_LIMIT entries
+    subject_breakdown = Column(JSON, default=dict)  # {subject: progress count}
+
+    @property
+    def average_score(self) -> float:
+        return self.score_total / self.progress_count if self.progress_count else 0.0
+
+    def __repr__(self):
+        return f"<UserStats(user_id='{self.user_id}', progress_count={self.progress_count})>"
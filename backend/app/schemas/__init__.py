@@ -2,8 +2,13 @@
 Pydantic Schemas
 """
 from .user import UserCreate, UserUpdate, UserResponse, UserLogin, Token, TokenData
-from .document import DocumentUpload, DocumentResponse, DocumentStatus, OCRResult
-from .content import ContentResponse, GameGenerate, QuizGenerate, ReviewGenerate
+from .document import (
+    DocumentUpload, DocumentSummary, DocumentResponse, DocumentStatus, DocumentBulkDelete,
+    DocumentBatchItem, DocumentBatchResponse, OCRResult
+)
+from .content import (
+    ContentSummary, ContentResponse, GameGenerate, QuizGenerate, ReviewGenerate, ContentPackGenerate
+)
 from .progress import ProgressSubmit, ProgressResponse, DashboardResponse, AnswerSubmission
 
 __all__ = [
@@ -14,13 +19,19 @@ __all__ = [
     "Token",
     "TokenData",
     "DocumentUpload",
+    "DocumentSummary",
     "DocumentResponse",
     "DocumentStatus",
+    "DocumentBulkDelete",
+    "DocumentBatchItem",
+    "DocumentBatchResponse",
     "OCRResult",
+    "ContentSummary",
     "ContentResponse",
     "GameGenerate",
     "QuizGenerate",
     "ReviewGenerate",
+    "ContentPackGenerate",
     "ProgressSubmit",
     "ProgressResponse",
     "DashboardResponse",
@@ -1,12 +1,13 @@
 """
 Learning Content Schemas
 """
-from typing import Dict, List
-from pydantic import BaseModel
+from typing import Dict, List, Literal, Optional
+from pydantic import AliasChoices, BaseModel, Field
 from datetime import datetime
 
 
-class ContentResponse(BaseModel):
+class ContentSummary(BaseModel):
+    """List view of learning content; content_json is only loaded when asked for"""
     id: str
     document_id: str
     user_id: str
@@ -14,8 +15,8 @@ class ContentResponse(BaseModel):
     subject: str
     title: str
     description: str
-    content_json: Dict
-    metadata: Dict
+    content_json: Optional[Dict] = None
+    metadata: Dict = Field(validation_alias=AliasChoices("content_metadata", "metadata"))
     views: int
     completions: int
     average_score: float
@@ -26,6 +27,10 @@ class ContentResponse(BaseModel):
         from_attributes = True
 
 
+class ContentResponse(ContentSummary):
+    content_json: Dict
+
+
 class GameGenerate(BaseModel):
     game_type: str = "auto"
 
@@ -36,3 +41,13 @@ class QuizGenerate(BaseModel):
 
 class ReviewGenerate(BaseModel):
     topics: List[str] = []
+
+
+class ContentPackGenerate(BaseModel):
+    """Several content types generated for a document in one model call"""
+    content_types: List[Literal["quiz", "game", "review"]] = Field(
+        default=["quiz", "game", "review"], min_length=1
+    )
+    game_type: str = "auto"
+    difficulty: str = "medium"
+    topics: List[str] = []
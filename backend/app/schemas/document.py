@@ -1,7 +1,7 @@
 """
 Document Schemas
 """
-from typing import Dict, Optional
+from typing import Dict, List, Optional
 from pydantic import BaseModel, Field
 from datetime import datetime
 
@@ -10,15 +10,25 @@ class DocumentUpload(BaseModel):
     subject: str = Field(..., pattern="^(mathematics|english|hebrew)$")
 
 
-class DocumentResponse(BaseModel):
+class DocumentBulkDelete(BaseModel):
+    document_ids: List[str] = Field(..., min_length=1, max_length=1000)
+
+
+class DocumentSummary(BaseModel):
+    """List view of a document; ocr_data is only loaded when asked for"""
     id: str
     user_id: str
     subject: str
     raw_image_uri: str
     processing_status: str
-    ocr_data: Dict
+    processing_stage: Optional[str] = None
+    processing_progress: int = 0
+    ocr_data: Optional[Dict] = None
     analysis_results: Dict
-    generated_content: Dict
+    # Content ids by type, derived from learning_contents
+    generated_content: Dict[str, List[str]] = Field(
+        default_factory=lambda: {"games": [], "quizzes": [], "review_materials": []}
+    )
     error_message: Optional[str] = None
     created_at: datetime
     updated_at: datetime
@@ -27,9 +37,27 @@ class DocumentResponse(BaseModel):
         from_attributes = True
 
 
+class DocumentResponse(DocumentSummary):
+    ocr_data: Dict
+
+
+class DocumentBatchItem(BaseModel):
+    document_id: str
+    job_id: Optional[str] = None
+    processing_status: str
+    status_url: str
+
+
+class DocumentBatchResponse(BaseModel):
+    count: int
+    documents: List[DocumentBatchItem]
+
+
 class DocumentStatus(BaseModel):
     status: str
+    stage: Optional[str] = None
     progress_percentage: int = 0
+    attempts: int = 0
     estimated_time_seconds: Optional[int] = None
     error_message: Optional[str] = None
 
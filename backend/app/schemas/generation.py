@@ -0,0 +1,132 @@
+"""
+Generated Content Schemas
+Shapes expected from the model's JSON replies; unknown fields are kept, so the stored
+content carries everything the model produced
+"""
+from typing import Any, List, Optional, Union
+from pydantic import BaseModel, ConfigDict, Field, RootModel, field_validator
+
+
+def _text(value: Any) -> Any:
+    # Models often answer 4 or true where the schema says "4" or "True"
+    if isinstance(value, bool):
+        return "True" if value else "False"
+    if isinstance(value, (int, float)):
+        return str(value)
+    return value
+
+
+class GeneratedModel(BaseModel):
+    model_config = ConfigDict(extra="allow")
+
+
+class QuizQuestion(GeneratedModel):
+    id: str
+    type: str = "multiple_choice"
+    question: str = Field(min_length=1)
+    options: List[str] = []
+    correct_answer: Union[str, List[str]]
+    hints: List[str] = []
+    explanation: str = ""
+    points: int = 10
+
+    @field_validator("id", "correct_answer", mode="before")
+    @classmethod
+    def _as_text(cls, value: Any) -> Any:
+        return [_text(item) for item in value] if isinstance(value, list) else _text(value)
+
+    @field_validator("options", mode="before")
+    @classmethod
+    def _options_as_text(cls, value: Any) -> Any:
+        return [_text(item) for item in value] if isinstance(value, list) else value
+
+
+class QuizContent(GeneratedModel):
+    title: str = "Practice Quiz"
+    questions: List[QuizQuestion] = Field(min_length=1)
+
+
+class GameQuestion(GeneratedModel):
+    id: str
+    prompt: str = Field(min_length=1)
+    answer_type: str = "text"
+    correct_answers: List[str] = Field(min_length=1)
+    options: List[str] = []
+    hints: List[str] = []
+    explanation: str = ""
+    points: int = 10
+
+    @field_validator("id", mode="before")
+    @classmethod
+    def _id_as_text(cls, value: Any) -> Any:
+        return _text(value)
+
+    @field_validator("correct_answers", "options", mode="before")
+    @classmethod
+    def _as_text_list(cls, value: Any) -> Any:
+        if not isinstance(value, list):
+            value = [value]
+        return [_text(item) for item in value]
+
+
+class GameContent(GeneratedModel):
+    title: str = "Interactive Game"
+    description: str = ""
+    questions: List[GameQuestion] = Field(min_length=1)
+
+
+class ReviewSection(GeneratedModel):
+    topic: str = Field(min_length=1)
+    summary: str = ""
+    key_points: List[str] = []
+
+
+class ReviewContent(GeneratedModel):
+    title: str = "Study Guide"
+    sections: List[ReviewSection] = Field(min_length=1)
+
+
+class Intervention(GeneratedModel):
+    type: str
+    focus: str = ""
+    rationale: str = ""
+
+
+class HomeworkAnalysis(GeneratedModel):
+    learning_objectives: List[dict] = []
+    key_concepts: List[str] = []
+    estimated_difficulty: float = Field(default=0.5, ge=0.0, le=1.0)
+    knowledge_gaps: List[dict] = []
+    recommended_interventions: List[Intervention] = []
+    topics: List[str] = []
+    content_type: str = "mixed"
+
+
+class AnswerFeedback(GeneratedModel):
+    answer: Optional[int] = None  # position in a batch request
+    message: str = Field(min_length=1)
+    explanation: str = ""
+    encouragement: str = ""
+    next_steps: str = ""
+
+
+class FeedbackList(RootModel[List[AnswerFeedback]]):
+    pass
+
+
+class HintList(RootModel[List[str]]):
+    root: List[str] = Field(min_length=1)
+
+    @field_validator("root", mode="before")
+    @classmethod
+    def _as_text(cls, value: Any) -> Any:
+        return [_text(item) for item in value] if isinstance(value, list) else value
+
+
+class ContentPackPart(GeneratedModel):
+    content_type: str
+    content: dict
+
+
+class ContentPack(GeneratedModel):
+    parts: List[ContentPackPart] = Field(min_length=1)
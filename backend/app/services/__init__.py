@@ -4,5 +4,8 @@ Service layer for business logic
 from .ocr_service import OCRService
 from .claude_service import ClaudeService
 from .game_service import GameService
+from .job_queue import Job, JobQueue, job_queue
+from .document_processor import DocumentProcessor, document_processor
 
-__all__ = ["OCRService", "ClaudeService", "GameService"]
+__all__ = ["OCRService", "ClaudeService", "GameService", "Job", "JobQueue", "job_queue",
+           "DocumentProcessor", "document_processor"]
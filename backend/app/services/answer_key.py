@@ -0,0 +1,120 @@
+"""
+Answer Keys - Precompiled grading data for quizzes and games
+Built once when content is created and stored with it, so grading a submission
+is one dict lookup and one set lookup per answer
+"""
+import re
+import unicodedata
+from fractions import Fraction
+from typing import Any, Dict, FrozenSet, List, Optional, Tuple
+
+# Bump when normalization changes; stored keys with another version are recompiled
+ANSWER_KEY_VERSION = 1
+
+# Hebrew points (niqqud) and cantillation marks; the letters themselves are kept
+_HEBREW_MARKS = re.compile("[\u0591-\u05BD\u05BF\u05C1\u05C2\u05C4\u05C5\u05C7]")
+# Direction marks that RTL keyboards and copy/paste insert around text
+_BIDI_MARKS = re.compile("[\u200E\u200F\u202A-\u202E\u2066-\u2069]")
+_NUMBER = re.compile(r"^[+-]?(\d+(\.\d+)?|\.\d+)$")
+_THOUSANDS = re.compile(r"^[+-]?\d{1,3}(,\d{3})+(\.\d+)?$")
+_FRACTION = re.compile(r"^([+-]?\d+) ?/ ?(\d+)$")
+
+
+def _canonical_number(text: str) -> Optional[str]:
+    """Exact canonical form of a decimal, integer or fraction ("0.50", "1/2" -> "1/2")"""
+    if _THOUSANDS.match(text):
+        text = text.replace(",", "")
+    fraction_match = _FRACTION.match(text)
+    if fraction_match:
+        text = f"{fraction_match.group(1)}/{fraction_match.group(2)}"
+    elif not _NUMBER.match(text):
+        return None
+
+    try:
+        value = Fraction(text)
+    except (ValueError, ZeroDivisionError):
+        return None
+    if value.denominator == 1:
+        return str(value.numerator)
+    return f"{value.numerator}/{value.denominator}"
+
+
+def normalize_answer(answer: Any) -> str:
+    """
+    Normalize an answer for comparison
+    - Unicode NFKC (full-width digits, ligatures, compatibility forms)
+    - Hebrew niqqud/cantillation and bidi control marks removed
+    - Case-folded, with whitespace runs collapsed
+    - Numbers compared by value: "0.5", ".50" and "1/2" are the same answer
+    """
+    text = unicodedata.normalize("NFKC", str(answer))
+    text = _BIDI_MARKS.sub("", _HEBREW_MARKS.sub("", text))
+    text = " ".join(text.casefold().split())
+    return _canonical_number(text) or text
+
+
+def _accepted_answers(question: Dict[str, Any]) -> List[str]:
+    # Quizzes use correct_answer, games correct_answers; either may hold a list
+    answers = []
+    for field in ("correct_answer", "correct_answers"):
+        value = question.get(field)
+        if value is None or value == "":
+            continue
+        answers.extend(value if isinstance(value, list) else [value])
+    return [str(answer) for answer in answers if str(answer).strip()]
+
+
+def compile_answer_key(content_json: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Build the stored (JSON) answer key for generated content
+    {"version", "questions": {question_id: {index, correct_answer, accepted, points}}}
+    The first question wins when ids repeat
+    """
+    questions = {}
+    for index, question in enumerate(content_json.get("questions") or []):
+        question_id = question.get("id")
+        if question_id is None or str(question_id) in questions:
+            continue
+        answers = _accepted_answers(question)
+        questions[str(question_id)] = {
+            "index": index,
+            "correct_answer": answers[0] if answers else "",
+            "accepted": sorted({normalize_answer(answer) for answer in answers}),
+            "points": question.get("points", 10)
+        }
+    return {"version": ANSWER_KEY_VERSION, "questions": questions}
+
+
+class AnswerKey:
+    """In-memory form of a stored answer key, with accepted answers as frozensets"""
+
+    def __init__(self, stored: Dict[str, Any]):
+        self.stored = stored
+        self._questions: Dict[str, Tuple[Dict[str, Any], FrozenSet[str]]] = {
+            question_id: (entry, frozenset(entry["accepted"]))
+            for question_id, entry in stored["questions"].items()
+        }
+
+    @classmethod
+    def for_content(cls, content) -> "AnswerKey":
+        """
+        Answer key of a LearningContent; content created before keys existed (or with
+        an older key version) is compiled now and the key stored on it
+        """
+        stored = content.answer_key
+        if not stored or stored.get("version") != ANSWER_KEY_VERSION:
+            stored = compile_answer_key(content.content_json or {})
+            content.answer_key = stored
+        return cls(stored)
+
+    def __len__(self) -> int:
+        return len(self._questions)
+
+    def entry(self, question_id: str) -> Optional[Dict[str, Any]]:
+        """Index, display answer and points of a question, or None if it doesn't exist"""
+        found = self._questions.get(str(question_id))
+        return found[0] if found else None
+
+    def is_correct(self, question_id: str, user_answer: Any) -> bool:
+        found = self._questions.get(str(question_id))
+        return bool(found) and normalize_answer(user_answer) in found[1]
@@ -0,0 +1,232 @@
+"""
+Cache Backends - Pluggable key/value stores with TTLs and hit/miss metrics
+Shared by the OCR and AI response caches
+"""
+import asyncio
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional
+from app.core.config import settings
+
+
+class CacheStats:
+    """Hit/miss counters, optionally broken down by label (e.g. endpoint or match kind)"""
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+        self.by_label: Dict[str, Dict[str, int]] = {}
+
+    def _label(self, label: Optional[str]) -> Dict[str, int]:
+        return self.by_label.setdefault(label or "default", {"hits": 0, "misses": 0})
+
+    def hit(self, label: Optional[str] = None):
+        self.hits += 1
+        self._label(label)["hits"] += 1
+
+    def miss(self, label: Optional[str] = None):
+        self.misses += 1
+        self._label(label)["misses"] += 1
+
+    def error(self):
+        self.errors += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        labels = {}
+        for label, counts in self.by_label.items():
+            label_total = counts["hits"] + counts["misses"]
+            labels[label] = {
+                **counts,
+                "hit_rate": counts["hits"] / label_total if label_total else 0.0
+            }
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "errors": self.errors,
+            "hit_rate": self.hits / total if total else 0.0,
+            "by_label": labels
+        }
+
+
+class MemoryCacheBackend:
+    """In-process LRU cache with per-entry TTL"""
+
+    def __init__(self, max_entries: int = 1024):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self.evictions = 0
+
+    async def get(self, key: str) -> Optional[Any]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+
+        expires_at, value = entry
+        if expires_at and expires_at < time.time():
+            del self._entries[key]
+            return None
+
+        self._entries.move_to_end(key)
+        return value
+
+    async def set(self, key: str, value: Any, ttl: Optional[int] = None):
+        expires_at = time.time() + ttl if ttl else None
+        self._entries[key] = (expires_at, value)
+        self._entries.move_to_end(key)
+
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    async def delete(self, key: str):
+        self._entries.pop(key, None)
+
+
+class DiskCacheBackend:
+    """
+    JSON files on local disk, one per key, written atomically
+    Bounded by max_entries: when a write takes the directory past it, the least
+    recently used files are removed down to PRUNE_TO of the limit, so pruning runs
+    once per batch of writes; expired entries are removed when read
+    """
+
+    PRUNE_TO = 0.9
+
+    def __init__(self, directory: str, max_entries: int = 1024):
+        self.directory = directory
+        self.max_entries = max_entries
+        self.evictions = 0
+        # Files on disk, counted on the first write; other processes sharing the
+        # directory make it approximate, but every prune recounts
+        self._entry_count: Optional[int] = None
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        digest = hashlib.sha256(key.encode("utf-8")).hexdigest()
+        return os.path.join(self.directory, digest[:2], f"{digest}.json")
+
+    def _get_sync(self, key: str) -> Optional[Any]:
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+        if entry.get("expires_at") and entry["expires_at"] < time.time():
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            return None
+
+        # The modification time doubles as the last-used time for pruning
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            pass
+        return entry.get("value")
+
+    def _entry_files(self) -> List[os.DirEntry]:
+        files = []
+        for shard in os.scandir(self.directory):
+            if shard.is_dir():
+                files.extend(
+                    entry for entry in os.scandir(shard.path) if entry.name.endswith(".json")
+                )
+        return files
+
+    def _prune_sync(self):
+        files = self._entry_files()
+        excess = len(files) - int(self.max_entries * self.PRUNE_TO)
+        if excess > 0:
+            for entry in sorted(files, key=lambda entry: entry.stat().st_mtime)[:excess]:
+                try:
+                    os.remove(entry.path)
+                    self.evictions += 1
+                except FileNotFoundError:
+                    pass
+        self._entry_count = len(self._entry_files())
+
+    def _set_sync(self, key: str, value: Any, ttl: Optional[int]):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        entry = {"expires_at": time.time() + ttl if ttl else None, "value": value}
+
+        is_new = not os.path.exists(path)
+
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(entry, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+        with self._lock:
+            if self._entry_count is None:
+                self._entry_count = len(self._entry_files())
+            elif is_new:
+                self._entry_count += 1
+            if self._entry_count > self.max_entries:
+                self._prune_sync()
+
+    def _delete_sync(self, key: str):
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    async def get(self, key: str) -> Optional[Any]:
+        return await asyncio.to_thread(self._get_sync, key)
+
+    async def set(self, key: str, value: Any, ttl: Optional[int] = None):
+        await asyncio.to_thread(self._set_sync, key, value, ttl)
+
+    async def delete(self, key: str):
+        await asyncio.to_thread(self._delete_sync, key)
+
+
+class RedisCacheBackend:
+    """Redis cache shared across API processes; values stored as JSON"""
+
+    def __init__(self, prefix: str):
+        import redis.asyncio as redis
+
+        self.prefix = prefix
+        self.redis = redis.Redis(
+            host=settings.REDIS_HOST,
+            port=settings.REDIS_PORT,
+            db=settings.REDIS_DB,
+            decode_responses=True
+        )
+
+    async def get(self, key: str) -> Optional[Any]:
+        raw = await self.redis.get(f"{self.prefix}:{key}")
+        return json.loads(raw) if raw is not None else None
+
+    async def set(self, key: str, value: Any, ttl: Optional[int] = None):
+        await self.redis.set(f"{self.prefix}:{key}", json.dumps(value, ensure_ascii=False), ex=ttl)
+
+    async def delete(self, key: str):
+        await self.redis.delete(f"{self.prefix}:{key}")
+
+
+def create_cache_backend(kind: str, namespace: str, max_entries: int = 1024):
+    """
+    Build a cache backend by name
+    - memory: in-process LRU bounded by max_entries
+    - disk: JSON files under CACHE_DIR/<namespace>, pruned to max_entries
+    - redis: shared Redis using the REDIS_* settings
+    """
+    if kind == "redis":
+        return RedisCacheBackend(f"homework:cache:{namespace}")
+    if kind == "disk":
+        return DiskCacheBackend(
+            os.path.join(settings.CACHE_DIR, namespace), max_entries=max_entries
+        )
+    return MemoryCacheBackend(max_entries=max_entries)
@@ -1,10 +1,19 @@
 """
 Claude AI Service - Content analysis and generation using Anthropic Claude
 """
-import json
-from typing import Dict, Any, List, Optional
-from anthropic import Anthropic
+import asyncio
+import functools
+import time
+from typing import Dict, Any, AsyncIterator, List, Optional, Type
+from anthropic import AsyncAnthropic
+from pydantic import BaseModel
 from app.core.config import settings
+from app.schemas.generation import AnswerFeedback, FeedbackList, HintList, HomeworkAnalysis
+from .concurrency import ProviderBusyError, anthropic_limiter
+from .model_router import ModelRoute, model_router
+from .prompt_budget import fit_document, token_usage
+from .response_cache import response_cache
+from .structured_output import StructuredOutputError, structured_output
 
 
 class ClaudeService:
@@ -14,8 +23,12 @@ class ClaudeService:
         """Initialize Anthropic Claude client"""
         self.api_key = settings.ANTHROPIC_API_KEY
         if self.api_key:
-            self.client = Anthropic(api_key=self.api_key)
-            self.model = "claude-3-5-sonnet-20241022"
+            # Async client so in-flight calls never block the event loop
+            self.client = AsyncAnthropic(
+                api_key=self.api_key,
+                timeout=settings.ANTHROPIC_TIMEOUT_SECONDS
+            )
+            # The model for each call is chosen per operation by model_router
             self.enabled = True
         else:
             self.client = None
@@ -60,22 +73,192 @@ Always provide structured JSON responses. Include:
 
 You excel at transforming homework challenges into engaging learning opportunities."""
 
+    def _cached_block(self, text: str) -> Dict[str, Any]:
+        """Text content block, marked as a prompt cache breakpoint when caching is on"""
+        block = {"type": "text", "text": text}
+        if settings.PROMPT_CACHING:
+            block["cache_control"] = {"type": "ephemeral"}
+        return block
+
+    def _message_params(
+        self,
+        prompt: str,
+        max_tokens: int,
+        document: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        Messages API parameters for a prompt (the model is added by the operation's route)
+        The document's OCR text (trimmed to the token budget) goes in its own cached
+        block ahead of the prompt, so analysis, quiz, game and review calls for one
+        document share the cached prefix: system prompt + document
+        """
+        content: Any = prompt
+        if document is not None:
+            content = [
+                self._cached_block(f"HOMEWORK CONTENT:\n{fit_document(document)}"),
+                {"type": "text", "text": prompt}
+            ]
+        return {
+            "max_tokens": max_tokens,
+            "system": [self._cached_block(self._get_system_prompt())],
+            "messages": [{"role": "user", "content": content}]
+        }
+
+    def _messages_api(self):
+        # The pinned SDK only accepts cache_control (and reports cache token usage)
+        # through the prompt caching beta namespace
+        if settings.PROMPT_CACHING:
+            return self.client.beta.prompt_caching.messages
+        return self.client.messages
+
+    def _record(self, route: ModelRoute, usage: Any, started: float):
+        latency = time.monotonic() - started
+        token_usage.record(route.operation, usage, latency)
+        model_router.record(route, usage, latency)
+
+    async def _create_message(self, operation: str, tier: Optional[str] = None, **kwargs):
+        """
+        Send a Messages API request under the shared Anthropic concurrency limit
+        The operation's route (or tier, when given) picks the model and request settings;
+        token usage, latency and cost are recorded under operation
+        Raises ProviderBusyError when too many calls are already waiting
+        """
+        route = model_router.route(operation, tier)
+        started = time.monotonic()
+        # The route's timeout bounds the wait for a slot and the request together
+        message = await anthropic_limiter.call(
+            self._messages_api().create,
+            call_timeout=route.timeout_seconds,
+            **route.apply(kwargs)
+        )
+        self._record(route, message.usage, started)
+        return message
+
+    async def _stream_message(
+        self,
+        operation: str,
+        tier: Optional[str] = None,
+        **kwargs
+    ) -> AsyncIterator[str]:
+        """
+        Stream a Messages API response as text chunks, routed like _create_message
+        Holds one Anthropic concurrency slot until the stream is exhausted
+        """
+        route = model_router.route(operation, tier)
+        async with anthropic_limiter.slot():
+            started = time.monotonic()
+            usage: Dict[str, Any] = {}
+            try:
+                stream = await self._messages_api().create(stream=True, **route.apply(kwargs))
+                async for event in stream:
+                    if event.type == "message_start":
+                        usage = event.message.usage.model_dump()
+                    elif event.type == "message_delta":
+                        usage["output_tokens"] = event.usage.output_tokens
+                    elif event.type == "content_block_delta" and getattr(
+                        event.delta, "text", None
+                    ):
+                        yield event.delta.text
+            finally:
+                if usage:
+                    self._record(route, usage, started)
+
+    async def _repair_fragment(
+        self,
+        operation: str,
+        prompt: str,
+        tier: Optional[str] = None
+    ) -> str:
+        """
+        Send a repair prompt for an invalid reply fragment; returns the raw reply text
+        Runs on the tier of the reply being repaired (the operation's route by default)
+        """
+        message = await self._create_message(
+            f"{operation}_repair",
+            tier=tier or model_router.route(operation).tier,
+            **self._message_params(prompt, 1024)
+        )
+        return message.content[0].text
+
+    async def _structured_reply(
+        self,
+        route: ModelRoute,
+        schema: Type[BaseModel],
+        params: Dict[str, Any]
+    ) -> Any:
+        operation = route.operation
+        for attempt in range(settings.STRUCTURED_OUTPUT_MAX_RETRIES + 1):
+            if attempt:
+                structured_output.count(operation, "retries")
+            message = await self._create_message(operation, tier=route.tier, **params)
+            try:
+                return await structured_output.parse(
+                    operation,
+                    message.content[0].text,
+                    schema,
+                    repair=functools.partial(self._repair_fragment, operation, tier=route.tier)
+                )
+            except StructuredOutputError as e:
+                if not e.retryable:
+                    raise
+                if attempt == settings.STRUCTURED_OUTPUT_MAX_RETRIES:
+                    structured_output.count(operation, "failures")
+                    raise
+
+    async def _generate_structured(
+        self,
+        operation: str,
+        schema: Type[BaseModel],
+        prompt: str,
+        max_tokens: int,
+        document: Optional[str] = None,
+        tier: Optional[str] = None
+    ) -> Any:
+        """
+        Messages API call whose reply is parsed and validated against schema
+        - Invalid fragments are repaired in small follow-up calls
+        - A reply with no usable JSON at all is asked for again up to
+          STRUCTURED_OUTPUT_MAX_RETRIES times
+        - If that still fails, the call is escalated to MODEL_ESCALATION_TIER once
+        Raises StructuredOutputError when no valid result could be produced
+        """
+        route = model_router.route(operation, tier)
+        params = self._message_params(prompt, max_tokens, document=document)
+        try:
+            return await self._structured_reply(route, schema, params)
+        except StructuredOutputError:
+            escalated = model_router.escalation(route)
+            if escalated is None:
+                raise
+            return await self._structured_reply(escalated, schema, params)
+
+    def _cache_key(self, endpoint: str, prompt: str, document: str = "", **params) -> str:
+        """Response cache fingerprint for a prompt sent with the shared system prompt"""
+        route = model_router.route(endpoint)
+        return response_cache.fingerprint(
+            endpoint=endpoint,
+            model=route.model,
+            system=self._get_system_prompt(),
+            content=f"{fit_document(document)}\n\n{prompt}" if document else prompt,
+            params={**params, "temperature": route.temperature}
+        )
+
     async def analyze_homework_content(
         self,
         ocr_text: str,
         subject: str,
-        grade_level: str = "middle_school"
+        grade_level: str = "middle_school",
+        fallback_on_error: bool = True
     ) -> Dict[str, Any]:
         """
         Analyze homework content and extract learning objectives
+        Errors return mock analysis unless fallback_on_error is False, in which case
+        they are raised (the pipeline stage relies on that to retry)
         """
         if not self.enabled:
             return self._mock_analysis(ocr_text, subject)
 
-        prompt = f"""Analyze the following homework document and provide a detailed learning profile:
-
-HOMEWORK CONTENT:
-{ocr_text}
+        prompt = f"""Analyze the homework document above and provide a detailed learning profile:
 
 SUBJECT: {subject}
 GRADE LEVEL: {grade_level}
@@ -111,25 +294,24 @@ Provide your analysis in this JSON structure:
 
 Respond with ONLY the JSON, no additional text."""
 
+        cache_key = self._cache_key("analysis", prompt, document=ocr_text, max_tokens=2048)
+        cached = await response_cache.get("analysis", cache_key)
+        if cached is not None:
+            return cached
+
         try:
-            message = self.client.messages.create(
-                model=self.model,
-                max_tokens=2048,
-                system=self._get_system_prompt(),
-                messages=[
-                    {
-                        "role": "user",
-                        "content": prompt
-                    }
-                ]
+            analysis = await self._generate_structured(
+                "analysis", HomeworkAnalysis, prompt, 2048, document=ocr_text
             )
-
-            response_text = message.content[0].text
-            analysis = json.loads(response_text)
+            await response_cache.set("analysis", cache_key, analysis)
             return analysis
 
+        except ProviderBusyError:
+            raise
         except Exception as e:
             print(f"Claude analysis error: {e}")
+            if not fallback_on_error:
+                raise
             return self._mock_analysis(ocr_text, subject)
 
     async def analyze_with_image(
@@ -147,10 +329,10 @@ Respond with ONLY the JSON, no additional text."""
         image_base64 = base64.b64encode(image_data).decode('utf-8')
 
         try:
-            message = self.client.messages.create(
-                model=self.model,
+            message = await self._create_message(
+                "vision_analysis",
                 max_tokens=2048,
-                system=self._get_system_prompt(),
+                system=[self._cached_block(self._get_system_prompt())],
                 messages=[
                     {
                         "role": "user",
@@ -175,6 +357,8 @@ Respond with ONLY the JSON, no additional text."""
             response_text = message.content[0].text
             return {"analysis": response_text}
 
+        except ProviderBusyError:
+            raise
         except Exception as e:
             print(f"Claude vision analysis error: {e}")
             return {"error": str(e)}
@@ -246,20 +430,36 @@ Respond with a JSON array of hints:
 ["hint1", "hint2", "hint3"]"""
 
         try:
-            message = self.client.messages.create(
-                model=self.model,
-                max_tokens=512,
-                system=self._get_system_prompt(),
-                messages=[{"role": "user", "content": prompt}]
-            )
-
-            hints = json.loads(message.content[0].text)
-            return hints
+            return await self._generate_structured("hints", HintList, prompt, 512)
 
+        except ProviderBusyError:
+            raise
         except Exception as e:
             print(f"Hint generation error: {e}")
             return ["Consider the key concepts", "Break it into steps", "Review the theory"]
 
+    def _template_feedback(
+        self,
+        correct_answer: str,
+        is_correct: bool,
+        explanation: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        Templated feedback that needs no model call
+        Used for correct answers and whenever the model is unavailable
+        """
+        if is_correct:
+            return {
+                "message": "Great job! Your answer is correct!",
+                "explanation": explanation or "You demonstrated good understanding of the concept.",
+                "encouragement": "Keep up the excellent work!"
+            }
+        return {
+            "message": "Not quite right, but good effort!",
+            "explanation": explanation or f"The correct answer is: {correct_answer}",
+            "next_steps": "Review the concept and try a similar problem."
+        }
+
     async def provide_feedback(
         self,
         question: str,
@@ -270,19 +470,8 @@ Respond with a JSON array of hints:
         """
         Generate personalized feedback for student answers
         """
-        if not self.enabled:
-            if is_correct:
-                return {
-                    "message": "Great job! Your answer is correct!",
-                    "explanation": "You demonstrated good understanding of the concept.",
-                    "encouragement": "Keep up the excellent work!"
-                }
-            else:
-                return {
-                    "message": "Not quite right, but good effort!",
-                    "explanation": f"The correct answer is: {correct_answer}",
-                    "next_steps": "Review the concept and try a similar problem."
-                }
+        if not self.enabled or (is_correct and settings.FEEDBACK_TEMPLATE_CORRECT):
+            return self._template_feedback(correct_answer, is_correct)
 
         prompt = f"""Provide encouraging, educational feedback for this student answer:
 
@@ -300,16 +489,10 @@ Generate feedback in JSON format:
 }}"""
 
         try:
-            message = self.client.messages.create(
-                model=self.model,
-                max_tokens=512,
-                system=self._get_system_prompt(),
-                messages=[{"role": "user", "content": prompt}]
-            )
-
-            feedback = json.loads(message.content[0].text)
-            return feedback
+            return await self._generate_structured("feedback", AnswerFeedback, prompt, 512)
 
+        except ProviderBusyError:
+            raise
         except Exception as e:
             print(f"Feedback generation error: {e}")
             return {
@@ -317,3 +500,99 @@ Generate feedback in JSON format:
                 "explanation": "Keep practicing to improve your skills.",
                 "encouragement": "You're making progress!"
             }
+
+    async def provide_feedback_batch(self, answers: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Generate feedback for a whole submission at once
+        Each answer is a dict with question, user_answer, correct_answer, is_correct
+        and an optional explanation. Correct answers get templated feedback; the rest
+        are explained in a single model call, or concurrently when batching is disabled.
+        Returns feedback in the same order as the answers.
+        """
+        results: List[Optional[Dict[str, Any]]] = [None] * len(answers)
+        pending = []
+
+        for index, answer in enumerate(answers):
+            needs_model = self.enabled and not (
+                answer["is_correct"] and settings.FEEDBACK_TEMPLATE_CORRECT
+            )
+            if needs_model:
+                pending.append(index)
+            else:
+                results[index] = self._template_feedback(
+                    answer["correct_answer"], answer["is_correct"], answer.get("explanation")
+                )
+
+        if not pending:
+            return results
+
+        if not settings.FEEDBACK_BATCHING:
+            feedback_list = await asyncio.gather(
+                *[
+                    self.provide_feedback(
+                        question=answers[index]["question"],
+                        user_answer=answers[index]["user_answer"],
+                        correct_answer=answers[index]["correct_answer"],
+                        is_correct=answers[index]["is_correct"]
+                    )
+                    for index in pending
+                ],
+                return_exceptions=True
+            )
+            for index, feedback in zip(pending, feedback_list):
+                if isinstance(feedback, Exception):
+                    feedback = self._template_feedback(
+                        answers[index]["correct_answer"],
+                        answers[index]["is_correct"],
+                        answers[index].get("explanation")
+                    )
+                results[index] = feedback
+            return results
+
+        items = "\n\n".join(
+            f"""ANSWER {number}:
+QUESTION: {answers[index]["question"]}
+STUDENT ANSWER: {answers[index]["user_answer"]}
+CORRECT ANSWER: {answers[index]["correct_answer"]}
+IS CORRECT: {answers[index]["is_correct"]}"""
+            for number, index in enumerate(pending, start=1)
+        )
+
+        prompt = f"""Provide encouraging, educational feedback for each of these student answers:
+
+{items}
+
+Generate feedback as a JSON array with exactly one object per answer, in the same order:
+[
+  {{
+    "answer": 1,
+    "message": "Short encouraging message",
+    "explanation": "Why the answer is right/wrong and what to learn",
+    "encouragement": "Motivational statement",
+    "next_steps": "What to do next (if incorrect)"
+  }}
+]
+
+Respond with ONLY the JSON, no additional text."""
+
+        batch_feedback: Dict[int, Dict[str, Any]] = {}
+        try:
+            feedback_list = await self._generate_structured(
+                "feedback_batch", FeedbackList, prompt, min(400 * len(pending), 4096)
+            )
+
+            for position, feedback in enumerate(feedback_list, start=1):
+                batch_feedback[int(feedback.pop("answer", position))] = feedback
+
+        except Exception as e:
+            # Feedback is best-effort: a busy or failed batch falls back to templates
+            print(f"Batch feedback generation error: {e}")
+
+        for number, index in enumerate(pending, start=1):
+            results[index] = batch_feedback.get(number) or self._template_feedback(
+                answers[index]["correct_answer"],
+                answers[index]["is_correct"],
+                answers[index].get("explanation")
+            )
+
+        return results
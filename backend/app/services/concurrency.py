@@ -0,0 +1,179 @@
+"""
+Provider Concurrency Limits
+Bounds in-flight calls to external AI/OCR providers with timeouts and backpressure
+"""
+import asyncio
+import contextlib
+import functools
+from concurrent.futures import Executor, ThreadPoolExecutor
+from typing import Dict, Any, AsyncIterator, Callable, Awaitable, Optional
+from app.core.config import settings
+
+
+class ProviderBusyError(Exception):
+    """Raised when a provider's wait queue is full and the call is rejected"""
+
+    def __init__(self, provider: str, retry_after: int = 5):
+        self.provider = provider
+        self.retry_after = retry_after
+        super().__init__(f"{provider} is at capacity, retry in {retry_after}s")
+
+
+class ProviderLimiter:
+    """
+    Per-provider concurrency gate
+    - At most max_concurrency calls in flight
+    - At most max_pending callers waiting; further callers are rejected (backpressure)
+    - Each call, including its wait for a slot, is bounded by timeout seconds
+    Blocking SDK calls run on a dedicated thread pool sized to the concurrency limit
+    """
+
+    def __init__(self, name: str, max_concurrency: int, max_pending: int, timeout: float):
+        self.name = name
+        self.max_concurrency = max_concurrency
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._waiting = 0
+        self._in_flight = 0
+        self.completed = 0
+        self.timeouts = 0
+        self.rejected = 0
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.max_concurrency,
+                thread_name_prefix=f"{self.name}-io"
+            )
+        return self._executor
+
+    async def _acquire(self):
+        if self._waiting >= self.max_pending:
+            self.rejected += 1
+            raise ProviderBusyError(self.name)
+
+        self._waiting += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self._waiting -= 1
+        self._in_flight += 1
+
+    def _release(self):
+        self._in_flight -= 1
+        self.completed += 1
+        self._semaphore.release()
+
+    @contextlib.asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        """
+        Hold one concurrency slot for the duration of the block
+        Used directly for streaming calls, which outlive a single awaitable
+        """
+        await self._acquire()
+        try:
+            yield
+        finally:
+            self._release()
+
+    async def _within_deadline(self, awaitable: Awaitable[Any], timeout: float) -> Any:
+        try:
+            return await asyncio.wait_for(awaitable, timeout=timeout)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            raise
+
+    async def call(
+        self,
+        func: Callable[..., Awaitable[Any]],
+        *args,
+        call_timeout: Optional[float] = None,
+        **kwargs
+    ) -> Any:
+        """
+        Run an async provider call under this provider's limits
+        The timeout covers the wait for a slot as well as the call itself;
+        call_timeout replaces the provider's timeout for this call (e.g. a model route's)
+        """
+        async def run():
+            async with self.slot():
+                return await func(*args, **kwargs)
+
+        return await self._within_deadline(run(), call_timeout or self.timeout)
+
+    async def call_sync(
+        self,
+        func: Callable[..., Any],
+        *args,
+        executor: Optional[Executor] = None,
+        **kwargs
+    ) -> Any:
+        """
+        Run a blocking provider call on an executor (the dedicated thread pool by default)
+        under this provider's limits
+        A running thread or process can't be interrupted, so a call that times out keeps
+        its slot until it actually finishes; real calls in flight never exceed
+        max_concurrency however many callers give up
+        """
+        loop = asyncio.get_running_loop()
+
+        def release(_):
+            if not loop.is_closed():
+                loop.call_soon_threadsafe(self._release)
+
+        async def run():
+            await self._acquire()
+            try:
+                future = (executor or self.executor).submit(
+                    functools.partial(func, *args, **kwargs)
+                )
+            except BaseException:
+                self._release()
+                raise
+            future.add_done_callback(release)
+            return await asyncio.wrap_future(future)
+
+        return await self._within_deadline(run(), self.timeout)
+
+    def has_capacity(self, reserve: int = 0) -> bool:
+        """
+        Whether a call would start right away and still leave reserve slots free
+        Low-priority callers check this so they never queue ahead of live requests
+        """
+        return self._waiting == 0 and self._in_flight + reserve < self.max_concurrency
+
+    def stats(self) -> Dict[str, Any]:
+        """Current load and counters for monitoring"""
+        return {
+            "provider": self.name,
+            "max_concurrency": self.max_concurrency,
+            "in_flight": self._in_flight,
+            "waiting": self._waiting,
+            "completed": self.completed,
+            "timeouts": self.timeouts,
+            "rejected": self.rejected
+        }
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+# Shared limiters, one per external provider
+anthropic_limiter = ProviderLimiter(
+    "anthropic",
+    max_concurrency=settings.ANTHROPIC_MAX_CONCURRENCY,
+    max_pending=settings.ANTHROPIC_MAX_PENDING,
+    timeout=settings.ANTHROPIC_TIMEOUT_SECONDS
+)
+
+vision_limiter = ProviderLimiter(
+    "google_vision",
+    max_concurrency=settings.VISION_MAX_CONCURRENCY,
+    max_pending=settings.VISION_MAX_PENDING,
+    timeout=settings.VISION_TIMEOUT_SECONDS
+)
@@ -0,0 +1,65 @@
+"""
+Learning Content Builder - LearningContent rows for generated games, quizzes and reviews
+Shared by the content endpoints and the pre-generation stage
+"""
+from typing import Any, Dict, List, Optional
+from app.models import Document, LearningContent
+from .answer_key import compile_answer_key
+
+
+def generation_params(
+    content_type: str,
+    game_type: str = "auto",
+    difficulty: str = "medium",
+    topics: Optional[List[str]] = None
+) -> Dict[str, Any]:
+    """The request parameters that shape content of a type; stored to match pre-built content"""
+    if content_type == "game":
+        return {"game_type": game_type}
+    if content_type == "quiz":
+        return {"difficulty": difficulty}
+    return {"topics": list(topics or [])}
+
+
+def build_content(
+    document: Document,
+    content_type: str,
+    data: Dict[str, Any],
+    generation: Dict[str, Any],
+    pregenerated: bool = False
+) -> LearningContent:
+    """
+    LearningContent row (not yet added to a session) for generated content
+    generation is the generation_params() the content was created with
+    """
+    analysis = document.analysis_results or {}
+    if content_type == "game":
+        title = data.get("title", "Interactive Game")
+        description = data.get("description", "")
+        duration = 10
+    elif content_type == "quiz":
+        title = data.get("title", "Practice Quiz")
+        description = "Test your knowledge with this interactive quiz"
+        duration = data.get("estimated_duration_minutes", 10)
+    else:
+        title = data.get("title", "Study Guide")
+        description = "Comprehensive study guide for review"
+        duration = data.get("estimated_study_time_minutes", 15)
+
+    return LearningContent(
+        document_id=document.id,
+        user_id=document.user_id,
+        content_type=content_type,
+        subject=document.subject,
+        title=title,
+        description=description,
+        content_json=data,
+        answer_key=compile_answer_key(data),
+        pregenerated=pregenerated,
+        content_metadata={
+            "estimated_duration_minutes": duration,
+            "learning_objectives": analysis.get("learning_objectives", []),
+            "topics": generation.get("topics", analysis.get("topics", [])),
+            "generation": generation
+        }
+    )
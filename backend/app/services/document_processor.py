@@ -0,0 +1,269 @@
+"""
+Document Processing Pipeline
+Runs OCR and content analysis for uploaded documents as background job stages
+"""
+import asyncio
+import uuid
+from typing import Dict, List, Optional
+from sqlalchemy import select
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal
+from app.models import Document
+from .job_queue import Job, JobQueue, job_queue
+from .ocr_service import OCRService, is_pdf
+from .image_preprocessing import ImageQualityError
+from .claude_service import ClaudeService
+from .pregeneration import STAGE_PREGENERATE, content_pregenerator
+from .storage import storage
+
+STAGE_OCR = "ocr"
+STAGE_OCR_BATCH = "ocr_batch"  # OCR for a set of uploads at once; documents report STAGE_OCR
+STAGE_ANALYSIS = "analysis"
+
+# Progress reported when each stage starts and finishes (percentage)
+STAGE_PROGRESS = {
+    "queued": (0, 5),
+    STAGE_OCR: (10, 60),
+    STAGE_ANALYSIS: (65, 100),
+}
+
+# Rough remaining time per stage, used for status estimates (seconds)
+STAGE_ESTIMATED_SECONDS = {
+    "queued": 2,
+    STAGE_OCR: 5,
+    STAGE_ANALYSIS: 8,
+}
+
+
+def estimate_remaining_seconds(stage: str) -> int:
+    """Estimate the remaining processing time from the current stage onwards"""
+    stages = list(STAGE_ESTIMATED_SECONDS)
+    if stage not in stages:
+        return 0
+    return sum(STAGE_ESTIMATED_SECONDS[s] for s in stages[stages.index(stage):])
+
+
+class DocumentProcessor:
+    """Stage handlers for the document processing pipeline"""
+
+    def __init__(self, queue: JobQueue):
+        """Initialize with the job queue and processing services"""
+        self.queue = queue
+        self.ocr_service = OCRService()
+        self.claude_service = ClaudeService()
+
+    def register(self):
+        """Register all pipeline stages with the job queue"""
+        self.queue.register(STAGE_OCR, self.run_ocr, on_failure=self.mark_failed)
+        self.queue.register(
+            STAGE_OCR_BATCH, self.run_ocr_batch, on_failure=self.mark_batch_failed
+        )
+        self.queue.register(STAGE_ANALYSIS, self.run_analysis, on_failure=self.mark_failed)
+        if settings.PREGENERATE_CONTENT:
+            # Speculative and best-effort: runs after the document is complete and a
+            # failure never touches the document's status
+            self.queue.register(STAGE_PREGENERATE, content_pregenerator.run)
+
+    async def submit(
+        self,
+        document_id: str,
+        ocr_engine: Optional[str] = None,
+        content_hash: Optional[str] = None
+    ) -> Job:
+        """
+        Queue a newly uploaded document for processing
+        content_hash is the sha256 computed during upload, so OCR doesn't hash the file again
+        """
+        return await self.queue.enqueue(
+            STAGE_OCR, document_id, ocr_engine=ocr_engine, content_hash=content_hash
+        )
+
+    async def submit_batch(
+        self,
+        document_ids: List[str],
+        ocr_engine: Optional[str] = None,
+        content_hashes: Optional[Dict[str, str]] = None
+    ) -> Job:
+        """
+        Queue a set of uploaded images for OCR as one job, so preprocessing and OCR
+        requests are shared; each document then continues to analysis on its own
+        """
+        return await self.queue.enqueue(
+            STAGE_OCR_BATCH,
+            f"batch:{uuid.uuid4()}",
+            document_ids=document_ids,
+            ocr_engine=ocr_engine,
+            content_hashes=content_hashes or {}
+        )
+
+    def _set_stage(self, document: Document, stage: str, progress: int, attempts: int = 0):
+        document.processing_status = "completed" if progress >= 100 else "processing"
+        document.processing_stage = stage if progress < 100 else "done"
+        document.processing_progress = progress
+        document.processing_attempts = attempts
+
+    async def _update_stage(
+        self, db, document: Document, stage: str, progress: int, attempts: int = 0
+    ):
+        self._set_stage(document, stage, progress, attempts)
+        await db.commit()
+
+    def _reject_image(self, document: Document, error: ImageQualityError, attempts: int):
+        # Retrying can't fix a blurry photo; fail fast so the user can retake it
+        document.processing_status = "error"
+        document.processing_attempts = attempts
+        document.error_message = str(error)
+        document.ocr_data = {"image_quality": error.report["quality"]}
+
+    async def run_ocr(self, job: Job):
+        """Stage 1: extract text from the uploaded image"""
+        async with AsyncSessionLocal() as db:
+            document = await db.get(Document, job.document_id)
+            if not document:
+                return
+
+            start, end = STAGE_PROGRESS[STAGE_OCR]
+            await self._update_stage(db, document, STAGE_OCR, start, job.attempts)
+
+            image_data = await storage.read(document.raw_image_uri)
+
+            if is_pdf(image_data):
+                completed_pages = {}
+                # Pages finish concurrently; an AsyncSession allows one operation at a time
+                commit_lock = asyncio.Lock()
+
+                async def report_page(page_number: int, total_pages: int, page_ocr):
+                    # Publish partial text in page order and advance progress per page
+                    async with commit_lock:
+                        completed_pages[page_number] = page_ocr
+                        document.ocr_data = {
+                            "raw_text": "\n\n".join(
+                                completed_pages[number].get("raw_text", "")
+                                for number in sorted(completed_pages)
+                            ),
+                            "pages_completed": sorted(completed_pages),
+                            "total_pages": total_pages,
+                            "partial": True
+                        }
+                        progress = start + (end - start) * len(completed_pages) // total_pages
+                        progress = min(progress, end - 1)
+                        await self._update_stage(db, document, STAGE_OCR, progress, job.attempts)
+
+                ocr_result = await self.ocr_service.process_pdf(
+                    image_data,
+                    on_page=report_page,
+                    engine=job.payload.get("ocr_engine"),
+                    owner=document.user_id
+                )
+            else:
+                try:
+                    ocr_result = await self.ocr_service.process_document(
+                        image_data,
+                        engine=job.payload.get("ocr_engine"),
+                        content_hash=job.payload.get("content_hash"),
+                        owner=document.user_id
+                    )
+                except ImageQualityError as e:
+                    self._reject_image(document, e, job.attempts)
+                    await db.commit()
+                    return
+
+            document.ocr_data = ocr_result["ocr_data"]
+            await self._update_stage(db, document, STAGE_OCR, end, job.attempts)
+
+        await self.queue.enqueue(STAGE_ANALYSIS, job.document_id)
+
+    async def run_ocr_batch(self, job: Job):
+        """Stage 1 for batch uploads: extract text from a set of images together"""
+        completed = []
+        async with AsyncSessionLocal() as db:
+            documents = (await db.scalars(
+                select(Document).where(Document.id.in_(job.payload["document_ids"]))
+            )).all()
+            if not documents:
+                return
+
+            start, end = STAGE_PROGRESS[STAGE_OCR]
+            for document in documents:
+                self._set_stage(document, STAGE_OCR, start, job.attempts)
+            await db.commit()
+
+            images = await asyncio.gather(
+                *[storage.read(document.raw_image_uri) for document in documents]
+            )
+            content_hashes = job.payload.get("content_hashes") or {}
+            results = await self.ocr_service.process_batch(
+                list(images),
+                engine=job.payload.get("ocr_engine"),
+                content_hashes=[content_hashes.get(document.id) for document in documents],
+                owners=[document.user_id for document in documents]
+            )
+            del images
+
+            for document, result in zip(documents, results):
+                if isinstance(result, ImageQualityError):
+                    self._reject_image(document, result, job.attempts)
+                elif isinstance(result, Exception):
+                    document.processing_status = "error"
+                    document.processing_attempts = job.attempts
+                    document.error_message = str(result)
+                else:
+                    document.ocr_data = result["ocr_data"]
+                    self._set_stage(document, STAGE_OCR, end, job.attempts)
+                    completed.append(document.id)
+            await db.commit()
+
+        for document_id in completed:
+            await self.queue.enqueue(STAGE_ANALYSIS, document_id)
+
+    async def run_analysis(self, job: Job):
+        """Stage 2: analyze the extracted text with Claude"""
+        async with AsyncSessionLocal() as db:
+            document = await db.get(Document, job.document_id)
+            if not document:
+                return
+
+            start, end = STAGE_PROGRESS[STAGE_ANALYSIS]
+            await self._update_stage(db, document, STAGE_ANALYSIS, start, job.attempts)
+
+            # Errors propagate so the job is retried and, once JOB_MAX_ATTEMPTS is
+            # used up, the document is marked failed instead of completed with mock data
+            analysis = await self.claude_service.analyze_homework_content(
+                ocr_text=(document.ocr_data or {}).get("raw_text", ""),
+                subject=document.subject,
+                fallback_on_error=False
+            )
+
+            document.analysis_results = analysis
+            await self._update_stage(db, document, STAGE_ANALYSIS, end, job.attempts)
+
+        if settings.PREGENERATE_CONTENT:
+            await self.queue.enqueue(STAGE_PREGENERATE, job.document_id)
+
+    async def mark_batch_failed(self, job: Job):
+        """Record a batch OCR job that exhausted its retries against all of its documents"""
+        async with AsyncSessionLocal() as db:
+            documents = (await db.scalars(
+                select(Document).where(Document.id.in_(job.payload.get("document_ids", [])))
+            )).all()
+            for document in documents:
+                document.processing_status = "error"
+                document.processing_attempts = job.attempts
+                document.error_message = job.payload.get("last_error", "OCR stage failed")
+            await db.commit()
+
+    async def mark_failed(self, job: Job):
+        """Record a stage that exhausted its retries"""
+        async with AsyncSessionLocal() as db:
+            document = await db.get(Document, job.document_id)
+            if not document:
+                return
+
+            document.processing_status = "error"
+            document.processing_attempts = job.attempts
+            document.error_message = job.payload.get("last_error", f"{job.stage} stage failed")
+            await db.commit()
+
+
+# Global pipeline instance, registered with the job queue on startup
+document_processor = DocumentProcessor(job_queue)
@@ -0,0 +1,252 @@
+"""
+Engagement Counters - Buffered view/completion counters for learning content
+Views and completions are added to an in-process (or Redis) buffer and written back
+periodically as one batch of atomic UPDATE ... SET views = views + n statements,
+so reads stay read-only and concurrent updates are never lost
+"""
+import asyncio
+from typing import Any, Dict, Optional
+from sqlalchemy import Float, bindparam, case, cast, update
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal
+from app.models import LearningContent
+
+COUNTER_FIELDS = ("views", "completions", "score_total")
+
+
+def _empty() -> Dict[str, float]:
+    return {"views": 0, "completions": 0, "score_total": 0.0}
+
+
+class MemoryCounterBackend:
+    """Per-process buffer; each API process flushes its own increments"""
+
+    def __init__(self):
+        self._pending: Dict[str, Dict[str, float]] = {}
+
+    async def add(self, content_id: str, increments: Dict[str, float]):
+        counters = self._pending.setdefault(content_id, _empty())
+        for field, amount in increments.items():
+            counters[field] += amount
+
+    async def pending(self, content_id: str) -> Dict[str, float]:
+        return dict(self._pending.get(content_id) or _empty())
+
+    async def drain(self) -> Dict[str, Dict[str, float]]:
+        drained, self._pending = self._pending, {}
+        return drained
+
+    async def size(self) -> int:
+        return len(self._pending)
+
+    async def close(self):
+        pass
+
+
+class RedisCounterBackend:
+    """
+    Buffer shared by all API processes
+    - One hash of counters per content, plus a set of content ids with pending counts
+    - drain() reads and deletes each hash in a MULTI block, so increments arriving
+      during a flush are kept for the next one
+    """
+
+    DRAIN_BATCH_SIZE = 500
+
+    def __init__(self, prefix: str):
+        import redis.asyncio as redis
+
+        self.prefix = prefix
+        self.redis = redis.Redis(
+            host=settings.REDIS_HOST,
+            port=settings.REDIS_PORT,
+            db=settings.REDIS_DB,
+            decode_responses=True
+        )
+
+    def _key(self, content_id: str) -> str:
+        return f"{self.prefix}:{content_id}"
+
+    async def ping(self) -> bool:
+        return await self.redis.ping()
+
+    async def add(self, content_id: str, increments: Dict[str, float]):
+        async with self.redis.pipeline(transaction=True) as pipe:
+            for field, amount in increments.items():
+                if field == "score_total":
+                    pipe.hincrbyfloat(self._key(content_id), field, amount)
+                else:
+                    pipe.hincrby(self._key(content_id), field, int(amount))
+            pipe.sadd(f"{self.prefix}:dirty", content_id)
+            await pipe.execute()
+
+    def _parse(self, raw: Dict[str, str]) -> Dict[str, float]:
+        counters = _empty()
+        for field, value in raw.items():
+            counters[field] = float(value) if field == "score_total" else int(value)
+        return counters
+
+    async def pending(self, content_id: str) -> Dict[str, float]:
+        return self._parse(await self.redis.hgetall(self._key(content_id)))
+
+    async def drain(self) -> Dict[str, Dict[str, float]]:
+        content_ids = await self.redis.spop(f"{self.prefix}:dirty", self.DRAIN_BATCH_SIZE)
+        drained = {}
+        for content_id in content_ids or []:
+            async with self.redis.pipeline(transaction=True) as pipe:
+                pipe.hgetall(self._key(content_id))
+                pipe.delete(self._key(content_id))
+                raw, _ = await pipe.execute()
+            if raw:
+                drained[content_id] = self._parse(raw)
+        return drained
+
+    async def size(self) -> int:
+        return await self.redis.scard(f"{self.prefix}:dirty")
+
+    async def close(self):
+        await self.redis.close()
+
+
+# One UPDATE per content, executed as a single executemany batch; the SET expressions
+# read the row's current values, so concurrent flushes from other processes add up
+_table = LearningContent.__table__
+_completions = _table.c.completions + bindparam("add_completions")
+_views = _table.c.views + bindparam("add_views")
+_score_total = _table.c.score_total + bindparam("add_score_total")
+FLUSH_STATEMENT = (
+    update(_table)
+    .where(_table.c.id == bindparam("content_id"))
+    .values(
+        views=_views,
+        completions=_completions,
+        score_total=_score_total,
+        average_score=case((_completions > 0, _score_total / _completions), else_=0.0),
+        completion_rate=cast(_completions, Float) / case((_views > 1, _views), else_=1)
+    )
+)
+
+
+class EngagementCounters:
+    """
+    Buffered engagement counters for LearningContent
+    record_view() and record_completion() only touch the buffer; flush() runs every
+    ENGAGEMENT_FLUSH_SECONDS and on shutdown
+    """
+
+    def __init__(self, backend=None):
+        self.backend = backend
+        self.flush_interval = settings.ENGAGEMENT_FLUSH_SECONDS
+        self._task: Optional[asyncio.Task] = None
+        self._flush_lock = asyncio.Lock()
+        self.flushes = 0
+        self.rows_flushed = 0
+        self.errors = 0
+
+    async def _create_backend(self):
+        if settings.ENGAGEMENT_COUNTER_BACKEND == "redis":
+            try:
+                backend = RedisCounterBackend("homework:engagement")
+                await backend.ping()
+                return backend
+            except Exception as e:
+                print(f"Redis engagement counters unavailable, buffering in memory: {e}")
+        return MemoryCounterBackend()
+
+    async def _add(self, content_id: str, increments: Dict[str, float]):
+        if self.backend is None:
+            self.backend = await self._create_backend()
+        await self.backend.add(content_id, increments)
+
+    async def record_view(self, content_id: str):
+        await self._add(content_id, {"views": 1})
+
+    async def record_completion(self, content_id: str, score: float):
+        await self._add(content_id, {"completions": 1, "score_total": score})
+
+    async def metrics(self, content: LearningContent) -> Dict[str, Any]:
+        """
+        Engagement fields for a response: the stored values plus increments not yet
+        flushed, so a client sees its own view counted
+        """
+        pending = await self.backend.pending(content.id) if self.backend else _empty()
+        views = (content.views or 0) + pending["views"]
+        completions = (content.completions or 0) + pending["completions"]
+        score_total = (content.score_total or 0.0) + pending["score_total"]
+        return {
+            "views": views,
+            "completions": completions,
+            "average_score": score_total / completions if completions else 0.0,
+            "completion_rate": completions / max(views, 1)
+        }
+
+    async def flush(self) -> int:
+        """Write buffered counts to the database; returns the number of rows updated"""
+        if self.backend is None:
+            return 0
+
+        async with self._flush_lock:
+            drained = await self.backend.drain()
+            if not drained:
+                return 0
+
+            params = [
+                {
+                    "content_id": content_id,
+                    "add_views": counters["views"],
+                    "add_completions": counters["completions"],
+                    "add_score_total": counters["score_total"]
+                }
+                for content_id, counters in drained.items()
+            ]
+            try:
+                async with AsyncSessionLocal() as db:
+                    await db.execute(FLUSH_STATEMENT, params)
+                    await db.commit()
+            except Exception as e:
+                # Put the counts back so the next flush retries them
+                self.errors += 1
+                print(f"Engagement counter flush failed: {e}")
+                for content_id, counters in drained.items():
+                    await self.backend.add(content_id, counters)
+                return 0
+
+            self.flushes += 1
+            self.rows_flushed += len(params)
+            return len(params)
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    async def start(self):
+        """Start the periodic flush task"""
+        if self.backend is None:
+            self.backend = await self._create_backend()
+        if self._task is None:
+            self._task = asyncio.create_task(self._flush_loop())
+
+    async def stop(self):
+        """Stop the flush task and write out whatever is still buffered"""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self.flush()
+        if self.backend is not None:
+            await self.backend.close()
+            self.backend = None
+
+    async def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": type(self.backend).__name__ if self.backend else None,
+            "pending": await self.backend.size() if self.backend else 0,
+            "flushes": self.flushes,
+            "rows_flushed": self.rows_flushed,
+            "errors": self.errors
+        }
+
+
+# Global engagement counters, flushed by a background task started on app startup
+engagement_counters = EngagementCounters()
@@ -2,10 +2,34 @@
 Game and Quiz Generation Service
 Creates interactive learning content using Claude AI
 """
-import json
+import asyncio
+import functools
 import random
-from typing import Dict, Any, List
+from typing import Dict, Any, AsyncIterator, List, Optional, Tuple, Type
+from pydantic import BaseModel
+from app.schemas.generation import (
+    ContentPack, ContentPackPart, GameContent, GameQuestion, QuizContent, QuizQuestion,
+    ReviewContent
+)
 from .claude_service import ClaudeService
+from .concurrency import ProviderBusyError
+from .json_stream import JSONItemStream
+from .model_router import model_router
+from .response_cache import response_cache
+from .structured_output import StructuredOutputError, structured_output
+
+JSON_ONLY = "Respond with ONLY the JSON, no additional text."
+
+# Output token allowance per content type; a content pack gets the sum, capped at the
+# model's output limit
+PART_MAX_TOKENS = {"quiz": 3072, "game": 3072, "review": 2048}
+PACK_MAX_TOKENS = 8192
+
+PART_SCHEMAS: Dict[str, Type[BaseModel]] = {
+    "quiz": QuizContent,
+    "game": GameContent,
+    "review": ReviewContent
+}
 
 
 class GameService:
@@ -15,27 +39,18 @@ class GameService:
         """Initialize with Claude service"""
         self.claude = ClaudeService()
 
-    async def generate_quiz(
+    def _quiz_prompt(
         self,
-        homework_content: str,
         subject: str,
         analysis_results: Dict[str, Any],
-        difficulty: str = "medium"
-    ) -> Dict[str, Any]:
-        """
-        Generate a comprehensive quiz based on homework content
-        """
-        if not self.claude.enabled:
-            return self._mock_quiz(subject, difficulty)
-
+        difficulty: str
+    ) -> str:
+        """Build the quiz generation prompt; the homework content is sent ahead of it"""
         topics = analysis_results.get("topics", [subject])
         key_concepts = analysis_results.get("key_concepts", [])
 
-        prompt = f"""Generate a comprehensive quiz based on this homework content with 5-8 questions
-that test different cognitive levels (from remember to analyze).
-
-HOMEWORK CONTENT:
-{homework_content}
+        return f"""Generate a comprehensive quiz based on the homework content above with 5-8
+questions that test different cognitive levels (from remember to analyze).
 
 SUBJECT: {subject}
 TOPICS: {', '.join(topics)}
@@ -77,50 +92,59 @@ Output JSON with this structure:
     "good": "Message for 70-89%",
     "needs_improvement": "Message for below 70%"
   }}
-}}
+}}"""
+
+    async def generate_quiz(
+        self,
+        homework_content: str,
+        subject: str,
+        analysis_results: Dict[str, Any],
+        difficulty: str = "medium"
+    ) -> Dict[str, Any]:
+        """
+        Generate a comprehensive quiz based on homework content
+        """
+        if not self.claude.enabled:
+            return self._mock_quiz(subject, difficulty)
 
-Respond with ONLY the JSON, no additional text."""
+        prompt = f"{self._quiz_prompt(subject, analysis_results, difficulty)}\n\n{JSON_ONLY}"
+
+        cache_key = self.claude._cache_key(
+            "quiz", prompt, document=homework_content, max_tokens=3072
+        )
+        cached = await response_cache.get("quiz", cache_key)
+        if cached is not None:
+            return cached
 
         try:
-            message = self.claude.client.messages.create(
-                model=self.claude.model,
-                max_tokens=3072,
-                system=self.claude._get_system_prompt(),
-                messages=[{"role": "user", "content": prompt}]
+            quiz = await self.claude._generate_structured(
+                "quiz", QuizContent, prompt, 3072, document=homework_content
             )
-
-            quiz = json.loads(message.content[0].text)
+            await response_cache.set("quiz", cache_key, quiz)
             return quiz
 
+        except ProviderBusyError:
+            raise
         except Exception as e:
             print(f"Quiz generation error: {e}")
             return self._mock_quiz(subject, difficulty)
 
-    async def generate_game(
+    def _game_prompt(
         self,
-        homework_content: str,
         subject: str,
         analysis_results: Dict[str, Any],
-        game_type: str = "auto"
-    ) -> Dict[str, Any]:
-        """
-        Generate an interactive game based on homework content
-        """
-        if not self.claude.enabled:
-            return self._mock_game(subject, game_type)
-
+        game_type: str
+    ) -> str:
+        """Build the game generation prompt; the homework content is sent ahead of it"""
         topics = analysis_results.get("topics", [subject])
 
-        prompt = f"""You are a creative educational game designer. Based on the homework content below,
+        return f"""You are a creative educational game designer. Based on the homework content above,
 generate an interactive game that is:
 - Engaging and age-appropriate
 - Directly aligned with the learning content
 - Completable in 5-10 minutes
 - Includes scoring/progress tracking
 
-HOMEWORK CONTENT:
-{homework_content}
-
 SUBJECT: {subject}
 TOPICS: {', '.join(topics)}
 GAME TYPE: {game_type if game_type != 'auto' else 'choose the most appropriate'}
@@ -160,41 +184,46 @@ Generate a game specification in this JSON format:
     "background_color": "#hexcolor",
     "theme": "colorful|minimalist|playful"
   }}
-}}
-
-Respond with ONLY the JSON, no additional text."""
-
-        try:
-            message = self.claude.client.messages.create(
-                model=self.claude.model,
-                max_tokens=3072,
-                system=self.claude._get_system_prompt(),
-                messages=[{"role": "user", "content": prompt}]
-            )
-
-            game = json.loads(message.content[0].text)
-            return game
-
-        except Exception as e:
-            print(f"Game generation error: {e}")
-            return self._mock_game(subject, game_type)
+}}"""
 
-    async def generate_review_material(
+    async def generate_game(
         self,
         homework_content: str,
         subject: str,
-        topics: List[str]
+        analysis_results: Dict[str, Any],
+        game_type: str = "auto"
     ) -> Dict[str, Any]:
         """
-        Create a concise study guide/summary
+        Generate an interactive game based on homework content
         """
         if not self.claude.enabled:
-            return self._mock_review(subject, topics)
+            return self._mock_game(subject, game_type)
+
+        prompt = f"{self._game_prompt(subject, analysis_results, game_type)}\n\n{JSON_ONLY}"
+
+        cache_key = self.claude._cache_key(
+            "game", prompt, document=homework_content, max_tokens=3072
+        )
+        cached = await response_cache.get("game", cache_key)
+        if cached is not None:
+            return cached
+
+        try:
+            game = await self.claude._generate_structured(
+                "game", GameContent, prompt, 3072, document=homework_content
+            )
+            await response_cache.set("game", cache_key, game)
+            return game
 
-        prompt = f"""Create a concise study guide/summary for the following homework topics:
+        except ProviderBusyError:
+            raise
+        except Exception as e:
+            print(f"Game generation error: {e}")
+            return self._mock_game(subject, game_type)
 
-HOMEWORK CONTENT:
-{homework_content}
+    def _review_prompt(self, subject: str, topics: List[str]) -> str:
+        """Build the review material prompt; the homework content is sent ahead of it"""
+        return f"""Create a concise study guide/summary for the homework content above:
 
 SUBJECT: {subject}
 TOPICS: {', '.join(topics)}
@@ -233,25 +262,415 @@ Output as structured JSON:
     }}
   ],
   "estimated_study_time_minutes": 15
-}}
+}}"""
+
+    async def generate_review_material(
+        self,
+        homework_content: str,
+        subject: str,
+        topics: List[str]
+    ) -> Dict[str, Any]:
+        """
+        Create a concise study guide/summary
+        """
+        if not self.claude.enabled:
+            return self._mock_review(subject, topics)
 
-Respond with ONLY the JSON, no additional text."""
+        prompt = f"{self._review_prompt(subject, topics)}\n\n{JSON_ONLY}"
+
+        cache_key = self.claude._cache_key(
+            "review", prompt, document=homework_content, max_tokens=2048
+        )
+        cached = await response_cache.get("review", cache_key)
+        if cached is not None:
+            return cached
 
         try:
-            message = self.claude.client.messages.create(
-                model=self.claude.model,
-                max_tokens=2048,
-                system=self.claude._get_system_prompt(),
-                messages=[{"role": "user", "content": prompt}]
+            review = await self.claude._generate_structured(
+                "review", ReviewContent, prompt, 2048, document=homework_content
             )
-
-            review = json.loads(message.content[0].text)
+            await response_cache.set("review", cache_key, review)
             return review
 
+        except ProviderBusyError:
+            raise
         except Exception as e:
             print(f"Review material generation error: {e}")
             return self._mock_review(subject, topics)
 
+    def _pack_prompt(self, parts: Dict[str, str]) -> str:
+        """Combine per-type prompts into one content pack prompt"""
+        sections = "\n\n".join(
+            f'PART "{content_type}":\n{prompt}' for content_type, prompt in parts.items()
+        )
+        return f"""Create several learning materials for the homework content above in a single
+response. Each PART below describes one material and the JSON structure it must follow.
+
+{sections}
+
+Output ONE JSON object holding every part, in the order given:
+{{
+  "parts": [
+    {{
+      "content_type": "{'|'.join(parts)}",
+      "content": {{ "...": "the JSON structure of that part" }}
+    }}
+  ]
+}}
+
+{JSON_ONLY}"""
+
+    def _pack_parts(
+        self,
+        subject: str,
+        analysis_results: Dict[str, Any],
+        content_types: List[str],
+        game_type: str,
+        difficulty: str,
+        topics: List[str]
+    ) -> Dict[str, str]:
+        builders = {
+            "quiz": lambda: self._quiz_prompt(subject, analysis_results, difficulty),
+            "game": lambda: self._game_prompt(subject, analysis_results, game_type),
+            "review": lambda: self._review_prompt(subject, topics)
+        }
+        # dict.fromkeys drops repeated types but keeps the requested order
+        return {
+            content_type: builders[content_type]()
+            for content_type in dict.fromkeys(content_types)
+        }
+
+    def _mock_part(
+        self, content_type: str, subject: str, game_type: str, difficulty: str, topics: List[str]
+    ) -> Dict[str, Any]:
+        if content_type == "quiz":
+            return self._mock_quiz(subject, difficulty)
+        if content_type == "game":
+            return self._mock_game(subject, game_type)
+        return self._mock_review(subject, topics)
+
+    async def _generate_part(
+        self,
+        content_type: str,
+        homework_content: str,
+        subject: str,
+        analysis_results: Dict[str, Any],
+        game_type: str,
+        difficulty: str,
+        topics: List[str]
+    ) -> Dict[str, Any]:
+        if content_type == "quiz":
+            return await self.generate_quiz(homework_content, subject, analysis_results, difficulty)
+        if content_type == "game":
+            return await self.generate_game(homework_content, subject, analysis_results, game_type)
+        return await self.generate_review_material(homework_content, subject, topics)
+
+    def _pack_request(self, parts: Dict[str, str], homework_content: str) -> Tuple[str, int, str]:
+        """Prompt, output token limit and response cache key of a content pack"""
+        prompt = self._pack_prompt(parts)
+        max_tokens = min(sum(PART_MAX_TOKENS[part] for part in parts), PACK_MAX_TOKENS)
+        cache_key = self.claude._cache_key(
+            "pack", prompt, document=homework_content, max_tokens=max_tokens
+        )
+        return prompt, max_tokens, cache_key
+
+    async def _complete_pack(
+        self,
+        pack: Dict[str, Dict[str, Any]],
+        content_types: List[str],
+        **part_args
+    ) -> Dict[str, Dict[str, Any]]:
+        """Fill in parts the combined response left out with single-type generation"""
+        missing = [content_type for content_type in content_types if content_type not in pack]
+        if missing:
+            print(f"Content pack missing {missing}, generating separately")
+            generated = await asyncio.gather(
+                *[self._generate_part(content_type, **part_args) for content_type in missing]
+            )
+            pack.update(zip(missing, generated))
+        return {content_type: pack[content_type] for content_type in content_types}
+
+    async def generate_content_pack(
+        self,
+        homework_content: str,
+        subject: str,
+        analysis_results: Dict[str, Any],
+        content_types: List[str],
+        game_type: str = "auto",
+        difficulty: str = "medium",
+        topics: Optional[List[str]] = None
+    ) -> Dict[str, Dict[str, Any]]:
+        """
+        Generate several content types (quiz, game, review) for a document in one call
+        The homework content and analysis are sent once instead of once per type
+        Returns {content_type: content} in the requested order
+        """
+        topics = topics if topics is not None else analysis_results.get("topics", [subject])
+        parts = self._pack_parts(
+            subject, analysis_results, content_types, game_type, difficulty, topics
+        )
+        if not self.claude.enabled:
+            return {
+                content_type: self._mock_part(content_type, subject, game_type, difficulty, topics)
+                for content_type in parts
+            }
+
+        prompt, max_tokens, cache_key = self._pack_request(parts, homework_content)
+        pack = await response_cache.get("pack", cache_key)
+
+        if pack is None:
+            try:
+                response = await self.claude._generate_structured(
+                    "pack", ContentPack, prompt, max_tokens, document=homework_content
+                )
+                pack = await self._unpack(response, parts)
+                if len(pack) == len(parts):
+                    await response_cache.set("pack", cache_key, pack)
+
+            except ProviderBusyError:
+                raise
+            except Exception as e:
+                print(f"Content pack generation error: {e}")
+                pack = {}
+
+        return await self._complete_pack(
+            pack,
+            list(parts),
+            homework_content=homework_content,
+            subject=subject,
+            analysis_results=analysis_results,
+            game_type=game_type,
+            difficulty=difficulty,
+            topics=topics
+        )
+
+    async def _unpack(
+        self, response: Dict[str, Any], parts: Dict[str, str]
+    ) -> Dict[str, Dict[str, Any]]:
+        """
+        Requested parts of a validated content pack response, by content type
+        Each part is validated against its own schema; parts that can't be repaired are
+        left out (and generated separately by _complete_pack)
+        """
+        pack = {}
+        for part in response["parts"]:
+            content_type = part["content_type"]
+            if content_type not in parts or content_type in pack:
+                continue
+            try:
+                pack[content_type] = await structured_output.validate(
+                    "pack",
+                    part["content"],
+                    PART_SCHEMAS[content_type],
+                    repair=functools.partial(self.claude._repair_fragment, "pack")
+                )
+            except ValueError as e:
+                print(f"Content pack part {content_type} dropped: {e}")
+        return pack
+
+    def _streamed_part(self, part: Any, parts: Dict[str, str]) -> Optional[Dict[str, Any]]:
+        # A pack part parsed from the stream, validated without repair (a dropped part is
+        # generated separately once the stream ends)
+        part = structured_output.validate_item("pack", part, ContentPackPart)
+        if part is None or part["content_type"] not in parts:
+            return None
+        content = structured_output.validate_item(
+            "pack", part["content"], PART_SCHEMAS[part["content_type"]]
+        )
+        return {"content_type": part["content_type"], "content": content} if content else None
+
+    async def _stream_content(
+        self,
+        endpoint: str,
+        prompt: str,
+        document: str,
+        max_tokens: int,
+        fallback: Dict[str, Any],
+        schema: Type[BaseModel],
+        question_schema: Type[BaseModel]
+    ) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+        """
+        Stream generated content as ("question", item) events followed by one
+        ("complete", content) event once the full JSON has been parsed
+        Questions are validated as they arrive and invalid ones are held back; the
+        complete content is validated (and repaired) like a non-streamed reply, and
+        regenerated on the escalation tier if it still fails
+        """
+        cache_key = self.claude._cache_key(
+            endpoint, prompt, document=document, max_tokens=max_tokens
+        )
+        cached = await response_cache.get(endpoint, cache_key)
+        if cached is not None:
+            for question in cached.get("questions", []):
+                yield "question", question
+            yield "complete", cached
+            return
+
+        parser = JSONItemStream("questions")
+        emitted = []
+
+        try:
+            async for chunk in self.claude._stream_message(
+                endpoint, **self.claude._message_params(prompt, max_tokens, document=document)
+            ):
+                for question in parser.feed(chunk):
+                    question = structured_output.validate_item(endpoint, question, question_schema)
+                    if question is not None:
+                        emitted.append(question)
+                        yield "question", question
+
+            try:
+                content = await structured_output.parse(
+                    endpoint,
+                    parser.text,
+                    schema,
+                    repair=functools.partial(self.claude._repair_fragment, endpoint)
+                )
+                held_back = [q for q in content.get("questions", []) if q not in emitted]
+            except StructuredOutputError:
+                escalated = model_router.escalation(model_router.route(endpoint))
+                if escalated is None:
+                    raise
+                content = await self.claude._generate_structured(
+                    endpoint, schema, prompt, max_tokens, document=document, tier=escalated.tier
+                )
+                # Fresh content; its questions are only sent if none were streamed
+                held_back = [] if emitted else content.get("questions", [])
+            await response_cache.set(endpoint, cache_key, content)
+
+            # Questions held back while streaming and since repaired
+            for question in held_back:
+                yield "question", question
+
+        except ProviderBusyError:
+            raise
+        except Exception as e:
+            print(f"Streaming {endpoint} generation error: {e}")
+            content = fallback
+            # Only send fallback questions if nothing was streamed yet
+            if not emitted:
+                for question in content.get("questions", []):
+                    yield "question", question
+
+        yield "complete", content
+
+    async def stream_quiz(
+        self,
+        homework_content: str,
+        subject: str,
+        analysis_results: Dict[str, Any],
+        difficulty: str = "medium"
+    ) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+        """
+        Stream a quiz question by question as the model generates it
+        """
+        if not self.claude.enabled:
+            quiz = self._mock_quiz(subject, difficulty)
+            for question in quiz["questions"]:
+                yield "question", question
+            yield "complete", quiz
+            return
+
+        prompt = f"{self._quiz_prompt(subject, analysis_results, difficulty)}\n\n{JSON_ONLY}"
+        async for event in self._stream_content(
+            "quiz", prompt, homework_content, 3072, self._mock_quiz(subject, difficulty),
+            schema=QuizContent, question_schema=QuizQuestion
+        ):
+            yield event
+
+    async def stream_game(
+        self,
+        homework_content: str,
+        subject: str,
+        analysis_results: Dict[str, Any],
+        game_type: str = "auto"
+    ) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+        """
+        Stream a game challenge by challenge as the model generates it
+        """
+        if not self.claude.enabled:
+            game = self._mock_game(subject, game_type)
+            for question in game["questions"]:
+                yield "question", question
+            yield "complete", game
+            return
+
+        prompt = f"{self._game_prompt(subject, analysis_results, game_type)}\n\n{JSON_ONLY}"
+        async for event in self._stream_content(
+            "game", prompt, homework_content, 3072, self._mock_game(subject, game_type),
+            schema=GameContent, question_schema=GameQuestion
+        ):
+            yield event
+
+    async def stream_content_pack(
+        self,
+        homework_content: str,
+        subject: str,
+        analysis_results: Dict[str, Any],
+        content_types: List[str],
+        game_type: str = "auto",
+        difficulty: str = "medium",
+        topics: Optional[List[str]] = None
+    ) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+        """
+        Stream a content pack as one ("part", {content_type, content}) event per content
+        type as soon as the model finishes it, then one ("complete", pack) event
+        """
+        topics = topics if topics is not None else analysis_results.get("topics", [subject])
+        parts = self._pack_parts(
+            subject, analysis_results, content_types, game_type, difficulty, topics
+        )
+        part_args = dict(
+            homework_content=homework_content,
+            subject=subject,
+            analysis_results=analysis_results,
+            game_type=game_type,
+            difficulty=difficulty,
+            topics=topics
+        )
+
+        if not self.claude.enabled:
+            pack = await self._complete_pack({}, list(parts), **part_args)
+            for content_type, content in pack.items():
+                yield "part", {"content_type": content_type, "content": content}
+            yield "complete", pack
+            return
+
+        prompt, max_tokens, cache_key = self._pack_request(parts, homework_content)
+        pack = await response_cache.get("pack", cache_key)
+        if pack is not None:
+            for content_type, content in pack.items():
+                yield "part", {"content_type": content_type, "content": content}
+            yield "complete", pack
+            return
+
+        parser = JSONItemStream("parts")
+        pack = {}
+        try:
+            async for chunk in self.claude._stream_message(
+                "pack", **self.claude._message_params(prompt, max_tokens, document=homework_content)
+            ):
+                for part in parser.feed(chunk):
+                    part = self._streamed_part(part, parts)
+                    if part is not None and part["content_type"] not in pack:
+                        pack[part["content_type"]] = part["content"]
+                        yield "part", part
+
+            if len(pack) == len(parts):
+                await response_cache.set("pack", cache_key, pack)
+
+        except ProviderBusyError:
+            raise
+        except Exception as e:
+            print(f"Streaming content pack generation error: {e}")
+
+        streamed = set(pack)
+        pack = await self._complete_pack(pack, list(parts), **part_args)
+        for content_type, content in pack.items():
+            if content_type not in streamed:
+                yield "part", {"content_type": content_type, "content": content}
+        yield "complete", pack
+
     def _mock_quiz(self, subject: str, difficulty: str) -> Dict[str, Any]:
         """Mock quiz when Claude is not available"""
         return {
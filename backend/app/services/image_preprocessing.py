@@ -0,0 +1,402 @@
+"""
+Image Preprocessing - Vectorized OpenCV/NumPy pipeline run ahead of OCR
+Crop-to-page, deskew, denoise, adaptive binarization and a fast quality score
+CPU-heavy work runs in a process pool so it never blocks the API event loop
+Each image is decoded once; it is only re-encoded when its pixels changed
+"""
+import asyncio
+import hashlib
+import io
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from typing import Dict, Any, List, Optional, Tuple
+import cv2
+import numpy as np
+from PIL import Image, ImageOps
+from app.core.config import settings
+
+MAX_DIMENSION = 4096
+
+# dHash grid: 16x16 gradient bits = 256-bit perceptual hash
+PHASH_SIZE = 16
+
+# Ink-to-paper separation (in gray levels) treated as full contrast
+FULL_CONTRAST = 80.0
+# Closing size (px at the 1024px scoring size) wider than any pen or pencil stroke
+BACKGROUND_KERNEL = 25
+
+
+class ImageQualityError(Exception):
+    """Raised when an image is too poor to be worth an OCR call"""
+
+    def __init__(self, message: str, report: Dict[str, Any]):
+        self.report = report
+        super().__init__(message)
+
+    def __reduce__(self):
+        # Keep the report when the error crosses the process pool boundary
+        return self.__class__, (str(self), self.report)
+
+
+@dataclass
+class PreparedImage:
+    """
+    An image ready for OCR, carried between pipeline stages
+    - data: bytes to send to the OCR engine (the original upload when nothing changed)
+    - hashes: pixel and perceptual hashes of the decoded image, for the OCR cache
+    - stages: per-stage byte counts and timings
+    """
+    data: bytes
+    format: str
+    width: int = 0
+    height: int = 0
+    reencoded: bool = False
+    report: Dict[str, Any] = field(default_factory=dict)
+    hashes: Dict[str, Any] = field(default_factory=dict)
+    stages: Dict[str, Dict[str, Any]] = field(default_factory=dict)
+
+
+def decode_image(image_data: bytes) -> Tuple[np.ndarray, str, bool]:
+    """
+    Decode image bytes straight to an 8-bit grayscale array, applying EXIF orientation
+    Oversized JPEGs are downscaled in the DCT domain while decoding (Image.draft),
+    so the full-resolution bitmap is never materialized
+    Returns (array, source format, whether the pixels differ from the source image)
+    """
+    image = Image.open(io.BytesIO(image_data))
+    source_format = (image.format or "unknown").lower()
+    source_size = image.size
+
+    if image.format == "JPEG" and max(source_size) > MAX_DIMENSION:
+        ratio = MAX_DIMENSION / max(source_size)
+        image.draft("L", (int(source_size[0] * ratio), int(source_size[1] * ratio)))
+
+    orientation = image.getexif().get(0x0112, 1)
+    image = ImageOps.exif_transpose(image)
+    if image.mode != "L":
+        image = image.convert("L")
+
+    gray = np.asarray(image)
+    changed = image.size != source_size or orientation != 1
+
+    resized = limit_size(gray)
+    return resized, source_format, changed or resized is not gray
+
+
+def image_hashes(gray: np.ndarray) -> Dict[str, Any]:
+    """
+    Pixel hash and 256-bit difference hash (dHash) of a decoded grayscale image
+    The pixel hash ignores encoding and EXIF rotation, so re-saved copies match exactly
+    """
+    height, width = gray.shape[:2]
+    pixel_hash = hashlib.sha256(
+        f"{width}x{height}:".encode("ascii") + np.ascontiguousarray(gray).tobytes()
+    ).hexdigest()
+
+    # Compare horizontally adjacent pixels of a 17x16 thumbnail
+    thumb = cv2.resize(gray, (PHASH_SIZE + 1, PHASH_SIZE), interpolation=cv2.INTER_AREA)
+    bits = (thumb[:, :-1] > thumb[:, 1:]).ravel()
+    perceptual_hash = int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+    return {"pixel_hash": pixel_hash, "perceptual_hash": perceptual_hash}
+
+
+def limit_size(image: np.ndarray, max_dimension: int = MAX_DIMENSION) -> np.ndarray:
+    height, width = image.shape[:2]
+    if max(height, width) <= max_dimension:
+        return image
+    ratio = max_dimension / max(height, width)
+    return cv2.resize(
+        image, (int(width * ratio), int(height * ratio)), interpolation=cv2.INTER_AREA
+    )
+
+
+def quality_score(gray: np.ndarray) -> Dict[str, Any]:
+    """
+    Fast image quality estimate, measured on the writing rather than the whole frame
+    so a sparse page (a few lines on a mostly blank sheet) isn't penalized
+    - contrast: ink-to-paper separation, the gap between the mean intensities of
+      the two Otsu classes after evening out the lighting
+    - sharpness: variance of the Laplacian around the ink strokes, relative to the
+      squared separation so pencil and pen score alike (low means blurry)
+    - resolution: shorter side relative to MIN_IMAGE_RESOLUTION
+    """
+    height, width = gray.shape[:2]
+
+    # Measure on a bounded size so the score doesn't depend on resolution
+    sample = limit_size(gray, 1024)
+    # Divide out uneven lighting: closing erases the strokes, leaving the paper's brightness
+    background = cv2.morphologyEx(
+        sample, cv2.MORPH_CLOSE, np.ones((BACKGROUND_KERNEL, BACKGROUND_KERNEL), np.uint8)
+    )
+    sample = cv2.divide(sample, np.maximum(background, 1), scale=255)
+    _, mask = cv2.threshold(sample, 0, 255, cv2.THRESH_BINARY_INV | cv2.THRESH_OTSU)
+    ink = mask > 0
+    contrast = sharpness = 0.0
+    if ink.any() and not ink.all():
+        contrast = float(sample[~ink].mean() - sample[ink].mean())
+        strokes = cv2.dilate(mask, np.ones((5, 5), np.uint8)) > 0
+        laplacian = cv2.Laplacian(sample, cv2.CV_64F)
+        sharpness = float(laplacian[strokes].var()) / max(contrast, 1.0) ** 2
+
+    sharpness_factor = min(sharpness / settings.IMAGE_SHARPNESS_THRESHOLD, 1.0)
+    resolution_factor = min(min(height, width) / settings.MIN_IMAGE_RESOLUTION, 1.0)
+    contrast_factor = min(contrast / FULL_CONTRAST, 1.0)
+
+    # Blur or faint writing each make OCR useless on their own; low resolution only hurts
+    score = min(sharpness_factor, contrast_factor) * (0.5 + 0.5 * resolution_factor)
+
+    return {
+        "score": round(score, 3),
+        "sharpness": round(sharpness, 4),
+        "contrast": round(contrast, 2),
+        "width": width,
+        "height": height
+    }
+
+
+def _order_corners(points: np.ndarray) -> np.ndarray:
+    sums = points.sum(axis=1)
+    diffs = np.diff(points, axis=1).ravel()
+    return np.array([
+        points[np.argmin(sums)],
+        points[np.argmin(diffs)],
+        points[np.argmax(sums)],
+        points[np.argmax(diffs)]
+    ], dtype=np.float32)
+
+
+def crop_to_page(gray: np.ndarray) -> Tuple[np.ndarray, bool]:
+    """
+    Find the sheet of paper in a photo and warp it to a flat rectangle
+    Returns the input unchanged when no clear page outline is found
+    """
+    scale = 800 / max(gray.shape[:2])
+    small = cv2.resize(gray, None, fx=scale, fy=scale) if scale < 1 else gray
+    scale = min(scale, 1.0)
+
+    edges = cv2.Canny(cv2.GaussianBlur(small, (5, 5), 0), 50, 150)
+    edges = cv2.dilate(edges, np.ones((3, 3), np.uint8))
+    contours, _ = cv2.findContours(edges, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    if not contours:
+        return gray, False
+
+    contour = max(contours, key=cv2.contourArea)
+    if cv2.contourArea(contour) < 0.3 * small.shape[0] * small.shape[1]:
+        return gray, False
+
+    approx = cv2.approxPolyDP(contour, 0.02 * cv2.arcLength(contour, True), True)
+    if len(approx) != 4:
+        return gray, False
+
+    corners = _order_corners(approx.reshape(4, 2).astype(np.float32) / scale)
+    top_left, top_right, bottom_right, bottom_left = corners
+    width = int(max(
+        np.linalg.norm(top_right - top_left), np.linalg.norm(bottom_right - bottom_left)
+    ))
+    height = int(max(
+        np.linalg.norm(bottom_left - top_left), np.linalg.norm(bottom_right - top_right)
+    ))
+
+    target = np.array(
+        [[0, 0], [width - 1, 0], [width - 1, height - 1], [0, height - 1]], dtype=np.float32
+    )
+    matrix = cv2.getPerspectiveTransform(corners, target)
+    return cv2.warpPerspective(gray, matrix, (width, height)), True
+
+
+def deskew(gray: np.ndarray) -> Tuple[np.ndarray, float]:
+    """
+    Straighten rotated text using the minimum-area rectangle around dark pixels
+    Returns the rotated image and the correction angle in degrees
+    """
+    _, mask = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY_INV | cv2.THRESH_OTSU)
+    coords = cv2.findNonZero(mask)
+    if coords is None or len(coords) < 100:
+        return gray, 0.0
+
+    angle = cv2.minAreaRect(coords)[-1]
+    # OpenCV reports angles in (0, 90]; map to the smallest rotation
+    if angle > 45:
+        angle -= 90
+    if abs(angle) < settings.PREPROCESS_MIN_SKEW_DEGREES or abs(angle) > 30:
+        return gray, 0.0
+
+    height, width = gray.shape[:2]
+    matrix = cv2.getRotationMatrix2D((width / 2, height / 2), angle, 1.0)
+    rotated = cv2.warpAffine(
+        gray, matrix, (width, height), flags=cv2.INTER_CUBIC, borderMode=cv2.BORDER_REPLICATE
+    )
+    return rotated, float(angle)
+
+
+def denoise(gray: np.ndarray) -> np.ndarray:
+    """Remove speckle noise while keeping stroke edges"""
+    return cv2.medianBlur(gray, 3)
+
+
+def binarize(gray: np.ndarray) -> np.ndarray:
+    """Adaptive thresholding, robust to uneven lighting across the page"""
+    return cv2.adaptiveThreshold(
+        gray, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, 31, 15
+    )
+
+
+def encode_for_wire(gray: np.ndarray, binary: bool) -> Tuple[bytes, str]:
+    """
+    Encode processed pixels in the smallest format that keeps them OCR-safe
+    Binarized pages become 1-bit PNGs; grayscale pages use whichever of JPEG or PNG is smaller
+    """
+    if binary:
+        output = io.BytesIO()
+        Image.fromarray(gray).convert("1", dither=Image.Dither.NONE).save(output, format="PNG")
+        return output.getvalue(), "png"
+
+    candidates = []
+    ok, encoded = cv2.imencode(".jpg", gray, [cv2.IMWRITE_JPEG_QUALITY, 90])
+    if ok:
+        candidates.append((encoded.tobytes(), "jpeg"))
+    ok, encoded = cv2.imencode(".png", gray, [cv2.IMWRITE_PNG_COMPRESSION, 6])
+    if ok:
+        candidates.append((encoded.tobytes(), "png"))
+    if not candidates:
+        raise ValueError("Failed to encode preprocessed image")
+    return min(candidates, key=lambda candidate: len(candidate[0]))
+
+
+def _elapsed_ms(start: float) -> float:
+    return round((time.perf_counter() - start) * 1000, 2)
+
+
+def prepare_image(image_data: bytes) -> PreparedImage:
+    """
+    Full preprocessing pipeline for one image (runs in a worker process)
+    Raises ImageQualityError when the image scores below IMAGE_QUALITY_MIN_SCORE
+    """
+    stages: Dict[str, Dict[str, Any]] = {}
+
+    start = time.perf_counter()
+    gray, source_format, changed = decode_image(image_data)
+    stages["decode"] = {
+        "ms": _elapsed_ms(start), "bytes_in": len(image_data), "pixels": int(gray.size)
+    }
+
+    start = time.perf_counter()
+    hashes = image_hashes(gray)
+    quality = quality_score(gray)
+    stages["analyze"] = {"ms": _elapsed_ms(start)}
+
+    report: Dict[str, Any] = {"quality": quality, "steps": []}
+    if quality["score"] < settings.IMAGE_QUALITY_MIN_SCORE:
+        raise ImageQualityError(
+            f"Image quality too low for OCR (score {quality['score']:.2f}); "
+            "please retake the photo in good light and hold the camera steady",
+            report
+        )
+
+    start = time.perf_counter()
+    if settings.PREPROCESS_CROP:
+        gray, cropped = crop_to_page(gray)
+        if cropped:
+            report["steps"].append("crop")
+
+    if settings.PREPROCESS_DESKEW:
+        gray, angle = deskew(gray)
+        if angle:
+            report["steps"].append("deskew")
+            report["skew_degrees"] = round(angle, 2)
+
+    if settings.PREPROCESS_DENOISE:
+        gray = denoise(gray)
+        report["steps"].append("denoise")
+
+    if settings.PREPROCESS_BINARIZE:
+        gray = binarize(gray)
+        report["steps"].append("binarize")
+    stages["transform"] = {"ms": _elapsed_ms(start), "steps": list(report["steps"])}
+
+    height, width = gray.shape[:2]
+    if not changed and not report["steps"]:
+        # Untouched pixels: send the upload as-is instead of re-encoding it
+        stages["encode"] = {"ms": 0.0, "bytes_out": len(image_data), "format": source_format}
+        return PreparedImage(
+            image_data, source_format, width, height, False, report, hashes, stages
+        )
+
+    start = time.perf_counter()
+    data, wire_format = encode_for_wire(gray, binary="binarize" in report["steps"])
+    stages["encode"] = {"ms": _elapsed_ms(start), "bytes_out": len(data), "format": wire_format}
+    return PreparedImage(data, wire_format, width, height, True, report, hashes, stages)
+
+
+_pool: Optional[ProcessPoolExecutor] = None
+
+
+def get_preprocess_pool() -> ProcessPoolExecutor:
+    """Shared process pool for CPU-heavy image work"""
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=settings.PREPROCESS_WORKERS)
+    return _pool
+
+
+def shutdown_preprocess_pool():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+async def preprocess_batch(images: List[bytes]) -> List[Any]:
+    """
+    Preprocess several images in parallel on the process pool
+    Each result is a PreparedImage, or the exception raised for that image
+    """
+    loop = asyncio.get_running_loop()
+    pool = get_preprocess_pool()
+    return await asyncio.gather(
+        *[loop.run_in_executor(pool, prepare_image, image) for image in images],
+        return_exceptions=True
+    )
+
+
+class PipelineStats:
+    """Running byte counts and timings per pipeline stage, for monitoring"""
+
+    def __init__(self):
+        self.images = 0
+        self.reencoded = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.stage_ms: Dict[str, float] = {}
+        self.stage_counts: Dict[str, int] = {}
+
+    def record(self, prepared: PreparedImage, bytes_in: int):
+        self.images += 1
+        self.reencoded += int(prepared.reencoded)
+        self.bytes_in += bytes_in
+        self.bytes_out += len(prepared.data)
+        for stage, stats in prepared.stages.items():
+            self.record_stage(stage, stats.get("ms", 0.0))
+
+    def record_stage(self, stage: str, ms: float):
+        self.stage_ms[stage] = self.stage_ms.get(stage, 0.0) + ms
+        self.stage_counts[stage] = self.stage_counts.get(stage, 0) + 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "images": self.images,
+            "reencoded": self.reencoded,
+            "bytes_in": self.bytes_in,
+            "bytes_out": self.bytes_out,
+            "bytes_saved": self.bytes_in - self.bytes_out,
+            "avg_stage_ms": {
+                stage: round(total / self.stage_counts[stage], 2)
+                for stage, total in self.stage_ms.items()
+            }
+        }
+
+
+# Global stats shared by all OCRService instances
+pipeline_stats = PipelineStats()
@@ -0,0 +1,370 @@
+"""
+Job Queue Service - Durable background processing for document pipelines
+Backed by Redis, with a SQLite fallback for local runs and tests
+"""
+import asyncio
+import json
+import sqlite3
+import threading
+import time
+import uuid
+from dataclasses import dataclass, field, asdict
+from typing import Dict, Any, List, Optional, Callable, Awaitable
+from app.core.config import settings
+
+
+@dataclass
+class Job:
+    """A unit of work for a single pipeline stage of a document"""
+    stage: str
+    document_id: str
+    payload: Dict[str, Any] = field(default_factory=dict)
+    id: str = field(default_factory=lambda: str(uuid.uuid4()))
+    attempts: int = 0
+    deferrals: int = 0
+    enqueued_at: float = field(default_factory=time.time)
+
+    def to_json(self) -> str:
+        return json.dumps(asdict(self))
+
+    @classmethod
+    def from_json(cls, raw: str) -> "Job":
+        return cls(**json.loads(raw))
+
+
+JobHandler = Callable[[Job], Awaitable[None]]
+
+
+class JobDeferred(Exception):
+    """
+    Raised by a handler to put its job back for later without using up an attempt
+    A job deferred more than JOB_MAX_DEFERRALS times is dropped
+    """
+
+    def __init__(self, delay: float):
+        self.delay = delay
+        super().__init__(f"deferred for {delay:.1f}s")
+
+
+class RedisJobBackend:
+    """
+    Redis-backed queue
+    - One ready list per stage, moved atomically to a processing list on reserve
+    - Delayed retries live in a sorted set scored by due time
+    - Leases let crashed workers' jobs be recovered after the visibility timeout
+    """
+
+    def __init__(self, name: str):
+        import redis.asyncio as redis
+
+        self.name = name
+        self.redis = redis.Redis(
+            host=settings.REDIS_HOST,
+            port=settings.REDIS_PORT,
+            db=settings.REDIS_DB,
+            decode_responses=True
+        )
+        self._raw: Dict[str, str] = {}
+
+    def _key(self, stage: str, kind: str) -> str:
+        return f"{self.name}:{stage}:{kind}"
+
+    async def ping(self) -> bool:
+        return await self.redis.ping()
+
+    async def enqueue(self, job: Job, delay: float = 0.0):
+        raw = job.to_json()
+        if delay > 0:
+            await self.redis.zadd(self._key(job.stage, "delayed"), {raw: time.time() + delay})
+        else:
+            await self.redis.lpush(self._key(job.stage, "ready"), raw)
+
+    async def _promote_delayed(self, stage: str):
+        delayed_key = self._key(stage, "delayed")
+        due = await self.redis.zrangebyscore(delayed_key, 0, time.time())
+        for raw in due:
+            # Only the worker that removes the entry requeues it
+            if await self.redis.zrem(delayed_key, raw):
+                await self.redis.lpush(self._key(stage, "ready"), raw)
+
+    async def reserve(self, stage: str, timeout: float) -> Optional[Job]:
+        await self._promote_delayed(stage)
+        raw = await self.redis.blmove(
+            self._key(stage, "ready"),
+            self._key(stage, "processing"),
+            timeout,
+            "RIGHT",
+            "LEFT"
+        )
+        if raw is None:
+            return None
+
+        job = Job.from_json(raw)
+        self._raw[job.id] = raw
+        await self.redis.hset(self._key(stage, "leases"), job.id, time.time())
+        return job
+
+    async def ack(self, job: Job):
+        raw = self._raw.pop(job.id, None)
+        if raw is not None:
+            await self.redis.lrem(self._key(job.stage, "processing"), 1, raw)
+        await self.redis.hdel(self._key(job.stage, "leases"), job.id)
+
+    async def retry(self, job: Job, delay: float):
+        await self.ack(job)
+        await self.enqueue(job, delay=delay)
+
+    async def recover(self, stage: str, visibility_timeout: float) -> int:
+        """Requeue in-flight jobs whose lease has expired"""
+        processing_key = self._key(stage, "processing")
+        leases_key = self._key(stage, "leases")
+        recovered = 0
+
+        for raw in await self.redis.lrange(processing_key, 0, -1):
+            job = Job.from_json(raw)
+            if job.id in self._raw:
+                continue
+            leased_at = await self.redis.hget(leases_key, job.id)
+            if leased_at and time.time() - float(leased_at) < visibility_timeout:
+                continue
+            if await self.redis.lrem(processing_key, 1, raw):
+                await self.redis.hdel(leases_key, job.id)
+                await self.redis.lpush(self._key(stage, "ready"), raw)
+                recovered += 1
+
+        return recovered
+
+    async def close(self):
+        await self.redis.close()
+
+
+class SQLiteJobBackend:
+    """
+    SQLite-backed queue for local development and tests
+    Use ":memory:" as the path for a purely in-process queue
+    """
+
+    POLL_INTERVAL_SECONDS = 0.2
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                stage TEXT NOT NULL,
+                data TEXT NOT NULL,
+                available_at REAL NOT NULL,
+                reserved_at REAL
+            )"""
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS ix_jobs_ready ON jobs (stage, reserved_at, available_at)"
+        )
+
+    async def ping(self) -> bool:
+        return True
+
+    def _enqueue_sync(self, job: Job, delay: float):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO jobs (id, stage, data, available_at, reserved_at) "
+                "VALUES (?, ?, ?, ?, NULL)",
+                (job.id, job.stage, job.to_json(), time.time() + delay)
+            )
+
+    async def enqueue(self, job: Job, delay: float = 0.0):
+        await asyncio.to_thread(self._enqueue_sync, job, delay)
+
+    def _reserve_sync(self, stage: str) -> Optional[Job]:
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    "SELECT id, data FROM jobs WHERE stage = ? AND reserved_at IS NULL "
+                    "AND available_at <= ? ORDER BY available_at LIMIT 1",
+                    (stage, now)
+                ).fetchone()
+                if row:
+                    self._conn.execute(
+                        "UPDATE jobs SET reserved_at = ? WHERE id = ?", (now, row[0])
+                    )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return Job.from_json(row[1]) if row else None
+
+    async def reserve(self, stage: str, timeout: float) -> Optional[Job]:
+        deadline = time.monotonic() + timeout
+        while True:
+            job = await asyncio.to_thread(self._reserve_sync, stage)
+            if job is not None or time.monotonic() >= deadline:
+                return job
+            await asyncio.sleep(self.POLL_INTERVAL_SECONDS)
+
+    def _ack_sync(self, job: Job):
+        with self._lock:
+            self._conn.execute("DELETE FROM jobs WHERE id = ?", (job.id,))
+
+    async def ack(self, job: Job):
+        await asyncio.to_thread(self._ack_sync, job)
+
+    async def retry(self, job: Job, delay: float):
+        await self.enqueue(job, delay=delay)
+
+    def _recover_sync(self, stage: str, visibility_timeout: float) -> int:
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE jobs SET reserved_at = NULL WHERE stage = ? AND reserved_at < ?",
+                (stage, time.time() - visibility_timeout)
+            )
+            return cursor.rowcount
+
+    async def recover(self, stage: str, visibility_timeout: float) -> int:
+        return await asyncio.to_thread(self._recover_sync, stage, visibility_timeout)
+
+    async def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class JobQueue:
+    """
+    Worker pool over a durable job backend
+    Each stage gets its own workers, so JOB_STAGE_CONCURRENCY caps concurrent work per stage
+    """
+
+    RESERVE_TIMEOUT_SECONDS = 1.0
+    RECOVER_INTERVAL_SECONDS = 60.0
+
+    def __init__(self, backend=None):
+        self.backend = backend
+        self.max_attempts = settings.JOB_MAX_ATTEMPTS
+        self.retry_backoff = settings.JOB_RETRY_BACKOFF_SECONDS
+        self.max_deferrals = settings.JOB_MAX_DEFERRALS
+        self.stage_concurrency = dict(settings.JOB_STAGE_CONCURRENCY)
+        self._handlers: Dict[str, JobHandler] = {}
+        self._failure_handlers: Dict[str, JobHandler] = {}
+        self._workers: List[asyncio.Task] = []
+        self._running = False
+
+    async def _create_backend(self):
+        if settings.JOB_QUEUE_BACKEND == "redis":
+            try:
+                backend = RedisJobBackend(settings.JOB_QUEUE_NAME)
+                await backend.ping()
+                return backend
+            except Exception as e:
+                print(f"Redis job queue unavailable, falling back to SQLite: {e}")
+        return SQLiteJobBackend(settings.JOB_QUEUE_SQLITE_PATH)
+
+    def register(
+        self,
+        stage: str,
+        handler: JobHandler,
+        on_failure: Optional[JobHandler] = None,
+        concurrency: Optional[int] = None
+    ):
+        """Register the handler for a stage and, optionally, a final-failure callback"""
+        self._handlers[stage] = handler
+        if on_failure:
+            self._failure_handlers[stage] = on_failure
+        if concurrency is not None:
+            self.stage_concurrency[stage] = concurrency
+        self.stage_concurrency.setdefault(stage, 1)
+
+    async def enqueue(self, stage: str, document_id: str, **payload) -> Job:
+        """Persist a new job for a stage"""
+        if self.backend is None:
+            self.backend = await self._create_backend()
+
+        job = Job(stage=stage, document_id=document_id, payload=payload)
+        await self.backend.enqueue(job)
+        return job
+
+    async def start(self):
+        """Start the worker pool"""
+        if self._running:
+            return
+        if self.backend is None:
+            self.backend = await self._create_backend()
+
+        self._running = True
+        for stage in self._handlers:
+            await self.backend.recover(stage, settings.JOB_VISIBILITY_TIMEOUT_SECONDS)
+            for index in range(max(self.stage_concurrency.get(stage, 1), 1)):
+                self._workers.append(asyncio.create_task(self._worker_loop(stage, index)))
+
+    async def stop(self):
+        """Stop all workers and release the backend"""
+        self._running = False
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        if self.backend is not None:
+            await self.backend.close()
+            self.backend = None
+
+    async def _worker_loop(self, stage: str, index: int):
+        last_recover = time.monotonic()
+
+        while self._running:
+            try:
+                # One worker per stage periodically reclaims jobs from crashed processes
+                if index == 0 and time.monotonic() - last_recover > self.RECOVER_INTERVAL_SECONDS:
+                    await self.backend.recover(stage, settings.JOB_VISIBILITY_TIMEOUT_SECONDS)
+                    last_recover = time.monotonic()
+
+                job = await self.backend.reserve(stage, self.RESERVE_TIMEOUT_SECONDS)
+                if job is None:
+                    continue
+
+                await self._run(job)
+
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Job worker error ({stage}): {e}")
+                await asyncio.sleep(self.RESERVE_TIMEOUT_SECONDS)
+
+    async def _run(self, job: Job):
+        job.attempts += 1
+
+        try:
+            await self._handlers[job.stage](job)
+            await self.backend.ack(job)
+
+        except JobDeferred as e:
+            job.attempts -= 1
+            job.deferrals += 1
+            if job.deferrals > self.max_deferrals:
+                # e.g. a low-priority stage whose precondition never clears
+                print(f"Job {job.id} ({job.stage}) dropped after {self.max_deferrals} deferrals")
+                await self.backend.ack(job)
+                return
+            await self.backend.retry(job, e.delay)
+
+        except Exception as e:
+            if job.attempts < self.max_attempts:
+                delay = self.retry_backoff * (2 ** (job.attempts - 1))
+                print(f"Job {job.id} ({job.stage}) failed, retrying in {delay:.1f}s: {e}")
+                job.payload["last_error"] = str(e)
+                await self.backend.retry(job, delay)
+                return
+
+            print(f"Job {job.id} ({job.stage}) failed after {job.attempts} attempts: {e}")
+            job.payload["last_error"] = str(e)
+            failure_handler = self._failure_handlers.get(job.stage)
+            try:
+                if failure_handler:
+                    await failure_handler(job)
+            finally:
+                await self.backend.ack(job)
+
+
+# Global job queue instance
+job_queue = JobQueue()
@@ -0,0 +1,113 @@
+"""
+Incremental JSON Parsing for streamed LLM output
+Emits each element of a top-level array field as soon as it is complete
+"""
+import json
+from typing import Dict, Any, List, Optional
+
+
+class JSONItemStream:
+    """
+    Incrementally scans streamed JSON text for the elements of one array field
+    (e.g. "questions") of the top-level object.
+
+    Text before the first "{" (preamble, code fences) is ignored. Feed chunks with
+    feed(); it returns the array elements completed by that chunk. Call result()
+    after the stream ends to parse the whole object.
+    """
+
+    def __init__(self, array_key: str = "questions"):
+        self.array_key = array_key
+        self._text = ""
+        self._root = 0
+        self._started = False
+        self._stack: List[str] = []
+        self._in_string = False
+        self._escape = False
+        self._string_start = 0
+        self._last_string: Optional[str] = None
+        self._pending_key: Optional[str] = None
+        self._array_depth: Optional[int] = None
+        self._item_start: Optional[int] = None
+        self._end: Optional[int] = None
+
+    @property
+    def text(self) -> str:
+        return self._text
+
+    def feed(self, chunk: str) -> List[Dict[str, Any]]:
+        """Consume a chunk of text and return any newly completed array elements"""
+        items = []
+        scanned = len(self._text)
+        self._text += chunk
+        text = self._text
+
+        for position in range(scanned, len(text)):
+            char = text[position]
+
+            if self._end is not None:
+                break
+
+            if not self._started:
+                if char != "{":
+                    continue
+                self._started = True
+                self._root = position
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == "\\":
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+                    self._last_string = text[self._string_start + 1:position]
+                continue
+
+            if char == '"':
+                self._in_string = True
+                self._string_start = position
+            elif char == ":":
+                # A string followed by ":" at the root object's level is a key
+                if len(self._stack) == 1:
+                    self._pending_key = self._last_string
+            elif char in "{[":
+                if (
+                    char == "["
+                    and len(self._stack) == 1
+                    and self._pending_key == self.array_key
+                ):
+                    self._array_depth = len(self._stack) + 1
+                elif self._array_depth is not None and len(self._stack) == self._array_depth:
+                    self._item_start = position
+                self._stack.append(char)
+            elif char in "}]":
+                if self._stack:
+                    self._stack.pop()
+
+                if (
+                    self._item_start is not None
+                    and self._array_depth is not None
+                    and len(self._stack) == self._array_depth
+                ):
+                    try:
+                        items.append(json.loads(text[self._item_start:position + 1]))
+                    except json.JSONDecodeError:
+                        pass
+                    self._item_start = None
+                elif self._array_depth is not None and len(self._stack) < self._array_depth:
+                    self._array_depth = None
+                    self._pending_key = None
+
+                if not self._stack:
+                    self._end = position
+            elif char == "," and len(self._stack) == 1:
+                self._pending_key = None
+
+        return items
+
+    def result(self) -> Dict[str, Any]:
+        """Parse the complete top-level object; raises ValueError if it is incomplete"""
+        if not self._started or self._end is None:
+            raise ValueError("Streamed JSON object is incomplete")
+        return json.loads(self.text[self._root:self._end + 1])
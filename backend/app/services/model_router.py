@@ -0,0 +1,145 @@
+"""
+Model Routing - Which Claude model serves each operation
+Operations map to tiers (MODEL_ROUTES) and each tier sets the model, a max_tokens cap,
+temperature and timeout (MODEL_TIERS), so short high-volume calls like hints and
+feedback run on a small model. Replies that still fail validation are escalated to
+MODEL_ESCALATION_TIER; latency and cost are counted per operation and tier
+"""
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
+from app.core.config import settings
+from .prompt_budget import usage_counts
+
+# Price multipliers for prompt cache writes and reads, relative to plain input tokens
+CACHE_WRITE_PRICE_FACTOR = 1.25
+CACHE_READ_PRICE_FACTOR = 0.1
+
+
+@dataclass(frozen=True)
+class ModelRoute:
+    """The model and request settings one operation is sent with"""
+    operation: str
+    tier: str
+    model: str
+    max_tokens: int
+    temperature: float
+    timeout_seconds: float
+    input_cost_per_mtok: float = 0.0
+    output_cost_per_mtok: float = 0.0
+
+    def apply(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        """Messages API parameters with this route's model, limits and timeout"""
+        return {
+            **params,
+            "model": self.model,
+            "max_tokens": min(params.get("max_tokens", self.max_tokens), self.max_tokens),
+            "temperature": self.temperature,
+            "timeout": self.timeout_seconds
+        }
+
+    def cost(self, usage: Any) -> float:
+        """Cost in USD of one call's token usage"""
+        counts = usage_counts(usage)
+        input_tokens = (
+            counts["input_tokens"]
+            + counts["cache_creation_input_tokens"] * CACHE_WRITE_PRICE_FACTOR
+            + counts["cache_read_input_tokens"] * CACHE_READ_PRICE_FACTOR
+        )
+        return (
+            input_tokens * self.input_cost_per_mtok
+            + counts["output_tokens"] * self.output_cost_per_mtok
+        ) / 1_000_000
+
+
+class ModelRouter:
+    """Resolves routes and keeps call, escalation, latency and cost counters per route"""
+
+    def __init__(self):
+        self.by_route: Dict[str, Dict[str, Dict[str, Any]]] = {}
+
+    def route(self, operation: str, tier: Optional[str] = None) -> ModelRoute:
+        """
+        Route for an operation, or for an explicit tier (repairs and escalations)
+        Unknown operations and tiers fall back to MODEL_DEFAULT_TIER
+        """
+        default_tier = settings.MODEL_DEFAULT_TIER
+        tier = tier or settings.MODEL_ROUTES.get(operation, default_tier)
+        if tier not in settings.MODEL_TIERS:
+            print(f"Unknown model tier '{tier}' for {operation}, using {default_tier}")
+            tier = default_tier
+        config = settings.MODEL_TIERS[tier]
+        timeout = config.get("timeout_seconds", settings.ANTHROPIC_TIMEOUT_SECONDS)
+        return ModelRoute(
+            operation=operation,
+            tier=tier,
+            model=config["model"],
+            max_tokens=int(config.get("max_tokens", 4096)),
+            temperature=float(config.get("temperature", 1.0)),
+            timeout_seconds=float(timeout),
+            input_cost_per_mtok=float(config.get("input_cost_per_mtok", 0.0)),
+            output_cost_per_mtok=float(config.get("output_cost_per_mtok", 0.0))
+        )
+
+    def escalation(self, route: ModelRoute) -> Optional[ModelRoute]:
+        """
+        The route to retry a failed call on, or None when escalation is off or the
+        call already ran on the escalation tier's model
+        """
+        tier = settings.MODEL_ESCALATION_TIER
+        if not tier or tier not in settings.MODEL_TIERS:
+            return None
+        escalated = self.route(route.operation, tier)
+        if escalated.model == route.model:
+            return None
+        self._counters(escalated)["escalations"] += 1
+        print(f"Escalating {route.operation} from {route.tier} to {escalated.tier}")
+        return escalated
+
+    def _counters(self, route: ModelRoute) -> Dict[str, Any]:
+        return self.by_route.setdefault(route.operation, {}).setdefault(
+            route.tier,
+            {
+                "model": route.model,
+                "calls": 0,
+                "escalations": 0,
+                "latency_seconds": 0.0,
+                "cost_usd": 0.0
+            }
+        )
+
+    def record(self, route: ModelRoute, usage: Any, latency_seconds: float):
+        """Add one API call made on route"""
+        counters = self._counters(route)
+        counters["calls"] += 1
+        counters["latency_seconds"] += latency_seconds
+        counters["cost_usd"] += route.cost(usage)
+
+    def snapshot(self) -> Dict[str, Any]:
+        routes = {
+            operation: {
+                tier: {
+                    "model": counters["model"],
+                    "calls": counters["calls"],
+                    "escalations": counters["escalations"],
+                    "average_latency_seconds": (
+                        round(counters["latency_seconds"] / counters["calls"], 3)
+                        if counters["calls"] else 0.0
+                    ),
+                    "cost_usd": round(counters["cost_usd"], 6)
+                }
+                for tier, counters in tiers.items()
+            }
+            for operation, tiers in self.by_route.items()
+        }
+        total_cost = sum(
+            counters["cost_usd"] for tiers in self.by_route.values() for counters in tiers.values()
+        )
+        return {
+            "routes": routes,
+            "total_cost_usd": round(total_cost, 6),
+            "escalation_tier": settings.MODEL_ESCALATION_TIER
+        }
+
+
+# Global router shared by ClaudeService and GameService
+model_router = ModelRouter()
@@ -0,0 +1,225 @@
+"""
+OCR Result Cache - Content-addressed cache in front of the OCR pipeline
+Exact matches by byte and pixel hash, near-duplicate photos by perceptual hash
+(near-duplicates only among one user's own uploads)
+"""
+import asyncio
+import hashlib
+from dataclasses import dataclass
+from typing import Dict, Any, List, Optional, Tuple
+from app.core.config import settings
+from .cache import CacheStats, create_cache_backend
+from .image_preprocessing import PHASH_SIZE, decode_image, image_hashes
+
+PHASH_BITS = PHASH_SIZE * PHASH_SIZE
+
+
+@dataclass
+class ImageFingerprint:
+    """
+    Hashes identifying an uploaded image, plus the scope it is cached in
+    engine is the resolved OCR engine policy; owner is the uploading user
+    """
+    content_hash: str
+    engine: str = "auto"
+    owner: Optional[str] = None
+    pixel_hash: Optional[str] = None
+    perceptual_hash: Optional[int] = None
+
+    @property
+    def near_duplicate_scope(self) -> Optional[str]:
+        # Two students' photos of the same printed worksheet are usually within the
+        # perceptual distance but carry different handwritten answers, so near-duplicate
+        # matches never cross users; without an owner there is no near-duplicate lookup
+        return f"{self.engine}:{self.owner}" if self.owner else None
+
+
+def compute_image_hashes(image_data: bytes) -> Dict[str, Any]:
+    """
+    Decode an image and compute its normalized pixel hash and dHash
+    Used only when the preprocessing stage didn't already hash the decoded image
+    """
+    gray, _, _ = decode_image(image_data)
+    return image_hashes(gray)
+
+
+class OCRCache:
+    """
+    Multi-level OCR result cache, keyed per OCR engine policy
+    1. <engine>:raw:<sha256 of upload bytes>  -> pixel hash (no decode needed on re-uploads)
+    2. <engine>:px:<normalized pixel hash>    -> OCR result
+    3. <engine>:<user>:band:<i>:<bits>        -> the user's perceptual hashes sharing that
+                                                 band, for near-duplicate lookup within
+                                                 OCR_CACHE_PHASH_DISTANCE
+    Exact byte and pixel matches are shared between users (identical pixels carry
+    identical text); near-duplicates are not
+    Entries expire with DOCUMENT_RETENTION_DAYS so cached text never outlives the documents
+    """
+
+    def __init__(self, backend=None):
+        self.enabled = settings.OCR_CACHE_ENABLED
+        self.backend = backend or create_cache_backend(
+            settings.OCR_CACHE_BACKEND, "ocr", max_entries=settings.OCR_CACHE_MAX_ENTRIES
+        )
+        self.ttl = settings.DOCUMENT_RETENTION_DAYS * 24 * 3600
+        self.max_distance = settings.OCR_CACHE_PHASH_DISTANCE
+        self.stats = CacheStats()
+
+    def _bands(self, scope: str, perceptual_hash: int) -> List[str]:
+        # With max_distance + 1 bands, any hash within max_distance bits shares at least one band
+        band_count = self.max_distance + 1
+        width = PHASH_BITS // band_count
+        bands = []
+        for index in range(band_count):
+            bits = PHASH_BITS - index * width if index == band_count - 1 else width
+            value = (perceptual_hash >> (index * width)) & ((1 << bits) - 1)
+            bands.append(f"{scope}:band:{index}:{value:x}")
+        return bands
+
+    async def _ensure_hashes(self, fingerprint: ImageFingerprint, image_data: bytes):
+        if fingerprint.pixel_hash is None:
+            hashes = await asyncio.to_thread(compute_image_hashes, image_data)
+            fingerprint.pixel_hash = hashes["pixel_hash"]
+            fingerprint.perceptual_hash = hashes["perceptual_hash"]
+
+    async def _find_near_duplicate(self, fingerprint: ImageFingerprint) -> Optional[str]:
+        scope = fingerprint.near_duplicate_scope
+        if self.max_distance <= 0 or scope is None:
+            return None
+
+        perceptual_hash = fingerprint.perceptual_hash
+        best_hash, best_distance = None, self.max_distance + 1
+        for band_key in self._bands(scope, perceptual_hash):
+            for candidate in await self.backend.get(band_key) or []:
+                distance = bin(int(candidate, 16) ^ perceptual_hash).count("1")
+                if distance < best_distance:
+                    best_hash, best_distance = candidate, distance
+
+        if best_hash is None:
+            return None
+        return await self.backend.get(f"{scope}:ph:{best_hash}")
+
+    def fingerprint(
+        self,
+        image_data: bytes,
+        content_hash: Optional[str] = None,
+        engine: str = "auto",
+        owner: Optional[str] = None
+    ) -> ImageFingerprint:
+        """
+        Content hash of the upload bytes; image hashes are filled in later
+        engine is the resolved OCR engine policy and owner the uploading user's id
+        """
+        return ImageFingerprint(
+            content_hash=content_hash or hashlib.sha256(image_data).hexdigest(),
+            engine=engine,
+            owner=owner
+        )
+
+    async def get_exact(self, fingerprint: ImageFingerprint) -> Optional[Dict[str, Any]]:
+        """
+        Look up a re-upload of the exact same bytes, without decoding the image
+        Misses aren't counted here; get_similar() records the final outcome
+        """
+        if not self.enabled:
+            return None
+
+        try:
+            engine = fingerprint.engine
+            pixel_hash = await self.backend.get(f"{engine}:raw:{fingerprint.content_hash}")
+            if pixel_hash:
+                result = await self.backend.get(f"{engine}:px:{pixel_hash}")
+                if result is not None:
+                    self.stats.hit("exact")
+                    return result
+        except Exception as e:
+            self.stats.error()
+            print(f"OCR cache lookup error: {e}")
+
+        return None
+
+    async def get_similar(
+        self,
+        image_data: bytes,
+        fingerprint: ImageFingerprint
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Look up an image with identical pixels, or a near-duplicate photo the same
+        user uploaded before
+        Uses the fingerprint's image hashes when set, otherwise decodes the image
+        """
+        if not self.enabled:
+            return None
+
+        try:
+            await self._ensure_hashes(fingerprint, image_data)
+            engine = fingerprint.engine
+
+            result = await self.backend.get(f"{engine}:px:{fingerprint.pixel_hash}")
+            if result is not None:
+                self.stats.hit("pixel")
+                return result
+
+            near_pixel_hash = await self._find_near_duplicate(fingerprint)
+            if near_pixel_hash:
+                result = await self.backend.get(f"{engine}:px:{near_pixel_hash}")
+                if result is not None:
+                    self.stats.hit("perceptual")
+                    return result
+
+        except Exception as e:
+            self.stats.error()
+            print(f"OCR cache lookup error: {e}")
+            return None
+
+        self.stats.miss()
+        return None
+
+    async def get(
+        self,
+        image_data: bytes,
+        engine: str = "auto",
+        owner: Optional[str] = None
+    ) -> Tuple[Optional[Dict[str, Any]], ImageFingerprint]:
+        """
+        Look up a cached OCR result for an image
+        Returns (result or None, fingerprint); pass the fingerprint to set() on a miss
+        """
+        fingerprint = self.fingerprint(image_data, engine=engine, owner=owner)
+        result = await self.get_exact(fingerprint)
+        if result is None:
+            result = await self.get_similar(image_data, fingerprint)
+        return result, fingerprint
+
+    async def set(self, image_data: bytes, fingerprint: ImageFingerprint, result: Dict[str, Any]):
+        """Store an OCR result under all of the image's hashes"""
+        if not self.enabled:
+            return
+
+        try:
+            await self._ensure_hashes(fingerprint, image_data)
+            engine = fingerprint.engine
+            pixel_hash = fingerprint.pixel_hash
+
+            await self.backend.set(f"{engine}:px:{pixel_hash}", result, self.ttl)
+            await self.backend.set(
+                f"{engine}:raw:{fingerprint.content_hash}", pixel_hash, self.ttl
+            )
+
+            scope = fingerprint.near_duplicate_scope
+            if self.max_distance > 0 and scope is not None:
+                phash_hex = f"{fingerprint.perceptual_hash:x}"
+                await self.backend.set(f"{scope}:ph:{phash_hex}", pixel_hash, self.ttl)
+                for band_key in self._bands(scope, fingerprint.perceptual_hash):
+                    members = await self.backend.get(band_key) or []
+                    if phash_hex not in members:
+                        members = (members + [phash_hex])[-settings.OCR_CACHE_BAND_SIZE:]
+                        await self.backend.set(band_key, members, self.ttl)
+
+        except Exception as e:
+            self.stats.error()
+            print(f"OCR cache store error: {e}")
+
+
+# Global OCR cache shared by all OCRService instances
+ocr_cache = OCRCache()
@@ -0,0 +1,269 @@
+"""
+OCR Engines - Pluggable text extraction backends
+Google Cloud Vision (cloud) and Tesseract (local, offline) behind a common interface
+"""
+import asyncio
+import io
+import shutil
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Any, List, Optional
+from google.cloud import vision
+from app.core.config import settings
+from .concurrency import ProviderLimiter, vision_limiter
+
+
+def detect_languages(text: str) -> List[str]:
+    """
+    Detect languages in the text
+    """
+    languages = []
+
+    # Simple heuristic-based language detection
+    # Check for Hebrew characters
+    if any('\u0590' <= c <= '\u05FF' for c in text):
+        languages.append("hebrew")
+
+    # Check for English characters
+    if any('a' <= c.lower() <= 'z' for c in text):
+        languages.append("english")
+
+    # Check for mathematical symbols
+    math_symbols = set("+-×÷=≠<>≤≥∑∫√π")
+    if any(c in math_symbols for c in text):
+        languages.append("mathematics")
+
+    return languages if languages else ["unknown"]
+
+
+def _average_confidence(pages: List[Dict[str, Any]]) -> float:
+    confidences = [block["confidence"] for page in pages for block in page["blocks"]]
+    return sum(confidences) / len(confidences) if confidences else 0.0
+
+
+class OCREngine:
+    """Base class for OCR engines; lower cost engines are tried first by the auto policy"""
+
+    name = "base"
+    cost = 0
+
+    def available(self) -> bool:
+        return False
+
+    async def extract(self, image_data: bytes) -> Dict[str, Any]:
+        raise NotImplementedError
+
+    async def extract_batch(self, images: List[bytes]) -> List[Any]:
+        """
+        Extract text from several images; each result is an OCR result or the exception
+        raised for that image. Engines with a native batch API override this
+        """
+        return await asyncio.gather(
+            *[self.extract(image) for image in images], return_exceptions=True
+        )
+
+
+class GoogleVisionEngine(OCREngine):
+    """Cloud OCR using Google Cloud Vision document text detection"""
+
+    name = "google_vision"
+    cost = 10
+
+    def __init__(self):
+        """Initialize Google Cloud Vision client"""
+        try:
+            self.client = vision.ImageAnnotatorClient()
+            self.enabled = True
+        except Exception as e:
+            print(f"Google Cloud Vision not configured: {e}")
+            self.client = None
+            self.enabled = False
+
+    def available(self) -> bool:
+        return self.enabled
+
+    def _parse_response(self, response) -> Dict[str, Any]:
+        if response.error.message:
+            raise Exception(response.error.message)
+
+        # Extract full text
+        full_text = response.full_text_annotation.text if response.full_text_annotation else ""
+
+        # Extract structured data
+        pages = []
+        if response.full_text_annotation and response.full_text_annotation.pages:
+            for page in response.full_text_annotation.pages:
+                page_data = {
+                    "width": page.width,
+                    "height": page.height,
+                    "blocks": []
+                }
+
+                for block in page.blocks:
+                    block_text = ""
+                    for paragraph in block.paragraphs:
+                        for word in paragraph.words:
+                            word_text = "".join([symbol.text for symbol in word.symbols])
+                            block_text += word_text + " "
+
+                    page_data["blocks"].append({
+                        "text": block_text.strip(),
+                        "confidence": block.confidence if hasattr(block, 'confidence') else 0.9
+                    })
+
+                pages.append(page_data)
+
+        return {
+            "raw_text": full_text,
+            "confidence_score": _average_confidence(pages),
+            "extraction_method": self.name,
+            "pages": pages,
+            "language_hints": detect_languages(full_text)
+        }
+
+    async def extract(self, image_data: bytes) -> Dict[str, Any]:
+        image = vision.Image(content=image_data)
+
+        # Perform document text detection on the Vision executor, off the event loop
+        response = await vision_limiter.call_sync(
+            self.client.document_text_detection, image=image
+        )
+        return self._parse_response(response)
+
+    async def extract_batch(self, images: List[bytes]) -> List[Any]:
+        """
+        OCR several images with batch_annotate_images, VISION_BATCH_SIZE images per request
+        Requests for different chunks run concurrently under the Vision limiter
+        """
+        feature = vision.Feature(type_=vision.Feature.Type.DOCUMENT_TEXT_DETECTION)
+        chunks = [
+            images[start:start + settings.VISION_BATCH_SIZE]
+            for start in range(0, len(images), settings.VISION_BATCH_SIZE)
+        ]
+
+        async def annotate(chunk: List[bytes]) -> List[Any]:
+            requests = [
+                vision.AnnotateImageRequest(
+                    image=vision.Image(content=image_data), features=[feature]
+                )
+                for image_data in chunk
+            ]
+            try:
+                batch = await vision_limiter.call_sync(
+                    self.client.batch_annotate_images, requests=requests
+                )
+            except Exception as e:
+                return [e] * len(chunk)
+
+            results = []
+            for response in batch.responses:
+                try:
+                    results.append(self._parse_response(response))
+                except Exception as e:
+                    results.append(e)
+            return results
+
+        chunk_results = await asyncio.gather(*[annotate(chunk) for chunk in chunks])
+        return [result for results in chunk_results for result in results]
+
+
+def _tesseract_extract(image_data: bytes, languages: str) -> Dict[str, Any]:
+    """
+    Run Tesseract on one image (executed in a worker process)
+    Words are grouped into blocks with the same shape as the Vision output
+    """
+    import pytesseract
+    from PIL import Image
+
+    image = Image.open(io.BytesIO(image_data))
+    data = pytesseract.image_to_data(
+        image, lang=languages, output_type=pytesseract.Output.DICT
+    )
+
+    blocks: Dict[tuple, Dict[str, Any]] = {}
+    for index, word in enumerate(data["text"]):
+        confidence = float(data["conf"][index])
+        if not word.strip() or confidence < 0:
+            continue
+        block = blocks.setdefault(
+            (data["page_num"][index], data["block_num"][index]),
+            {"words": [], "confidences": []}
+        )
+        block["words"].append(word)
+        block["confidences"].append(confidence / 100)
+
+    page = {"width": image.width, "height": image.height, "blocks": []}
+    for block in blocks.values():
+        page["blocks"].append({
+            "text": " ".join(block["words"]),
+            "confidence": sum(block["confidences"]) / len(block["confidences"])
+        })
+
+    return {
+        "raw_text": "\n".join(block["text"] for block in page["blocks"]),
+        "pages": [page]
+    }
+
+
+class TesseractEngine(OCREngine):
+    """
+    Local OCR using Tesseract, run in a process pool so it never blocks the API loop
+    Requires the tesseract binary and the language packs in OCR_LOCAL_LANGUAGES
+    """
+
+    name = "tesseract"
+    cost = 1
+
+    def __init__(self):
+        self.languages = settings.OCR_LOCAL_LANGUAGES
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self.limiter = ProviderLimiter(
+            "tesseract",
+            max_concurrency=settings.OCR_LOCAL_WORKERS,
+            max_pending=settings.OCR_LOCAL_WORKERS * 8,
+            timeout=settings.VISION_TIMEOUT_SECONDS
+        )
+        try:
+            import pytesseract  # noqa: F401
+            self.enabled = shutil.which("tesseract") is not None
+        except ImportError:
+            self.enabled = False
+
+    def available(self) -> bool:
+        return self.enabled
+
+    @property
+    def pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=settings.OCR_LOCAL_WORKERS)
+        return self._pool
+
+    async def extract(self, image_data: bytes) -> Dict[str, Any]:
+        result = await self.limiter.call_sync(
+            _tesseract_extract, image_data, self.languages, executor=self.pool
+        )
+
+        return {
+            "raw_text": result["raw_text"],
+            "confidence_score": _average_confidence(result["pages"]),
+            "extraction_method": self.name,
+            "pages": result["pages"],
+            "language_hints": detect_languages(result["raw_text"])
+        }
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+
+# Engine registry; add engines with register_engine()
+OCR_ENGINES: Dict[str, OCREngine] = {}
+
+
+def register_engine(engine: OCREngine):
+    """Make an OCR engine selectable by name"""
+    OCR_ENGINES[engine.name] = engine
+
+
+register_engine(TesseractEngine())
+register_engine(GoogleVisionEngine())
@@ -2,127 +2,198 @@
 OCR Service - Document text extraction using Google Cloud Vision
 """
 import io
+import asyncio
 import base64
-from typing import Dict, Any, List, Optional
-from PIL import Image
-import numpy as np
-from google.cloud import vision
-from google.cloud.vision_v1 import types
+import threading
+import time
+from typing import Dict, Any, List, Optional, Callable, Awaitable, Tuple
+import pypdfium2 as pdfium
 from app.core.config import settings
+from .concurrency import ProviderBusyError
+from .image_preprocessing import (
+    ImageQualityError, PreparedImage, get_preprocess_pool, pipeline_stats, prepare_image,
+    preprocess_batch
+)
+from .ocr_cache import ImageFingerprint, ocr_cache
+from .ocr_engines import OCR_ENGINES, OCREngine, detect_languages
 
 
-class OCRService:
-    """Service for OCR processing using Google Cloud Vision API"""
-
-    def __init__(self):
-        """Initialize Google Cloud Vision client"""
-        try:
-            self.client = vision.ImageAnnotatorClient()
-            self.use_google_vision = True
-        except Exception as e:
-            print(f"Google Cloud Vision not configured: {e}")
-            self.use_google_vision = False
-
-    async def preprocess_image(self, image_data: bytes) -> bytes:
-        """
-        Preprocess image for better OCR results
-        - Quality assessment
-        - Rotation correction
-        - Noise reduction
-        """
-        try:
-            image = Image.open(io.BytesIO(image_data))
+# PDFium is not thread-safe; all document access is serialized
+_pdfium_lock = threading.Lock()
 
-            # Convert to RGB if needed
-            if image.mode != 'RGB':
-                image = image.convert('RGB')
+PageCallback = Callable[[int, int, Dict[str, Any]], Awaitable[None]]
 
-            # Resize if too large
-            max_dimension = 4096
-            if max(image.size) > max_dimension:
-                ratio = max_dimension / max(image.size)
-                new_size = tuple(int(dim * ratio) for dim in image.size)
-                image = image.resize(new_size, Image.Resampling.LANCZOS)
 
-            # Convert back to bytes
-            output = io.BytesIO()
-            image.save(output, format='JPEG', quality=95)
-            return output.getvalue()
+def is_pdf(data: bytes) -> bool:
+    """Check for the PDF file signature"""
+    return data[:5] == b"%PDF-"
 
-        except Exception as e:
-            print(f"Image preprocessing error: {e}")
-            return image_data
 
-    async def extract_text_google_vision(self, image_data: bytes) -> Dict[str, Any]:
-        """
-        Extract text using Google Cloud Vision API
-        """
-        if not self.use_google_vision:
-            return await self.extract_text_fallback(image_data)
+def _open_pdf(pdf_data: bytes) -> "pdfium.PdfDocument":
+    with _pdfium_lock:
+        return pdfium.PdfDocument(pdf_data)
 
-        try:
-            image = vision.Image(content=image_data)
 
-            # Perform document text detection
-            response = self.client.document_text_detection(image=image)
+def _close_pdf(pdf: "pdfium.PdfDocument"):
+    with _pdfium_lock:
+        pdf.close()
 
-            if response.error.message:
-                raise Exception(response.error.message)
 
-            # Extract full text
-            full_text = response.full_text_annotation.text if response.full_text_annotation else ""
+def _render_pdf_page(pdf: "pdfium.PdfDocument", page_index: int, dpi: int) -> bytes:
+    """
+    Rasterize a single PDF page to grayscale PNG bytes
+    The PNG is only a hand-off to the preprocessing pool, so it is compressed lightly
+    """
+    with _pdfium_lock:
+        page = pdf[page_index]
+        try:
+            image = page.render(scale=dpi / 72, grayscale=True).to_pil()
+        finally:
+            page.close()
 
-            # Extract structured data
-            pages = []
-            if response.full_text_annotation and response.full_text_annotation.pages:
-                for page in response.full_text_annotation.pages:
-                    page_data = {
-                        "width": page.width,
-                        "height": page.height,
-                        "blocks": []
-                    }
+    output = io.BytesIO()
+    image.save(output, format="PNG", compress_level=1)
+    return output.getvalue()
 
-                    for block in page.blocks:
-                        block_text = ""
-                        for paragraph in block.paragraphs:
-                            for word in paragraph.words:
-                                word_text = "".join([symbol.text for symbol in word.symbols])
-                                block_text += word_text + " "
 
-                        page_data["blocks"].append({
-                            "text": block_text.strip(),
-                            "confidence": block.confidence if hasattr(block, 'confidence') else 0.9
-                        })
+class OCRService:
+    """Service for OCR processing over pluggable engines (Google Cloud Vision, Tesseract)"""
 
-                    pages.append(page_data)
+    def __init__(self):
+        """Initialize with the shared OCR engine registry and result cache"""
+        self.engines = OCR_ENGINES
+        self.use_google_vision = self.engines["google_vision"].available()
+        self.cache = ocr_cache
 
-            # Calculate overall confidence
-            confidences = []
-            for page in pages:
-                for block in page["blocks"]:
-                    confidences.append(block["confidence"])
+    async def preprocess_image(self, image_data: bytes) -> PreparedImage:
+        """
+        Preprocess image for better OCR results (on the preprocessing process pool)
+        - Quality assessment; raises ImageQualityError for images too poor to OCR
+        - Crop to page and rotation correction
+        - Noise reduction and adaptive binarization
+        The image is decoded once and only re-encoded when its pixels changed
+        """
+        loop = asyncio.get_running_loop()
+        try:
+            prepared = await loop.run_in_executor(
+                get_preprocess_pool(), prepare_image, image_data
+            )
+        except ImageQualityError:
+            raise
+        except Exception as e:
+            print(f"Image preprocessing error: {e}")
+            return PreparedImage(image_data, "unknown")
 
-            avg_confidence = sum(confidences) / len(confidences) if confidences else 0.0
+        pipeline_stats.record(prepared, len(image_data))
+        return prepared
 
-            return {
-                "raw_text": full_text,
-                "confidence_score": avg_confidence,
-                "extraction_method": "google_vision",
-                "pages": pages,
-                "language_hints": self._detect_languages(full_text)
-            }
+    def resolve_engine_policy(self, requested: Optional[str] = None) -> str:
+        """
+        Pick the OCR engine policy: an explicit engine name, or "auto" (cheap-first)
+        Unknown or unavailable engines fall back to "auto"
+        """
+        policy = requested or settings.OCR_ENGINE_POLICY
+        if policy != "auto":
+            engine = self.engines.get(policy)
+            if not engine or not engine.available():
+                policy = "auto"
+        return policy
+
+    def _engine_candidates(self, engine: Optional[str]) -> List[OCREngine]:
+        policy = self.resolve_engine_policy(engine)
+        if policy != "auto":
+            return [self.engines[policy]]
+        return sorted(
+            (e for e in self.engines.values() if e.available()),
+            key=lambda e: e.cost
+        )
+
+    async def extract_text(self, image_data: bytes, engine: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Extract text with the requested engine, or with the cheap-first policy:
+        local engines run first and cloud engines are only called when the best
+        result so far is below OCR_CONFIDENCE_THRESHOLD
+        """
+        candidates = self._engine_candidates(engine)
+
+        best = None
+        for candidate in candidates:
+            try:
+                result = await candidate.extract(image_data)
+            except ProviderBusyError:
+                # Another engine may still have capacity
+                if candidate is candidates[-1] and best is None:
+                    raise
+                continue
+            except Exception as e:
+                print(f"{candidate.name} OCR error: {e}")
+                continue
+
+            if best is None or result["confidence_score"] > best["confidence_score"]:
+                best = result
+            if best["confidence_score"] >= settings.OCR_CONFIDENCE_THRESHOLD:
+                break
+
+        return best or await self.extract_text_fallback(image_data)
+
+    async def extract_text_batch(
+        self,
+        images: List[bytes],
+        engine: Optional[str] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Batch version of extract_text(): each engine receives all images still needing a
+        better result in one extract_batch() call (one round trip per Vision batch)
+        """
+        candidates = self._engine_candidates(engine)
+        best: List[Optional[Dict[str, Any]]] = [None] * len(images)
+        busy: Optional[ProviderBusyError] = None
+
+        for candidate in candidates:
+            pending = [
+                index for index, result in enumerate(best)
+                if result is None
+                or result["confidence_score"] < settings.OCR_CONFIDENCE_THRESHOLD
+            ]
+            if not pending:
+                break
+
+            results = await candidate.extract_batch([images[index] for index in pending])
+            for index, result in zip(pending, results):
+                if isinstance(result, ProviderBusyError):
+                    busy = result
+                    continue
+                if isinstance(result, Exception):
+                    print(f"{candidate.name} OCR error: {result}")
+                    continue
+                current = best[index]
+                if current is None or result["confidence_score"] > current["confidence_score"]:
+                    best[index] = result
+
+        if busy is not None and any(result is None for result in best):
+            # Let the job retry later rather than storing placeholder text
+            raise busy
+
+        return [
+            result or await self.extract_text_fallback(image_data)
+            for result, image_data in zip(best, images)
+        ]
 
-        except Exception as e:
-            print(f"Google Vision OCR error: {e}")
-            return await self.extract_text_fallback(image_data)
+    async def extract_text_google_vision(self, image_data: bytes) -> Dict[str, Any]:
+        """
+        Extract text using Google Cloud Vision API
+        """
+        return await self.extract_text(image_data, engine="google_vision")
 
     async def extract_text_fallback(self, image_data: bytes) -> Dict[str, Any]:
         """
-        Fallback OCR method (basic implementation)
-        In production, this could use Tesseract or another OCR library
+        Fallback OCR method used when no engine is available or all engines failed
         """
         return {
-            "raw_text": "[OCR text would be extracted here - please configure Google Cloud Vision]",
+            "raw_text": (
+                "[OCR text would be extracted here - "
+                "please configure Google Cloud Vision or Tesseract]"
+            ),
             "confidence_score": 0.5,
             "extraction_method": "fallback",
             "pages": [],
@@ -133,23 +204,7 @@ class OCRService:
         """
         Detect languages in the text
         """
-        languages = []
-
-        # Simple heuristic-based language detection
-        # Check for Hebrew characters
-        if any('\u0590' <= c <= '\u05FF' for c in text):
-            languages.append("hebrew")
-
-        # Check for English characters
-        if any('a' <= c.lower() <= 'z' for c in text):
-            languages.append("english")
-
-        # Check for mathematical symbols
-        math_symbols = set("+-×÷=≠<>≤≥∑∫√π")
-        if any(c in math_symbols for c in text):
-            languages.append("mathematics")
-
-        return languages if languages else ["unknown"]
+        return detect_languages(text)
 
     async def validate_text(self, ocr_result: Dict[str, Any]) -> Dict[str, Any]:
         """
@@ -209,24 +264,244 @@ class OCRService:
             "total_pages": len(pages)
         }
 
-    async def process_document(self, image_data: bytes) -> Dict[str, Any]:
+    def _merge_pages(self, page_results: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Merge per-page OCR results (in page order) into a single OCR result
+        Pages skipped by the quality check don't count towards confidence
+        """
+        raw_texts = []
+        pages = []
+        methods = []
+        confidences = []
+
+        for page_number, page_ocr in enumerate(page_results, start=1):
+            raw_texts.append(page_ocr.get("raw_text", ""))
+            if page_ocr.get("extraction_method") != "skipped":
+                methods.append(page_ocr.get("extraction_method", "fallback"))
+                confidences.append(page_ocr.get("confidence_score", 0.0))
+            for page in page_ocr.get("pages", []) or [{"blocks": []}]:
+                pages.append({**page, "page_number": page_number})
+
+        full_text = "\n\n".join(text for text in raw_texts if text)
+
+        return {
+            "raw_text": full_text,
+            "confidence_score": sum(confidences) / len(confidences) if confidences else 0.0,
+            "extraction_method": (
+                methods[0] if len(set(methods)) == 1 else "mixed" if methods else "skipped"
+            ),
+            "pages": pages,
+            "language_hints": self._detect_languages(full_text)
+        }
+
+    async def process_pdf(
+        self,
+        pdf_data: bytes,
+        on_page: Optional[PageCallback] = None,
+        engine: Optional[str] = None,
+        owner: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        OCR a multi-page PDF (owner is the uploading user, see process_document())
+        - Pages are rasterized lazily, only once a concurrency slot is free, so at most
+          PDF_OCR_CONCURRENCY rasterized pages are held in memory at once
+        - Pages are OCR'd concurrently and merged back in page order
+        - on_page(page_number, total_pages, page_ocr) is awaited as each page finishes
+        """
+        pdf = await asyncio.to_thread(_open_pdf, pdf_data)
+        try:
+            return await self._process_pdf_pages(pdf, on_page, engine, owner)
+        finally:
+            await asyncio.to_thread(_close_pdf, pdf)
+
+    async def _process_pdf_pages(
+        self,
+        pdf: "pdfium.PdfDocument",
+        on_page: Optional[PageCallback],
+        engine: Optional[str],
+        owner: Optional[str]
+    ) -> Dict[str, Any]:
+        total_pages = len(pdf)
+        if total_pages == 0:
+            raise ValueError("PDF has no pages")
+        if total_pages > settings.PDF_MAX_PAGES:
+            raise ValueError(
+                f"PDF has {total_pages} pages; the maximum is {settings.PDF_MAX_PAGES}"
+            )
+
+        semaphore = asyncio.Semaphore(settings.PDF_OCR_CONCURRENCY)
+        page_results: List[Optional[Dict[str, Any]]] = [None] * total_pages
+
+        async def process_page(page_index: int):
+            async with semaphore:
+                page_image = await asyncio.to_thread(
+                    _render_pdf_page, pdf, page_index, settings.PDF_RENDER_DPI
+                )
+                try:
+                    page_ocr = (
+                        await self.process_document(page_image, engine=engine, owner=owner)
+                    )["ocr_data"]
+                except ImageQualityError as e:
+                    # Blank or unreadable pages are skipped rather than failing the document
+                    print(f"PDF page {page_index + 1} skipped: {e}")
+                    page_ocr = {
+                        "raw_text": "",
+                        "confidence_score": 0.0,
+                        "extraction_method": "skipped",
+                        "pages": [],
+                        "image_quality": e.report["quality"]
+                    }
+                del page_image
+
+            page_results[page_index] = page_ocr
+            if on_page:
+                await on_page(page_index + 1, total_pages, page_ocr)
+
+        await asyncio.gather(*[process_page(index) for index in range(total_pages)])
+
+        ocr_result = self._merge_pages(page_results)
+        validation = await self.validate_text(ocr_result)
+        structured_content = await self.structure_content(ocr_result)
+
+        return {
+            "ocr_data": ocr_result,
+            "processing_quality": validation,
+            "content": structured_content
+        }
+
+    async def process_document(
+        self,
+        image_data: bytes,
+        engine: Optional[str] = None,
+        content_hash: Optional[str] = None,
+        owner: Optional[str] = None
+    ) -> Dict[str, Any]:
         """
         Complete OCR processing pipeline
+        Identical images, and near-duplicates of owner's earlier uploads, are served
+        from the OCR cache
+        engine selects an OCR engine by name, or "auto" for the cheap-first policy
+        content_hash is the image's sha256 when already known (computed during upload)
+        owner is the uploading user's id; without it only exact matches are cached
         """
-        # Step 1: Preprocess
-        processed_image = await self.preprocess_image(image_data)
+        fingerprint = self.cache.fingerprint(
+            image_data, content_hash, engine=self.resolve_engine_policy(engine), owner=owner
+        )
+        cached = await self.cache.get_exact(fingerprint)
+        if cached is not None:
+            return cached
+
+        # Step 1: Preprocess (poor images are rejected here, before any OCR call)
+        prepared = await self.preprocess_image(image_data)
+        if prepared.hashes:
+            fingerprint.pixel_hash = prepared.hashes["pixel_hash"]
+            fingerprint.perceptual_hash = prepared.hashes["perceptual_hash"]
+
+        cached = await self.cache.get_similar(image_data, fingerprint)
+        if cached is not None:
+            return cached
 
         # Step 2: Extract text
-        ocr_result = await self.extract_text_google_vision(processed_image)
-
-        # Step 3: Validate
+        start = time.perf_counter()
+        ocr_result = await self.extract_text(prepared.data, engine=engine)
+        ocr_ms = round((time.perf_counter() - start) * 1000, 2)
+        pipeline_stats.record_stage("ocr", ocr_ms)
+
+        # Steps 3 and 4: Validate and structure
+        return await self._finish_document(image_data, fingerprint, prepared, ocr_result, ocr_ms)
+
+    async def _finish_document(
+        self,
+        image_data: bytes,
+        fingerprint: ImageFingerprint,
+        prepared: PreparedImage,
+        ocr_result: Dict[str, Any],
+        ocr_ms: float
+    ) -> Dict[str, Any]:
+        """Validate and structure an OCR result, then cache it"""
         validation = await self.validate_text(ocr_result)
+        if prepared.report:
+            validation["image_quality"] = prepared.report["quality"]
+            validation["preprocessing_steps"] = prepared.report["steps"]
+        validation["pipeline"] = {
+            "bytes_in": len(image_data),
+            "bytes_out": len(prepared.data),
+            "wire_format": prepared.format,
+            "reencoded": prepared.reencoded,
+            "stages": {**prepared.stages, "ocr": {"ms": ocr_ms}}
+        }
 
-        # Step 4: Structure
         structured_content = await self.structure_content(ocr_result)
 
-        return {
+        result = {
             "ocr_data": ocr_result,
             "processing_quality": validation,
             "content": structured_content
         }
+
+        # Fallback output is a placeholder, so only real extractions are cached
+        if ocr_result.get("extraction_method") != "fallback":
+            await self.cache.set(image_data, fingerprint, result)
+
+        return result
+
+    async def process_batch(
+        self,
+        images: List[bytes],
+        engine: Optional[str] = None,
+        content_hashes: Optional[List[Optional[str]]] = None,
+        owners: Optional[List[Optional[str]]] = None
+    ) -> List[Any]:
+        """
+        OCR a set of images (e.g. a class set of scans) with shared work:
+        - One parallel preprocessing pass over the process pool
+        - Cache hits are resolved first; only misses are sent to the OCR engines,
+          together, so Vision sees a few batch requests instead of one call per image
+        content_hashes and owners are per image, as in process_document()
+        Each result is a process_document()-style result or the exception for that image
+        """
+        content_hashes = content_hashes or [None] * len(images)
+        owners = owners or [None] * len(images)
+        policy = self.resolve_engine_policy(engine)
+        fingerprints = [
+            self.cache.fingerprint(image_data, content_hash, engine=policy, owner=owner)
+            for image_data, content_hash, owner in zip(images, content_hashes, owners)
+        ]
+        results: List[Any] = [await self.cache.get_exact(fp) for fp in fingerprints]
+
+        misses = [index for index, result in enumerate(results) if result is None]
+        prepared_images = await preprocess_batch([images[index] for index in misses])
+
+        to_ocr: Dict[int, PreparedImage] = {}
+        for index, prepared in zip(misses, prepared_images):
+            if isinstance(prepared, ImageQualityError):
+                results[index] = prepared
+                continue
+            if isinstance(prepared, Exception):
+                print(f"Image preprocessing error: {prepared}")
+                prepared = PreparedImage(images[index], "unknown")
+            else:
+                pipeline_stats.record(prepared, len(images[index]))
+                fingerprints[index].pixel_hash = prepared.hashes["pixel_hash"]
+                fingerprints[index].perceptual_hash = prepared.hashes["perceptual_hash"]
+
+            cached = await self.cache.get_similar(images[index], fingerprints[index])
+            if cached is not None:
+                results[index] = cached
+            else:
+                to_ocr[index] = prepared
+
+        if to_ocr:
+            start = time.perf_counter()
+            ocr_results = await self.extract_text_batch(
+                [prepared.data for prepared in to_ocr.values()], engine=engine
+            )
+            # Round trips are shared, so each image is charged an equal share of the time
+            ocr_ms = round((time.perf_counter() - start) * 1000 / len(to_ocr), 2)
+            for (index, prepared), ocr_result in zip(to_ocr.items(), ocr_results):
+                pipeline_stats.record_stage("ocr", ocr_ms)
+                results[index] = await self._finish_document(
+                    images[index], fingerprints[index], prepared, ocr_result, ocr_ms
+                )
+
+        return results
@@ -0,0 +1,181 @@
+"""
+Content Pre-generation - Speculative learning content built right after analysis
+The interventions the analysis recommends are generated (as one content pack) by a
+low-priority pipeline stage, so content requests can be served without waiting on
+the model; requests that don't match pre-built content still generate live
+"""
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+from sqlalchemy import func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal
+from app.models import Document, LearningContent
+from .concurrency import anthropic_limiter
+from .content_builder import build_content, generation_params
+from .game_service import GameService
+from .job_queue import Job, JobDeferred
+
+STAGE_PREGENERATE = "pregenerate"
+
+# Content type produced for each recommended intervention type
+INTERVENTION_CONTENT_TYPES = {
+    "quiz": "quiz",
+    "practice": "quiz",
+    "game": "game",
+    "review": "review",
+}
+
+
+def planned_content_types(analysis_results: Optional[Dict[str, Any]]) -> List[str]:
+    """Content types for the recommended interventions, in order, without repeats"""
+    interventions = (analysis_results or {}).get("recommended_interventions") or []
+    content_types = [
+        INTERVENTION_CONTENT_TYPES.get(str(intervention.get("type", "")).lower())
+        for intervention in interventions
+        if isinstance(intervention, dict)
+    ]
+    return [content_type for content_type in dict.fromkeys(content_types) if content_type]
+
+
+class ContentPregenerator:
+    """
+    Pipeline stage that pre-builds content, and the lookup that serves it
+    - Each user gets PREGENERATE_DAILY_BUDGET pre-built items per 24 hours
+    - The stage defers itself while Anthropic has fewer than PREGENERATE_RESERVED_SLOTS
+      free slots, so it never competes with live requests; after JOB_MAX_DEFERRALS
+      deferrals the document is skipped
+    """
+
+    def __init__(self):
+        self.game_service = GameService()
+        self.generated = 0
+        self.deferred = 0
+        self.hits = 0
+        self.misses = 0
+
+    async def _remaining_budget(self, db: AsyncSession, user_id: str) -> int:
+        used = await db.scalar(
+            select(func.count(LearningContent.id)).where(
+                LearningContent.user_id == user_id,
+                LearningContent.pregenerated.is_(True),
+                LearningContent.created_at >= datetime.utcnow() - timedelta(days=1)
+            )
+        )
+        return max(settings.PREGENERATE_DAILY_BUDGET - (used or 0), 0)
+
+    async def _prebuilt_types(self, db: AsyncSession, document_id: str) -> List[str]:
+        # Content types already pre-built for the document (e.g. by an earlier attempt)
+        content_types = await db.scalars(
+            select(LearningContent.content_type).where(
+                LearningContent.document_id == document_id,
+                LearningContent.pregenerated.is_(True)
+            )
+        )
+        return [getattr(content_type, "value", content_type) for content_type in content_types]
+
+    async def run(self, job: Job):
+        """Stage handler: pre-build the document's recommended content within budget"""
+        if not anthropic_limiter.has_capacity(settings.PREGENERATE_RESERVED_SLOTS):
+            self.deferred += 1
+            raise JobDeferred(settings.PREGENERATE_DEFER_SECONDS)
+
+        # Read what to build, then release the connection for the model call
+        async with AsyncSessionLocal() as db:
+            document = await db.get(Document, job.document_id)
+            if not document or document.processing_status != "completed":
+                return
+            prebuilt = await self._prebuilt_types(db, document.id)
+            content_types = [
+                content_type
+                for content_type in planned_content_types(document.analysis_results)
+                if content_type not in prebuilt
+            ]
+            content_types = content_types[:await self._remaining_budget(db, document.user_id)]
+            if not content_types:
+                return
+            homework_content = (document.ocr_data or {}).get("raw_text", "")
+            subject = document.subject
+            analysis_results = document.analysis_results or {}
+
+        # The endpoints' default request parameters, so default requests are served
+        topics = analysis_results.get("topics", [])
+        pack = await self.game_service.generate_content_pack(
+            homework_content=homework_content,
+            subject=subject,
+            analysis_results=analysis_results,
+            content_types=content_types,
+            topics=topics
+        )
+
+        async with AsyncSessionLocal() as db:
+            document = await db.get(Document, job.document_id)
+            if not document:
+                return
+            db.add_all([
+                build_content(
+                    document,
+                    content_type,
+                    data,
+                    generation_params(content_type, topics=topics),
+                    pregenerated=True
+                )
+                for content_type, data in pack.items()
+            ])
+            await db.commit()
+        self.generated += len(pack)
+
+    async def claim(
+        self,
+        db: AsyncSession,
+        document_id: str,
+        content_type: str,
+        generation: Dict[str, Any]
+    ) -> Optional[LearningContent]:
+        """
+        Take unclaimed pre-built content matching a request and mark it served
+        The claim is a conditional UPDATE, so concurrent requests never get the same item
+        Returns None on a miss; the caller then generates live
+        """
+        if not settings.PREGENERATE_CONTENT:
+            return None
+
+        candidates = (await db.scalars(
+            select(LearningContent)
+            .where(
+                LearningContent.document_id == document_id,
+                LearningContent.content_type == content_type,
+                LearningContent.pregenerated.is_(True),
+                LearningContent.claimed_at.is_(None)
+            )
+            .order_by(LearningContent.created_at)
+        )).all()
+
+        for content in candidates:
+            if (content.content_metadata or {}).get("generation") != generation:
+                continue
+            result = await db.execute(
+                update(LearningContent)
+                .where(LearningContent.id == content.id, LearningContent.claimed_at.is_(None))
+                .values(claimed_at=datetime.utcnow())
+            )
+            await db.commit()
+            if result.rowcount == 1:
+                self.hits += 1
+                return content
+
+        self.misses += 1
+        return None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": settings.PREGENERATE_CONTENT,
+            "generated": self.generated,
+            "deferred": self.deferred,
+            "hits": self.hits,
+            "misses": self.misses
+        }
+
+
+# Global pre-generator, registered as a pipeline stage when PREGENERATE_CONTENT is on
+content_pregenerator = ContentPregenerator()
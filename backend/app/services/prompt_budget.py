@@ -0,0 +1,130 @@
+"""
+Prompt Budget - Size limits and token accounting for Claude prompts
+OCR text is trimmed to OCR_TEXT_TOKEN_BUDGET before it is sent, and the token usage
+reported for every Messages API call (including prompt cache reads/writes) is
+counted per operation
+"""
+import re
+from typing import Any, Dict, List, Optional
+from app.core.config import settings
+
+# Rough characters-per-token ratios; Hebrew and other non-Latin scripts split into
+# far more tokens per character than English text
+_ASCII_CHARS_PER_TOKEN = 4.0
+_OTHER_CHARS_PER_TOKEN = 2.0
+
+_BLANK_LINES = re.compile(r"\n{3,}")
+_INLINE_SPACE = re.compile(r"[ \t\f\v]+")
+
+USAGE_FIELDS = (
+    "input_tokens",
+    "output_tokens",
+    "cache_creation_input_tokens",
+    "cache_read_input_tokens"
+)
+
+
+def estimate_tokens(text: str) -> int:
+    """Approximate token count of text, without calling the API"""
+    ascii_chars = sum(1 for char in text if char.isascii())
+    other_chars = len(text) - ascii_chars
+    return int(ascii_chars / _ASCII_CHARS_PER_TOKEN + other_chars / _OTHER_CHARS_PER_TOKEN) + 1
+
+
+def _compact(text: str) -> str:
+    # OCR output is full of padding: trailing spaces, runs of spaces and blank lines
+    lines = [_INLINE_SPACE.sub(" ", line).strip() for line in text.strip().splitlines()]
+    return _BLANK_LINES.sub("\n\n", "\n".join(lines))
+
+
+def _take_lines(lines: List[str], budget: int) -> List[str]:
+    taken, used = [], 0
+    for line in lines:
+        used += estimate_tokens(line)
+        if used > budget:
+            break
+        taken.append(line)
+    return taken
+
+
+def fit_document(text: str, budget: Optional[int] = None) -> str:
+    """
+    Fit OCR text into a token budget (OCR_TEXT_TOKEN_BUDGET by default)
+    - Whitespace is compacted first; that alone usually suffices
+    - Otherwise whole lines are kept from the start (2/3 of the budget) and the end
+      (1/3), so the instructions at the top and the last questions both survive,
+      with a marker where text was cut
+    The result is deterministic, so the same document always produces the same
+    prompt prefix and keeps hitting the prompt cache
+    """
+    budget = budget or settings.OCR_TEXT_TOKEN_BUDGET
+    text = _compact(text or "")
+    if budget <= 0 or estimate_tokens(text) <= budget:
+        return text
+
+    lines = text.splitlines()
+    head = _take_lines(lines, budget * 2 // 3)
+    tail = _take_lines(reversed(lines[len(head):]), budget - budget * 2 // 3)[::-1]
+    omitted = len(lines) - len(head) - len(tail)
+    if not head and not tail:
+        # A single enormous line: fall back to a character cut
+        return text[:int(budget * _OTHER_CHARS_PER_TOKEN)]
+    return "\n".join(head + [f"[... {omitted} lines omitted ...]"] + tail)
+
+
+def usage_counts(usage: Any) -> Dict[str, int]:
+    """Token counts from an API usage object (or dict), missing fields as 0"""
+    return {
+        field: int(
+            (usage.get(field) if isinstance(usage, dict) else getattr(usage, field, 0)) or 0
+        )
+        for field in USAGE_FIELDS
+    }
+
+
+class TokenUsage:
+    """Token counters per operation (analysis, quiz, game, review, hints, feedback)"""
+
+    def __init__(self):
+        self.by_operation: Dict[str, Dict[str, float]] = {}
+
+    def record(self, operation: str, usage: Any, latency_seconds: float):
+        """Add the usage object (or dict) of one API response"""
+        counts = usage_counts(usage)
+        totals = self.by_operation.setdefault(
+            operation, {"calls": 0, "latency_seconds": 0.0, **dict.fromkeys(USAGE_FIELDS, 0)}
+        )
+        totals["calls"] += 1
+        totals["latency_seconds"] += latency_seconds
+        for field, count in counts.items():
+            totals[field] += count
+
+        if settings.TOKEN_USAGE_LOG:
+            print(
+                f"Claude {operation}: {counts['input_tokens']} in "
+                f"(+{counts['cache_read_input_tokens']} cached, "
+                f"+{counts['cache_creation_input_tokens']} written to cache), "
+                f"{counts['output_tokens']} out, {latency_seconds:.2f}s"
+            )
+
+    def snapshot(self) -> Dict[str, Any]:
+        operations = {}
+        for operation, totals in self.by_operation.items():
+            prompt_tokens = (
+                totals["input_tokens"]
+                + totals["cache_read_input_tokens"]
+                + totals["cache_creation_input_tokens"]
+            )
+            operations[operation] = {
+                **{field: value for field, value in totals.items() if field != "latency_seconds"},
+                "average_latency_seconds": round(totals["latency_seconds"] / totals["calls"], 3),
+                "cache_read_ratio": (
+                    round(totals["cache_read_input_tokens"] / prompt_tokens, 3)
+                    if prompt_tokens else 0.0
+                )
+            }
+        return {"budget_tokens": settings.OCR_TEXT_TOKEN_BUDGET, "operations": operations}
+
+
+# Global usage counters shared by ClaudeService and GameService
+token_usage = TokenUsage()
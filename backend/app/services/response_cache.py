@@ -0,0 +1,107 @@
+"""
+AI Response Cache - Reuses Claude responses for identical prompts
+Keyed on a canonical fingerprint of model, system prompt, parameters and normalized content
+"""
+import copy
+import hashlib
+import json
+import random
+import re
+import unicodedata
+from typing import Dict, Any, Optional
+from app.core.config import settings
+from .cache import CacheStats, create_cache_backend
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_content(text: str) -> str:
+    """Canonical form of prompt text: Unicode NFKC with whitespace runs collapsed"""
+    return _WHITESPACE.sub(" ", unicodedata.normalize("NFKC", text or "")).strip()
+
+
+class ResponseCache:
+    """
+    Cache of parsed AI responses per endpoint
+    Each key holds up to AI_CACHE_VARIANTS[endpoint] responses; until that many exist,
+    a fraction of hits (AI_CACHE_VARIATION_RATE) are treated as misses so repeated
+    quizzes and games are not all identical
+    """
+
+    def __init__(self, backend=None):
+        self.enabled = settings.AI_CACHE_ENABLED
+        self.backend = backend or create_cache_backend(
+            settings.AI_CACHE_BACKEND, "ai", max_entries=settings.AI_CACHE_MAX_ENTRIES
+        )
+        self.ttl = settings.AI_CACHE_TTL_SECONDS
+        self.variation_rate = settings.AI_CACHE_VARIATION_RATE
+        self.variants = dict(settings.AI_CACHE_VARIANTS)
+        self.stats = CacheStats()
+
+    @staticmethod
+    def fingerprint(
+        endpoint: str,
+        model: str,
+        system: str,
+        content: str,
+        params: Optional[Dict[str, Any]] = None
+    ) -> str:
+        """Stable hash of everything that determines a response"""
+        canonical = json.dumps(
+            {
+                "endpoint": endpoint,
+                "model": model,
+                "system": normalize_content(system),
+                "params": params or {},
+                "content": normalize_content(content)
+            },
+            sort_keys=True,
+            ensure_ascii=False,
+            separators=(",", ":")
+        )
+        return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+    def _max_variants(self, endpoint: str) -> int:
+        return max(self.variants.get(endpoint, 1), 1)
+
+    async def get(self, endpoint: str, key: str) -> Optional[Dict[str, Any]]:
+        """Return a cached response for the key, or None when a fresh one should be generated"""
+        if not self.enabled:
+            return None
+
+        try:
+            variants = await self.backend.get(f"{endpoint}:{key}") or []
+        except Exception as e:
+            self.stats.error()
+            print(f"AI response cache lookup error: {e}")
+            return None
+
+        if not variants:
+            self.stats.miss(endpoint)
+            return None
+
+        # Sample a new variant occasionally until the variant pool is full
+        if len(variants) < self._max_variants(endpoint) and random.random() < self.variation_rate:
+            self.stats.miss(endpoint)
+            return None
+
+        self.stats.hit(endpoint)
+        return copy.deepcopy(random.choice(variants))
+
+    async def set(self, endpoint: str, key: str, response: Dict[str, Any]):
+        """Add a response to the key's variant pool, evicting the oldest when full"""
+        if not self.enabled:
+            return
+
+        try:
+            cache_key = f"{endpoint}:{key}"
+            variants = await self.backend.get(cache_key) or []
+            variants = (variants + [response])[-self._max_variants(endpoint):]
+            await self.backend.set(cache_key, variants, self.ttl)
+        except Exception as e:
+            self.stats.error()
+            print(f"AI response cache store error: {e}")
+
+
+# Global response cache shared by ClaudeService and GameService
+response_cache = ResponseCache()
@@ -0,0 +1,300 @@
+"""
+Document Storage - Where uploaded files live
+Local disk for development, S3 (or an S3-compatible MinIO/moto server) for production
+Writes are streamed chunk by chunk; reads by clients go through presigned URLs
+"""
+import asyncio
+import hashlib
+import hmac
+import os
+import time
+from typing import List, Optional
+from app.core.config import settings
+
+# S3 rejects multipart parts smaller than 5MB (except the last one)
+S3_MIN_PART_SIZE = 5 * 1024 * 1024
+S3_DELETE_BATCH_SIZE = 1000
+# Error codes head_bucket reports for a bucket that doesn't exist
+MISSING_BUCKET_CODES = {"404", "NoSuchBucket", "NotFound"}
+
+
+class StorageWriter:
+    """Receives an upload chunk by chunk; commit() makes it visible, abort() discards it"""
+
+    async def write(self, chunk: bytes):
+        raise NotImplementedError
+
+    async def commit(self) -> str:
+        raise NotImplementedError
+
+    async def abort(self):
+        raise NotImplementedError
+
+
+class StorageBackend:
+    """Base class for storage backends; objects are addressed by the URI commit() returns"""
+
+    name = "base"
+
+    def writer(self, key: str, content_type: Optional[str] = None) -> StorageWriter:
+        raise NotImplementedError
+
+    async def read(self, uri: str) -> bytes:
+        raise NotImplementedError
+
+    async def presigned_url(self, uri: str, expires_in: Optional[int] = None) -> str:
+        """Time-limited URL clients can fetch the object from directly"""
+        raise NotImplementedError
+
+    async def delete_many(self, uris: List[str]) -> int:
+        """Delete objects concurrently; returns the number of URIs processed"""
+        raise NotImplementedError
+
+    async def delete(self, uri: str):
+        await self.delete_many([uri])
+
+
+class LocalFileWriter(StorageWriter):
+    """Writes to a .part file off the event loop and renames it into place on commit"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.temp_path = f"{path}.part"
+        self._file = None
+
+    async def write(self, chunk: bytes):
+        if self._file is None:
+            self._file = await asyncio.to_thread(open, self.temp_path, "wb")
+        await asyncio.to_thread(self._file.write, chunk)
+
+    async def commit(self) -> str:
+        if self._file is None:
+            self._file = await asyncio.to_thread(open, self.temp_path, "wb")
+        await asyncio.to_thread(self._file.close)
+        await asyncio.to_thread(os.replace, self.temp_path, self.path)
+        return self.path
+
+    async def abort(self):
+        if self._file is not None:
+            await asyncio.to_thread(self._file.close)
+        if os.path.exists(self.temp_path):
+            await asyncio.to_thread(os.remove, self.temp_path)
+
+
+class LocalStorageBackend(StorageBackend):
+    """
+    Files under a local directory; URIs are relative paths such as uploads/<key>
+    Presigned URLs point at the /files endpoint and carry an HMAC signature,
+    mirroring S3 presigned URLs for development setups
+    """
+
+    name = "local"
+
+    def __init__(self, root: str):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    def writer(self, key: str, content_type: Optional[str] = None) -> StorageWriter:
+        return LocalFileWriter(os.path.join(self.root, key))
+
+    async def read(self, uri: str) -> bytes:
+        def read_file():
+            with open(uri, "rb") as f:
+                return f.read()
+
+        return await asyncio.to_thread(read_file)
+
+    def _signature(self, key: str, expires: int) -> str:
+        message = f"{key}:{expires}".encode("utf-8")
+        return hmac.new(settings.SECRET_KEY.encode("utf-8"), message, hashlib.sha256).hexdigest()
+
+    async def presigned_url(self, uri: str, expires_in: Optional[int] = None) -> str:
+        key = os.path.relpath(uri, self.root)
+        expires = int(time.time()) + (expires_in or settings.STORAGE_URL_EXPIRE_SECONDS)
+        return f"/api/v1/files/{key}?expires={expires}&signature={self._signature(key, expires)}"
+
+    def resolve_signed(self, key: str, expires: int, signature: str) -> Optional[str]:
+        """Path of a file for a valid, unexpired signed URL, else None"""
+        if expires < time.time():
+            return None
+        if not hmac.compare_digest(self._signature(key, expires), signature):
+            return None
+
+        root = os.path.realpath(self.root)
+        path = os.path.realpath(os.path.join(root, key))
+        if os.path.dirname(path) != root or not os.path.isfile(path):
+            return None
+        return path
+
+    async def delete_many(self, uris: List[str]) -> int:
+        def remove(uri: str):
+            if os.path.exists(uri):
+                os.remove(uri)
+
+        await asyncio.gather(*[asyncio.to_thread(remove, uri) for uri in uris])
+        return len(uris)
+
+
+class S3MultipartWriter(StorageWriter):
+    """
+    Streams an upload to S3 as a multipart upload of S3_MULTIPART_CHUNK_SIZE parts,
+    so at most one part is buffered in memory
+    Uploads smaller than one part are sent with a single PutObject
+    """
+
+    def __init__(self, backend: "S3StorageBackend", key: str, content_type: Optional[str]):
+        self.backend = backend
+        self.key = key
+        self.content_type = content_type or "application/octet-stream"
+        self.part_size = max(settings.S3_MULTIPART_CHUNK_SIZE, S3_MIN_PART_SIZE)
+        self._buffer = bytearray()
+        self._upload_id: Optional[str] = None
+        self._parts: List[dict] = []
+
+    async def _upload_part(self):
+        client = self.backend.client
+        if self._upload_id is None:
+            response = await asyncio.to_thread(
+                client.create_multipart_upload,
+                Bucket=self.backend.bucket, Key=self.key, ContentType=self.content_type
+            )
+            self._upload_id = response["UploadId"]
+
+        body = bytes(self._buffer)
+        self._buffer.clear()
+        part_number = len(self._parts) + 1
+        response = await asyncio.to_thread(
+            client.upload_part,
+            Bucket=self.backend.bucket, Key=self.key, UploadId=self._upload_id,
+            PartNumber=part_number, Body=body
+        )
+        self._parts.append({"ETag": response["ETag"], "PartNumber": part_number})
+
+    async def write(self, chunk: bytes):
+        self._buffer.extend(chunk)
+        if len(self._buffer) >= self.part_size:
+            await self._upload_part()
+
+    async def commit(self) -> str:
+        client = self.backend.client
+        if self._upload_id is None:
+            await asyncio.to_thread(
+                client.put_object,
+                Bucket=self.backend.bucket, Key=self.key,
+                Body=bytes(self._buffer), ContentType=self.content_type
+            )
+        else:
+            if self._buffer:
+                await self._upload_part()
+            await asyncio.to_thread(
+                client.complete_multipart_upload,
+                Bucket=self.backend.bucket, Key=self.key, UploadId=self._upload_id,
+                MultipartUpload={"Parts": self._parts}
+            )
+        self._buffer.clear()
+        return f"s3://{self.backend.bucket}/{self.key}"
+
+    async def abort(self):
+        self._buffer.clear()
+        if self._upload_id is not None:
+            await asyncio.to_thread(
+                self.backend.client.abort_multipart_upload,
+                Bucket=self.backend.bucket, Key=self.key, UploadId=self._upload_id
+            )
+
+
+class S3StorageBackend(StorageBackend):
+    """
+    Objects in the AWS_S3_BUCKET bucket; URIs are s3://<bucket>/<key>
+    Set AWS_S3_ENDPOINT_URL to use an S3-compatible server (MinIO, moto) instead of AWS
+    """
+
+    name = "s3"
+
+    def __init__(self, bucket: str, prefix: str = "uploads"):
+        self.bucket = bucket
+        self.prefix = prefix
+        self._client = None
+
+    @property
+    def client(self):
+        if self._client is None:
+            import boto3
+            self._client = boto3.client(
+                "s3",
+                region_name=settings.AWS_REGION,
+                endpoint_url=settings.AWS_S3_ENDPOINT_URL or None,
+                aws_access_key_id=settings.AWS_ACCESS_KEY_ID or None,
+                aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY or None
+            )
+        return self._client
+
+    def _key(self, uri: str) -> str:
+        return uri.split(f"s3://{self.bucket}/", 1)[-1]
+
+    async def ensure_bucket(self):
+        """Create the bucket if missing; used for local MinIO/moto stand-ins"""
+        from botocore.exceptions import ClientError
+
+        def create():
+            try:
+                self.client.head_bucket(Bucket=self.bucket)
+            except ClientError as error:
+                # Only a missing bucket is created; auth and network errors propagate
+                if error.response.get("Error", {}).get("Code") not in MISSING_BUCKET_CODES:
+                    raise
+                params = {"Bucket": self.bucket}
+                if settings.AWS_REGION != "us-east-1":
+                    params["CreateBucketConfiguration"] = {
+                        "LocationConstraint": settings.AWS_REGION
+                    }
+                self.client.create_bucket(**params)
+
+        await asyncio.to_thread(create)
+
+    def writer(self, key: str, content_type: Optional[str] = None) -> StorageWriter:
+        return S3MultipartWriter(self, f"{self.prefix}/{key}", content_type)
+
+    async def read(self, uri: str) -> bytes:
+        def get_object():
+            response = self.client.get_object(Bucket=self.bucket, Key=self._key(uri))
+            return response["Body"].read()
+
+        return await asyncio.to_thread(get_object)
+
+    async def presigned_url(self, uri: str, expires_in: Optional[int] = None) -> str:
+        # Signing is local computation, no request to S3
+        return self.client.generate_presigned_url(
+            "get_object",
+            Params={"Bucket": self.bucket, "Key": self._key(uri)},
+            ExpiresIn=expires_in or settings.STORAGE_URL_EXPIRE_SECONDS
+        )
+
+    async def delete_many(self, uris: List[str]) -> int:
+        keys = [{"Key": self._key(uri)} for uri in uris]
+        batches = [
+            keys[start:start + S3_DELETE_BATCH_SIZE]
+            for start in range(0, len(keys), S3_DELETE_BATCH_SIZE)
+        ]
+        await asyncio.gather(*[
+            asyncio.to_thread(
+                self.client.delete_objects,
+                Bucket=self.bucket, Delete={"Objects": batch, "Quiet": True}
+            )
+            for batch in batches
+        ])
+        return len(uris)
+
+
+def create_storage_backend(kind: Optional[str] = None) -> StorageBackend:
+    """Create the configured storage backend; S3 needs AWS_S3_BUCKET"""
+    kind = kind or settings.STORAGE_BACKEND
+    if kind == "s3":
+        if settings.AWS_S3_BUCKET:
+            return S3StorageBackend(settings.AWS_S3_BUCKET)
+        print("S3 storage selected but AWS_S3_BUCKET is not set, using local storage")
+    return LocalStorageBackend(settings.UPLOAD_DIR)
+
+
+# Global storage backend for uploaded documents
+storage = create_storage_backend()
@@ -0,0 +1,240 @@
+"""
+Structured Output - Tolerant JSON extraction and schema validation for model replies
+Replies are parsed even with a preamble, code fences or trailing commas, validated
+against the generated content schemas, and invalid fragments (a single question,
+say) are sent back to the model for repair instead of regenerating everything
+"""
+import json
+import re
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple, Type
+from pydantic import BaseModel, ValidationError
+from app.core.config import settings
+
+RepairFunc = Callable[[str], Awaitable[str]]
+
+_FENCE = re.compile(r"```(?:json)?\s*(.*?)```", re.DOTALL)
+_TRAILING_COMMA = re.compile(r",\s*([}\]])")
+_decoder = json.JSONDecoder()
+
+METRIC_FIELDS = (
+    "parsed",
+    "tolerant_extractions",
+    "parse_failures",
+    "retries",
+    "validation_failures",
+    "repairs",
+    "repaired",
+    "dropped_items",
+    "failures"
+)
+
+
+class StructuredOutputError(ValueError):
+    """
+    A reply that could not be turned into valid structured output
+    retryable is True when no JSON could be extracted at all (e.g. a truncated reply),
+    where asking again is the only remedy
+    """
+
+    def __init__(self, message: str, retryable: bool = False):
+        self.retryable = retryable
+        super().__init__(message)
+
+
+def extract_json(text: str) -> Tuple[Any, bool]:
+    """
+    First JSON value in a model reply
+    Returns (value, tolerant), tolerant being True when plain json.loads wasn't enough
+    Raises a retryable StructuredOutputError when there is no complete JSON value
+    """
+    try:
+        return json.loads(text), False
+    except ValueError:
+        pass
+
+    candidates = [match.group(1) for match in _FENCE.finditer(text)] + [text]
+    for candidate in candidates:
+        starts = sorted(
+            position for position in (candidate.find("{"), candidate.find("[")) if position >= 0
+        )
+        for start in starts:
+            for attempt in (candidate[start:], _TRAILING_COMMA.sub(r"\1", candidate[start:])):
+                try:
+                    return _decoder.raw_decode(attempt)[0], True
+                except ValueError:
+                    continue
+
+    raise StructuredOutputError("No complete JSON value in the response", retryable=True)
+
+
+def _fragment_path(location: Tuple[Any, ...]) -> Tuple[Any, ...]:
+    # The smallest repairable unit is the list item an error sits in (one question,
+    # one section); errors outside any list item need the whole value
+    for index, part in enumerate(location):
+        if isinstance(part, int):
+            return tuple(location[:index + 1])
+    return ()
+
+
+def _get(data: Any, path: Tuple[Any, ...]) -> Any:
+    for part in path:
+        data = data[part]
+    return data
+
+
+def _set(data: Any, path: Tuple[Any, ...], value: Any) -> Any:
+    if not path:
+        return value
+    _get(data, path[:-1])[path[-1]] = value
+    return data
+
+
+def _error_groups(error: ValidationError) -> Dict[Tuple[Any, ...], List[str]]:
+    groups: Dict[Tuple[Any, ...], List[str]] = {}
+    for detail in error.errors():
+        location = tuple(detail["loc"])
+        path = _fragment_path(location)
+        field = ".".join(str(part) for part in location[len(path):]) or "value"
+        groups.setdefault(path, []).append(f"{field}: {detail['msg']}")
+    return groups
+
+
+def repair_prompt(fragment: Any, problems: List[str]) -> str:
+    """Prompt asking the model to fix one invalid fragment of its previous reply"""
+    return f"""This JSON fragment from your previous answer does not match the required format:
+
+{json.dumps(fragment, ensure_ascii=False, indent=2)}
+
+Problems:
+{chr(10).join(f"- {problem}" for problem in problems)}
+
+Return the corrected fragment with the same structure and content, fixing only these problems.
+
+Respond with ONLY the JSON, no additional text."""
+
+
+class StructuredOutputParser:
+    """Parses and validates model replies, with metrics per endpoint"""
+
+    def __init__(self):
+        self.by_endpoint: Dict[str, Dict[str, int]] = {}
+
+    def count(self, endpoint: str, metric: str, amount: int = 1):
+        metrics = self.by_endpoint.setdefault(endpoint, dict.fromkeys(METRIC_FIELDS, 0))
+        metrics[metric] += amount
+
+    async def _repair(
+        self,
+        endpoint: str,
+        data: Any,
+        path: Tuple[Any, ...],
+        problems: List[str],
+        repair: RepairFunc
+    ) -> Any:
+        self.count(endpoint, "repairs")
+        try:
+            fixed, _ = extract_json(await repair(repair_prompt(_get(data, path), problems)))
+        except Exception as e:
+            print(f"Structured output repair failed ({endpoint}): {e}")
+            return data
+        return _set(data, path, fixed)
+
+    def _drop_invalid_items(self, endpoint: str, data: Any, error: ValidationError) -> bool:
+        # Remove list items that still fail, as long as every list keeps at least one
+        paths = [path for path in _error_groups(error) if path]
+        lists: Dict[Tuple[Any, ...], List[int]] = {}
+        for path in paths:
+            lists.setdefault(path[:-1], []).append(path[-1])
+        for parent, indexes in lists.items():
+            items = _get(data, parent)
+            if len(set(indexes)) >= len(items):
+                return False
+        for parent, indexes in lists.items():
+            items = _get(data, parent)
+            for index in sorted(set(indexes), reverse=True):
+                del items[index]
+            self.count(endpoint, "dropped_items", len(set(indexes)))
+        return bool(lists)
+
+    def _dump(self, endpoint: str, schema: Type[BaseModel], data: Any) -> Any:
+        result = schema.model_validate(data).model_dump(mode="json", exclude_none=True)
+        self.count(endpoint, "parsed")
+        return result
+
+    async def validate(
+        self,
+        endpoint: str,
+        data: Any,
+        schema: Type[BaseModel],
+        repair: Optional[RepairFunc] = None
+    ) -> Any:
+        """
+        Validate parsed data against schema and return it as plain JSON data
+        - With a repair function, each invalid fragment is sent back to the model once
+          (at most STRUCTURED_OUTPUT_MAX_REPAIRS fragments per reply)
+        - List items that are still invalid are then dropped
+        Raises StructuredOutputError if the data can't be made valid
+        """
+        try:
+            return self._dump(endpoint, schema, data)
+        except ValidationError as error:
+            self.count(endpoint, "validation_failures")
+            last_error = error
+
+        if repair and settings.STRUCTURED_OUTPUT_MAX_REPAIRS > 0:
+            groups = _error_groups(last_error)
+            if () in groups:
+                # The whole value is invalid; one repair covers every problem
+                groups = {(): [problem for problems in groups.values() for problem in problems]}
+            for path, problems in list(groups.items())[:settings.STRUCTURED_OUTPUT_MAX_REPAIRS]:
+                data = await self._repair(endpoint, data, path, problems, repair)
+            try:
+                result = self._dump(endpoint, schema, data)
+                self.count(endpoint, "repaired")
+                return result
+            except ValidationError as error:
+                last_error = error
+
+        if self._drop_invalid_items(endpoint, data, last_error):
+            try:
+                return self._dump(endpoint, schema, data)
+            except ValidationError as error:
+                last_error = error
+
+        self.count(endpoint, "failures")
+        raise StructuredOutputError(f"{endpoint} output failed validation: {last_error}")
+
+    def validate_item(self, endpoint: str, item: Any, schema: Type[BaseModel]) -> Optional[Any]:
+        """
+        Validate one element parsed from a stream (a question, a pack part)
+        Returns it as plain JSON data, or None (counted as dropped) if it is invalid
+        """
+        try:
+            return schema.model_validate(item).model_dump(mode="json", exclude_none=True)
+        except ValidationError:
+            self.count(endpoint, "dropped_items")
+            return None
+
+    async def parse(
+        self,
+        endpoint: str,
+        text: str,
+        schema: Type[BaseModel],
+        repair: Optional[RepairFunc] = None
+    ) -> Any:
+        """Extract the JSON value from a model reply and validate it (see validate())"""
+        try:
+            data, tolerant = extract_json(text)
+        except StructuredOutputError:
+            self.count(endpoint, "parse_failures")
+            raise
+        if tolerant:
+            self.count(endpoint, "tolerant_extractions")
+        return await self.validate(endpoint, data, schema, repair)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {endpoint: dict(metrics) for endpoint, metrics in self.by_endpoint.items()}
+
+
+# Global parser shared by ClaudeService and GameService
+structured_output = StructuredOutputParser()
@@ -0,0 +1,212 @@
+"""
+User Stats Service - Incrementally maintained dashboard aggregates
+Progress submissions and document uploads/deletes update one UserStats row per user
+in their own transaction; a full rebuild from history takes a single query
+"""
+from typing import Any, Dict, List, Optional
+from sqlalchemy import func, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.models import Document, LearningContent, User, UserProgress, UserStats
+from app.models.stats import RECENT_ACTIVITY_LIMIT
+
+# INSERT constructs with ON CONFLICT support, per database backend
+UPSERT_DIALECTS = {
+    "sqlite": sqlite.insert,
+    "postgresql": postgresql.insert,
+}
+
+
+def _enum_value(value: Any) -> Any:
+    return getattr(value, "value", value)
+
+
+def _activity(title: str, content_type: Any, score: float, completed_at) -> Dict[str, Any]:
+    return {
+        "content_title": title,
+        "content_type": _enum_value(content_type),
+        "score": score,
+        "completed_at": completed_at.isoformat() if completed_at else None
+    }
+
+
+class UserStatsService:
+    """
+    Reads and maintains UserStats rows
+    Update methods don't commit; they join the caller's transaction so the stats
+    change commits (or rolls back) together with the record it describes
+    """
+
+    async def _history(self, db: AsyncSession, user_id: str) -> List[Any]:
+        # The user row outer-joined to their progress and its content, newest first,
+        # with the document count as a scalar subquery; empty if the user doesn't exist
+        document_count = (
+            select(func.count(Document.id))
+            .where(Document.user_id == user_id)
+            .scalar_subquery()
+        )
+        rows = (await db.execute(
+            select(
+                document_count,
+                UserProgress.id,
+                UserProgress.score,
+                UserProgress.time_spent_seconds,
+                UserProgress.completed_at,
+                LearningContent.title,
+                LearningContent.content_type,
+                LearningContent.subject
+            )
+            .select_from(User)
+            .outerjoin(UserProgress, UserProgress.user_id == User.id)
+            .outerjoin(LearningContent, LearningContent.id == UserProgress.content_id)
+            .where(User.id == user_id)
+            .order_by(UserProgress.created_at.desc())
+        )).all()
+        return rows
+
+    async def _locked(self, db: AsyncSession, user_id: str) -> Optional[UserStats]:
+        # Row lock on PostgreSQL so concurrent submissions don't overwrite each other's
+        # counters; SQLite already serializes writers
+        return await db.scalar(
+            select(UserStats).where(UserStats.user_id == user_id).with_for_update()
+        )
+
+    async def _insert(self, db: AsyncSession, user_id: str, totals: Dict[str, Any]) -> bool:
+        """
+        Insert a user's stats row unless one exists (unique user_id)
+        Returns False if a concurrent request inserted it first
+        A Core INSERT ... ON CONFLICT DO NOTHING doesn't flush the session, so the caller's
+        pending rows stay out of a recount that follows
+        """
+        insert = UPSERT_DIALECTS[db.bind.dialect.name](UserStats.__table__)
+        result = await db.execute(
+            insert.values(user_id=user_id, **totals).on_conflict_do_nothing(
+                index_elements=[UserStats.user_id]
+            )
+        )
+        return result.rowcount == 1
+
+    async def rebuild(self, db: AsyncSession, user_id: str) -> Optional[UserStats]:
+        """
+        Recompute a user's stats from their full history in one query
+        Returns None if the user doesn't exist
+        Pending (unflushed) changes in the session are not included
+        """
+        rows = await self._history(db, user_id)
+        if not rows:
+            return None
+
+        stats = await self._locked(db, user_id)
+        if stats is None:
+            # Inserted fully populated, so the row is right even if the caller rolls back
+            if await self._insert(db, user_id, self._totals(rows)):
+                return await self._locked(db, user_id)
+            # Another request created the row meanwhile; take it over and recount,
+            # now including that request's committed changes
+            stats = await self._locked(db, user_id)
+            rows = await self._history(db, user_id)
+
+        for name, value in self._totals(rows).items():
+            setattr(stats, name, value)
+        return stats
+
+    def _totals(self, rows: List[Any]) -> Dict[str, Any]:
+        totals = {
+            "total_documents": rows[0][0] or 0,
+            "total_games_played": 0,
+            "total_quizzes_completed": 0,
+            "progress_count": 0,
+            "score_total": 0.0,
+            "total_time_seconds": 0
+        }
+        recent, subjects = [], {}
+
+        for _, progress_id, score, time_spent, completed_at, title, content_type, subject in rows:
+            if progress_id is None:
+                continue
+            totals["progress_count"] += 1
+            totals["score_total"] += score or 0.0
+            totals["total_time_seconds"] += time_spent or 0
+            if title is None:
+                # Progress on deleted content still counts towards score and time
+                continue
+
+            content_type = _enum_value(content_type)
+            if content_type == "game":
+                totals["total_games_played"] += 1
+            elif content_type == "quiz":
+                totals["total_quizzes_completed"] += 1
+            subjects[subject] = subjects.get(subject, 0) + 1
+            if len(recent) < RECENT_ACTIVITY_LIMIT:
+                recent.append(_activity(title, content_type, score, completed_at))
+
+        totals["recent_activities"] = recent
+        totals["subject_breakdown"] = subjects
+        return totals
+
+    async def _load_for_update(self, db: AsyncSession, user_id: str) -> Optional[UserStats]:
+        stats = await self._locked(db, user_id)
+        if stats is None:
+            stats = await self.rebuild(db, user_id)
+        return stats
+
+    async def get(self, db: AsyncSession, user_id: str) -> Optional[UserStats]:
+        """Stats row for a user, rebuilt and saved on first access; None for unknown users"""
+        stats = await db.scalar(select(UserStats).where(UserStats.user_id == user_id))
+        if stats is None:
+            stats = await self.rebuild(db, user_id)
+            if stats is not None:
+                await db.commit()
+        return stats
+
+    async def record_progress(
+        self,
+        db: AsyncSession,
+        progress: UserProgress,
+        content: LearningContent
+    ):
+        """Add a new (not yet flushed) progress record to its user's stats"""
+        stats = await self._load_for_update(db, progress.user_id)
+        if stats is None:
+            return
+
+        content_type = _enum_value(content.content_type)
+        if content_type == "game":
+            stats.total_games_played += 1
+        elif content_type == "quiz":
+            stats.total_quizzes_completed += 1
+
+        stats.progress_count += 1
+        stats.score_total += progress.score or 0.0
+        stats.total_time_seconds += progress.time_spent_seconds or 0
+
+        # JSON columns are replaced, not mutated in place, so the change is detected
+        activity = _activity(content.title, content_type, progress.score, progress.completed_at)
+        stats.recent_activities = (
+            [activity] + list(stats.recent_activities or [])
+        )[:RECENT_ACTIVITY_LIMIT]
+        subjects = dict(stats.subject_breakdown or {})
+        subjects[content.subject] = subjects.get(content.subject, 0) + 1
+        stats.subject_breakdown = subjects
+
+    async def record_documents(self, db: AsyncSession, user_id: str, count: int):
+        """Adjust a user's document count by count (negative for deletes) before commit"""
+        stats = await self._load_for_update(db, user_id)
+        if stats is not None:
+            stats.total_documents = max((stats.total_documents or 0) + count, 0)
+
+    def dashboard(self, stats: UserStats) -> Dict[str, Any]:
+        """DashboardResponse payload for a stats row"""
+        return {
+            "total_documents": stats.total_documents,
+            "total_games_played": stats.total_games_played,
+            "total_quizzes_completed": stats.total_quizzes_completed,
+            "average_score": float(stats.average_score),
+            "total_study_time_minutes": int(stats.total_time_seconds / 60),
+            "recent_activities": stats.recent_activities or [],
+            "subject_breakdown": stats.subject_breakdown or {}
+        }
+
+
+# Global stats service used by the progress and document endpoints
+user_stats = UserStatsService()
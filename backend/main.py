@@ -2,13 +2,26 @@
 Main FastAPI Application
 Interactive Homework Learning Platform
 """
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
-import os
 
-from app.core import settings, init_db
+from app.core import settings, init_db, close_db
+from app.core.database import count_queries
+from app.core.pagination import NEXT_CURSOR_HEADER
 from app.api import api_router
+from app.services import job_queue, document_processor
+from app.services.concurrency import ProviderBusyError, anthropic_limiter, vision_limiter
+from app.services.ocr_cache import ocr_cache
+from app.services.response_cache import response_cache
+from app.services.ocr_engines import OCR_ENGINES
+from app.services.image_preprocessing import pipeline_stats, shutdown_preprocess_pool
+from app.services.storage import S3StorageBackend, storage
+from app.services.engagement import engagement_counters
+from app.services.prompt_budget import token_usage
+from app.services.structured_output import structured_output
+from app.services.model_router import model_router
+from app.services.pregeneration import content_pregenerator
 
 # Create FastAPI application
 app = FastAPI(
@@ -25,11 +38,37 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER],
 )
 
-# Mount static files for uploads
-os.makedirs("uploads", exist_ok=True)
-app.mount("/uploads", StaticFiles(directory="uploads"), name="uploads")
+if settings.DB_QUERY_COUNT_HEADER:
+    @app.middleware("http")
+    async def count_db_queries(request: Request, call_next):
+        """
+        Report the number of SQL statements behind each response
+        Event streams are left out: their headers go out before the body's queries run
+        """
+        with count_queries() as queries:
+            response = await call_next(request)
+        if not response.headers.get("content-type", "").startswith("text/event-stream"):
+            response.headers["X-DB-Query-Count"] = str(queries.count)
+        return response
+
+
+@app.exception_handler(ProviderBusyError)
+async def provider_busy_handler(request: Request, exc: ProviderBusyError):
+    """
+    Shed load when an AI/OCR provider's wait queue is full
+    """
+    return JSONResponse(
+        status_code=503,
+        content={"detail": str(exc)},
+        headers={"Retry-After": str(exc.retry_after)}
+    )
+
+
+# Uploaded files are not served from the API process; clients fetch them through
+# presigned storage URLs (see GET /api/v1/documents/{id}/image)
 
 # Include API router
 app.include_router(api_router, prefix="/api/v1")
@@ -47,11 +86,34 @@ async def startup_event():
 
     # Initialize database
     try:
-        init_db()
+        await init_db()
         print("✅ Database initialized successfully")
     except Exception as e:
         print(f"❌ Database initialization failed: {e}")
 
+    # Start background document processing workers
+    try:
+        document_processor.register()
+        await job_queue.start()
+        print(f"✅ Document processing workers started ({type(job_queue.backend).__name__})")
+    except Exception as e:
+        print(f"❌ Job queue startup failed: {e}")
+
+    # Batched writes of content view/completion counters
+    try:
+        await engagement_counters.start()
+        print(f"✅ Engagement counters started ({type(engagement_counters.backend).__name__})")
+    except Exception as e:
+        print(f"❌ Engagement counters startup failed: {e}")
+
+    # Storage backend; S3-compatible stand-ins (MinIO, moto) get their bucket created
+    try:
+        if isinstance(storage, S3StorageBackend) and settings.AWS_S3_ENDPOINT_URL:
+            await storage.ensure_bucket()
+        print(f"✅ Document storage: {storage.name}")
+    except Exception as e:
+        print(f"❌ Document storage check failed: {e}")
+
     # Check API configurations
     if settings.ANTHROPIC_API_KEY:
         print("✅ Claude AI configured")
@@ -61,7 +123,12 @@ async def startup_event():
     if settings.GOOGLE_APPLICATION_CREDENTIALS:
         print("✅ Google Cloud Vision configured")
     else:
-        print("⚠️  Google Cloud Vision not configured - using fallback OCR")
+        print("⚠️  Google Cloud Vision not configured")
+
+    if OCR_ENGINES["tesseract"].available():
+        print(f"✅ Local OCR (Tesseract, {settings.OCR_LOCAL_LANGUAGES}) available")
+    else:
+        print("⚠️  Tesseract not installed - no offline OCR")
 
     print(f"🌐 Server running on http://{settings.HOST}:{settings.PORT}")
     print(f"📚 API Documentation: http://{settings.HOST}:{settings.PORT}/docs")
@@ -73,6 +140,13 @@ async def shutdown_event():
     Application shutdown event
     Cleanup resources
     """
+    await job_queue.stop()
+    await engagement_counters.stop()
+    anthropic_limiter.shutdown()
+    vision_limiter.shutdown()
+    OCR_ENGINES["tesseract"].shutdown()
+    shutdown_preprocess_pool()
+    await close_db()
     print(f"👋 Shutting down {settings.APP_NAME}")
 
 
@@ -98,7 +172,18 @@ async def health_check():
     return {
         "status": "healthy",
         "version": settings.APP_VERSION,
-        "environment": settings.ENVIRONMENT
+        "environment": settings.ENVIRONMENT,
+        "providers": [anthropic_limiter.stats(), vision_limiter.stats()],
+        "caches": {
+            "ocr": ocr_cache.stats.snapshot(),
+            "ai_responses": response_cache.stats.snapshot()
+        },
+        "image_pipeline": pipeline_stats.snapshot(),
+        "engagement_counters": await engagement_counters.stats(),
+        "token_usage": token_usage.snapshot(),
+        "structured_output": structured_output.snapshot(),
+        "model_routing": model_router.snapshot(),
+        "pregeneration": content_pregenerator.stats()
     }
 
 
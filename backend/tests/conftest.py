@@ -0,0 +1,51 @@
+"""
+Shared test fixtures
+Settings are read at import time, so the environment is pointed at a throwaway SQLite
+database and the in-process job queue before any app module is imported
+"""
+import os
+import tempfile
+
+_TEST_DIR = tempfile.mkdtemp(prefix="homework-tests-")
+
+os.environ.update({
+    "SECRET_KEY": "test-secret-key-with-at-least-32-characters",
+    "DATABASE_URL": f"sqlite:///{os.path.join(_TEST_DIR, 'test.db')}",
+    "JOB_QUEUE_BACKEND": "sqlite",
+    "JOB_QUEUE_SQLITE_PATH": ":memory:",
+    "ANTHROPIC_API_KEY": "",
+    "UPLOAD_DIR": os.path.join(_TEST_DIR, "uploads"),
+    "CACHE_DIR": os.path.join(_TEST_DIR, "cache"),
+    "TOKEN_USAGE_LOG": "False",
+})
+
+import pytest  # noqa: E402
+
+from app.core.database import AsyncSessionLocal, engine, init_db  # noqa: E402
+from app.models import User  # noqa: E402
+from app.models.base import Base  # noqa: E402
+
+
+@pytest.fixture
+async def db():
+    """A session on freshly created tables, dropped again after the test"""
+    await init_db()
+    async with AsyncSessionLocal() as session:
+        yield session
+    async with engine.begin() as connection:
+        await connection.run_sync(Base.metadata.drop_all)
+    await engine.dispose()
+
+
+@pytest.fixture
+async def user(db):
+    user = User(
+        username="student",
+        email="student@example.com",
+        hashed_password="not-a-real-hash",
+        grade_level="middle_school",
+        native_language="hebrew"
+    )
+    db.add(user)
+    await db.commit()
+    return user
@@ -0,0 +1,70 @@
+"""
+Answer key normalization: Unicode compatibility forms, Hebrew points and bidi marks,
+and numbers compared by value
+"""
+from types import SimpleNamespace
+
+import pytest
+
+from app.services.answer_key import (
+    ANSWER_KEY_VERSION, AnswerKey, compile_answer_key, normalize_answer
+)
+
+SHALOM = "שָׁלוֹם"  # shalom with niqqud
+SHALOM_PLAIN = "שלום"
+
+
+@pytest.mark.parametrize("answer, expected", [
+    ("１２", "12"),  # full-width digits
+    ("ﬁsh", "fish"),  # fi ligature
+    ("  Paris\t FRANCE ", "paris france"),
+    (SHALOM, SHALOM_PLAIN),
+    ("\u200f" + SHALOM_PLAIN + "\u200e", SHALOM_PLAIN),
+])
+def test_text_normalization(answer, expected):
+    assert normalize_answer(answer) == expected
+
+
+@pytest.mark.parametrize("answers", [
+    ["0.5", ".50", "1/2", "2/4", "1 / 2"],
+    ["3", "3.0", "+3", "6/2"],
+    ["1,000", "1000", "1000.00"],
+    ["-0.25", "-1/4"],
+])
+def test_equivalent_numbers(answers):
+    assert len({normalize_answer(answer) for answer in answers}) == 1
+
+
+@pytest.mark.parametrize("answer", ["1/0", "1.2.3", "12,34", "3 apples"])
+def test_non_numbers_compared_as_text(answer):
+    assert normalize_answer(answer) == answer
+
+
+def test_answer_key_grades_by_value():
+    content_json = {"questions": [
+        {"id": "q1", "correct_answer": "0.5", "points": 5},
+        {"id": "q2", "correct_answers": [SHALOM, "hello"]},
+        {"id": "q1", "correct_answer": "ignored duplicate"},
+    ]}
+    key = AnswerKey(compile_answer_key(content_json))
+
+    assert len(key) == 2
+    assert key.entry("q1") == {
+        "index": 0, "correct_answer": "0.5", "accepted": ["1/2"], "points": 5
+    }
+    assert key.is_correct("q1", "1/2")
+    assert not key.is_correct("q1", "ignored duplicate")
+    assert key.is_correct("q2", SHALOM_PLAIN)
+    assert key.is_correct("q2", " HELLO ")
+    assert not key.is_correct("q3", "hello")
+
+
+def test_outdated_key_is_recompiled():
+    content = SimpleNamespace(
+        content_json={"questions": [{"id": 1, "correct_answer": "4"}]},
+        answer_key={"version": ANSWER_KEY_VERSION - 1, "questions": {}}
+    )
+    key = AnswerKey.for_content(content)
+
+    assert key.is_correct(1, "4.0")
+    assert content.answer_key["version"] == ANSWER_KEY_VERSION
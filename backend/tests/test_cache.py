@@ -0,0 +1,47 @@
+"""
+Disk cache bounds: entries are pruned to max_entries and expired entries are removed
+"""
+import os
+import time
+
+from app.services.cache import DiskCacheBackend
+
+
+def _files(directory):
+    return [name for _, _, names in os.walk(directory) for name in names]
+
+
+async def test_disk_cache_prunes_least_recently_used(tmp_path):
+    cache = DiskCacheBackend(str(tmp_path), max_entries=10)
+    for index in range(10):
+        await cache.set(f"key-{index}", index)
+
+    # Reading key-0 makes it recently used, so key-1 is evicted first
+    time.sleep(0.01)
+    assert await cache.get("key-0") == 0
+    for index in range(10, 25):
+        await cache.set(f"key-{index}", index)
+
+    assert len(_files(tmp_path)) <= 10
+    assert cache.evictions >= 15
+    assert await cache.get("key-24") == 24
+    assert await cache.get("key-1") is None
+
+
+async def test_disk_cache_overwrite_does_not_count_twice(tmp_path):
+    cache = DiskCacheBackend(str(tmp_path), max_entries=3)
+    for _ in range(10):
+        await cache.set("same-key", "value")
+
+    assert cache.evictions == 0
+    assert await cache.get("same-key") == "value"
+
+
+async def test_disk_cache_removes_expired_entries_on_read(tmp_path):
+    cache = DiskCacheBackend(str(tmp_path), max_entries=10)
+    await cache.set("short-lived", "value", ttl=1)
+    assert len(_files(tmp_path)) == 1
+
+    time.sleep(1.1)
+    assert await cache.get("short-lived") is None
+    assert _files(tmp_path) == []
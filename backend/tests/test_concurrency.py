@@ -0,0 +1,85 @@
+"""
+Provider limiter timeouts: a per-call timeout (a model route's) replaces the provider's,
+the deadline covers the wait for a slot, and blocking calls that time out keep their
+slot until their thread finishes
+"""
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from app.services.concurrency import ProviderLimiter
+
+
+async def _slow_call(seconds: float) -> str:
+    await asyncio.sleep(seconds)
+    return "done"
+
+
+@pytest.fixture
+def limiter():
+    return ProviderLimiter("test", max_concurrency=2, max_pending=4, timeout=0.05)
+
+
+async def test_provider_timeout_applies_by_default(limiter):
+    with pytest.raises(asyncio.TimeoutError):
+        await limiter.call(_slow_call, 0.2)
+    assert limiter.timeouts == 1
+
+
+async def test_call_timeout_overrides_provider_timeout(limiter):
+    assert await limiter.call(_slow_call, 0.2, call_timeout=1.0) == "done"
+
+    with pytest.raises(asyncio.TimeoutError):
+        await limiter.call(_slow_call, 0.2, call_timeout=0.01)
+
+
+async def test_timeout_covers_wait_for_slot():
+    limiter = ProviderLimiter("test", max_concurrency=1, max_pending=4, timeout=5.0)
+    busy = asyncio.create_task(limiter.call(_slow_call, 0.5))
+    await asyncio.sleep(0.01)
+
+    started = time.monotonic()
+    with pytest.raises(asyncio.TimeoutError):
+        await limiter.call(_slow_call, 0.01, call_timeout=0.05)
+    assert time.monotonic() - started < 0.3
+    assert limiter.stats()["waiting"] == 0
+
+    assert await busy == "done"
+
+
+async def test_timed_out_blocking_calls_keep_their_slots():
+    limiter = ProviderLimiter("test", max_concurrency=2, max_pending=10, timeout=0.05)
+    # More workers than slots, so only the limiter bounds the running calls
+    executor = ThreadPoolExecutor(max_workers=8)
+    lock = threading.Lock()
+    running = []
+    peak = []
+
+    def blocking_call():
+        with lock:
+            running.append(1)
+            peak.append(len(running))
+        time.sleep(0.3)
+        with lock:
+            running.pop()
+        return "done"
+
+    for _ in range(3):
+        results = await asyncio.gather(
+            *[limiter.call_sync(blocking_call, executor=executor) for _ in range(2)],
+            return_exceptions=True
+        )
+        assert all(isinstance(result, asyncio.TimeoutError) for result in results)
+
+    assert max(peak) == 2
+    assert limiter.stats()["in_flight"] == 2
+
+    # The slots come back once the abandoned threads finish
+    await asyncio.sleep(0.4)
+    assert limiter.stats()["in_flight"] == 0
+    limiter.timeout = 1.0
+    assert await limiter.call_sync(blocking_call, executor=executor) == "done"
+    executor.shutdown()
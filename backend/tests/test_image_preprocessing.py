@@ -0,0 +1,69 @@
+"""
+Image quality gate: sparse but legible pages pass whatever their lighting, blurred
+and faint pages are rejected before OCR
+"""
+import cv2
+import numpy as np
+import pytest
+
+from app.core.config import settings
+from app.services.image_preprocessing import ImageQualityError, prepare_image, quality_score
+
+PAGE_SIZE = (1600, 1200)
+
+
+def _page(lines, ink=20, paper=235, blur=0.0, shadow=None):
+    page = np.full(PAGE_SIZE, paper, np.uint8)
+    for line in range(lines):
+        cv2.putText(
+            page, "2 + 3 = 5   x - 4 = 10", (80, 150 + line * 70),
+            cv2.FONT_HERSHEY_SIMPLEX, 1.2, ink, 2, cv2.LINE_AA
+        )
+    if blur:
+        page = cv2.GaussianBlur(page, (0, 0), blur)
+    if shadow:
+        # Light falling off towards the left edge, down to shadow / paper brightness
+        falloff = np.linspace(shadow / paper, 1.0, PAGE_SIZE[1])[None, :]
+        page = (page * falloff).astype(np.uint8)
+    return page
+
+
+def _passes(page):
+    return quality_score(page)["score"] >= settings.IMAGE_QUALITY_MIN_SCORE
+
+
+@pytest.mark.parametrize("page", [
+    _page(1),
+    _page(3),
+    _page(20),
+    _page(1, ink=110, paper=215),  # pencil
+    _page(1, shadow=140),
+    _page(20, shadow=140),
+], ids=["one-line", "three-lines", "full-page", "pencil", "shadowed-line", "shadowed-page"])
+def test_legible_pages_pass(page):
+    assert _passes(page)
+
+
+@pytest.mark.parametrize("page", [
+    _page(1, blur=3),
+    _page(20, blur=3),
+    _page(20, ink=190, paper=205),
+    _page(1, ink=190, paper=205),
+    _page(0),
+], ids=["blurred-line", "blurred-page", "faint-page", "faint-line", "blank"])
+def test_unreadable_pages_fail(page):
+    assert not _passes(page)
+
+
+def test_sharpness_independent_of_ink_darkness():
+    pen = quality_score(_page(3))["sharpness"]
+    pencil = quality_score(_page(3, ink=110, paper=215))["sharpness"]
+    assert pencil == pytest.approx(pen, rel=0.1)
+
+
+def test_prepare_image_rejects_blurred_photo():
+    ok, encoded = cv2.imencode(".png", _page(20, blur=5))
+    assert ok
+    with pytest.raises(ImageQualityError) as error:
+        prepare_image(encoded.tobytes())
+    assert error.value.report["quality"]["score"] < settings.IMAGE_QUALITY_MIN_SCORE
@@ -0,0 +1,150 @@
+"""
+Job queue retries, retry exhaustion, deferral limits and lease recovery on the
+in-process SQLite backend, and the analysis stage failing its job instead of completing
+with mock data
+"""
+import asyncio
+
+import pytest
+
+from app.models import Document
+from app.services.document_processor import STAGE_ANALYSIS, DocumentProcessor
+from app.services.job_queue import JobDeferred, JobQueue, SQLiteJobBackend
+
+STAGE = "test"
+WAIT_SECONDS = 10
+
+
+@pytest.fixture
+async def queue():
+    queue = JobQueue(backend=SQLiteJobBackend(":memory:"))
+    queue.max_attempts = 3
+    queue.retry_backoff = 0.01
+    yield queue
+    await queue.stop()
+
+
+async def test_failed_job_is_retried(queue):
+    attempts = []
+    done = asyncio.Event()
+
+    async def handler(job):
+        attempts.append(job.attempts)
+        if job.attempts == 1:
+            raise RuntimeError("temporary failure")
+        done.set()
+
+    queue.register(STAGE, handler)
+    await queue.enqueue(STAGE, "document-1")
+    await queue.start()
+    await asyncio.wait_for(done.wait(), WAIT_SECONDS)
+
+    assert attempts == [1, 2]
+
+
+async def test_exhausted_job_calls_failure_handler(queue):
+    attempts = []
+    failed = asyncio.Event()
+    failures = []
+
+    async def handler(job):
+        attempts.append(job.attempts)
+        raise RuntimeError(f"failure {job.attempts}")
+
+    async def on_failure(job):
+        failures.append(job)
+        failed.set()
+
+    queue.register(STAGE, handler, on_failure=on_failure)
+    await queue.enqueue(STAGE, "document-1")
+    await queue.start()
+    await asyncio.wait_for(failed.wait(), WAIT_SECONDS)
+
+    assert attempts == [1, 2, 3]
+    assert len(failures) == 1
+    assert failures[0].payload["last_error"] == "failure 3"
+    # The job is acknowledged, not retried again
+    assert await queue.backend.reserve(STAGE, 0) is None
+
+
+async def test_deferred_job_is_dropped_after_max_deferrals(queue):
+    calls = []
+
+    async def handler(job):
+        calls.append((job.attempts, job.deferrals))
+        raise JobDeferred(0.01)
+
+    queue.max_deferrals = 3
+    queue.register(STAGE, handler)
+    await queue.enqueue(STAGE, "document-1")
+    await queue.start()
+    for _ in range(WAIT_SECONDS * 10):
+        if len(calls) > queue.max_deferrals:
+            break
+        await asyncio.sleep(0.1)
+    # Longer than the deferral delay plus a worker poll, had the job been put back
+    await asyncio.sleep(0.5)
+
+    # Deferrals never use up attempts; the fourth one drops the job
+    assert calls == [(1, 0), (1, 1), (1, 2), (1, 3)]
+    assert await queue.backend.reserve(STAGE, 0) is None
+
+
+async def test_expired_lease_is_recovered():
+    backend = SQLiteJobBackend(":memory:")
+    queue = JobQueue(backend=backend)
+    job = await queue.enqueue(STAGE, "document-1")
+
+    # A worker reserves the job and crashes without acknowledging it
+    assert (await backend.reserve(STAGE, 0)).id == job.id
+    assert await backend.reserve(STAGE, 0) is None
+
+    # Still within the visibility timeout: the lease is respected
+    assert await backend.recover(STAGE, visibility_timeout=600) == 0
+    assert await backend.reserve(STAGE, 0) is None
+
+    await asyncio.sleep(0.05)
+    assert await backend.recover(STAGE, visibility_timeout=0.01) == 1
+    assert (await backend.reserve(STAGE, 0)).id == job.id
+    await backend.close()
+
+
+async def test_analysis_errors_fail_the_document(db, user, queue, monkeypatch):
+    document = Document(
+        user_id=user.id,
+        subject="mathematics",
+        raw_image_uri="uploads/page.jpg",
+        ocr_data={"raw_text": "2 + 2 = ?"},
+        processing_status="processing"
+    )
+    db.add(document)
+    await db.commit()
+
+    processor = DocumentProcessor(queue)
+    claude = processor.claude_service
+    calls = []
+
+    async def failing_generation(*args, **kwargs):
+        calls.append(args)
+        raise RuntimeError("model unavailable")
+
+    monkeypatch.setattr(claude, "enabled", True)
+    monkeypatch.setattr(claude, "_generate_structured", failing_generation)
+
+    failed = asyncio.Event()
+
+    async def mark_failed(job):
+        await processor.mark_failed(job)
+        failed.set()
+
+    queue.register(STAGE_ANALYSIS, processor.run_analysis, on_failure=mark_failed)
+    await queue.enqueue(STAGE_ANALYSIS, document.id)
+    await queue.start()
+    await asyncio.wait_for(failed.wait(), WAIT_SECONDS)
+
+    await db.refresh(document)
+    assert len(calls) == queue.max_attempts
+    assert document.processing_status == "error"
+    assert document.processing_attempts == queue.max_attempts
+    assert document.error_message == "model unavailable"
+    assert not document.analysis_results
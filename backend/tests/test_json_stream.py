@@ -0,0 +1,68 @@
+"""
+Streamed JSON parsing: array items are emitted as soon as their closing brace arrives,
+however the text is split into chunks, and braces inside strings or nested arrays
+don't confuse the scanner
+"""
+import json
+
+import pytest
+
+from app.services.json_stream import JSONItemStream
+
+QUESTIONS = [
+    {"id": "1", "question": "What is {x} if x = [2]?", "correct_answer": "2"},
+    {"id": "2", "question": 'Say "hi" \\ then }', "options": ["a", "b"], "meta": {"k": [1]}},
+    {"id": "3", "question": "שלום?", "questions": [{"id": "nested"}]},
+]
+DOCUMENT = {"title": "Quiz [1]", "notes": ["questions"], "questions": QUESTIONS, "after": {}}
+REPLY = "Here is your quiz:\n```json\n" + json.dumps(DOCUMENT, ensure_ascii=False) + "\n```"
+
+
+def _chunks(text, size):
+    return [text[start:start + size] for start in range(0, len(text), size)]
+
+
+def _closing_positions(text):
+    # Position of the last character of each question as it appears in the reply
+    positions, start = [], 0
+    for question in QUESTIONS:
+        encoded = json.dumps(question, ensure_ascii=False)
+        start = text.index(encoded, start) + len(encoded) - 1
+        positions.append(start)
+    return positions
+
+
+@pytest.mark.parametrize("size", [1, 2, 5, 17, len(REPLY)])
+def test_items_emitted_across_chunk_boundaries(size):
+    stream = JSONItemStream("questions")
+    items = []
+    for chunk in _chunks(REPLY, size):
+        items.extend(stream.feed(chunk))
+
+    assert items == QUESTIONS
+    assert stream.result() == DOCUMENT
+
+
+def test_each_item_emitted_on_its_closing_brace():
+    stream = JSONItemStream("questions")
+    emitted_at = [
+        position for position, char in enumerate(REPLY) for _ in stream.feed(char)
+    ]
+    assert emitted_at == _closing_positions(REPLY)
+
+
+def test_incomplete_stream():
+    stream = JSONItemStream("questions")
+    text = json.dumps(DOCUMENT)
+    items = stream.feed(text[:text.index('"id": "3"')])
+
+    assert items == QUESTIONS[:2]
+    with pytest.raises(ValueError):
+        stream.result()
+
+
+def test_other_array_key():
+    stream = JSONItemStream("sections")
+    document = {"questions": [{"id": "1"}], "sections": [{"topic": "a"}, {"topic": "b"}]}
+
+    assert stream.feed(json.dumps(document)) == document["sections"]
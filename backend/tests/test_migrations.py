@@ -0,0 +1,54 @@
+"""
+Alembic migrations: upgrading a database built at the initial revision yields exactly
+the models' schema, with engagement totals backfilled, and downgrades cleanly
+"""
+import pytest
+from alembic import command
+from alembic.autogenerate import compare_metadata
+from alembic.migration import MigrationContext
+from sqlalchemy import create_engine, inspect, text
+
+from app.core.database import INITIAL_REVISION, _alembic_config
+from app.models.base import Base
+
+LEGACY_ROWS = [
+    "INSERT INTO users VALUES ('user-1', '2024-01-01', '2024-01-01', 'student', "
+    "'student@example.com', 'hash', 'MIDDLE', 'HEBREW', '[]', '{}')",
+    "INSERT INTO documents (id, created_at, updated_at, user_id, subject, raw_image_uri) "
+    "VALUES ('document-1', '2024-01-01', '2024-01-01', 'user-1', 'MATHEMATICS', 'page.jpg')",
+    "INSERT INTO learning_contents (id, created_at, updated_at, document_id, user_id, "
+    "content_type, subject, title, content_json, completions, average_score) VALUES "
+    "('content-1', '2024-01-01', '2024-01-01', 'document-1', 'user-1', 'QUIZ', "
+    "'mathematics', 'Quiz', '{}', 4, 50.0)",
+]
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'migrations.db'}")
+    yield engine
+    engine.dispose()
+
+
+def test_upgrade_matches_models(engine):
+    with engine.begin() as connection:
+        command.upgrade(_alembic_config(connection), INITIAL_REVISION)
+        for statement in LEGACY_ROWS:
+            connection.execute(text(statement))
+
+    with engine.begin() as connection:
+        command.upgrade(_alembic_config(connection), "head")
+        context = MigrationContext.configure(connection, opts={"compare_type": True})
+        assert compare_metadata(context, Base.metadata) == []
+        row = connection.execute(
+            text("SELECT score_total, pregenerated FROM learning_contents")
+        ).one()
+        assert tuple(row) == (200.0, 0)
+
+
+def test_downgrade_to_base(engine):
+    with engine.begin() as connection:
+        command.upgrade(_alembic_config(connection), "head")
+    with engine.begin() as connection:
+        command.downgrade(_alembic_config(connection), "base")
+        assert inspect(connection).get_table_names() == ["alembic_version"]
@@ -0,0 +1,71 @@
+"""
+OCR cache scoping: near-duplicates stay within one user's uploads, and every entry is
+keyed by the OCR engine policy it was produced under
+"""
+import pytest
+
+from app.services.cache import MemoryCacheBackend
+from app.services.ocr_cache import OCRCache
+
+RESULT = {"ocr_data": {"raw_text": "1 + 1 = 2 (student A's answer)"}}
+PHASH = int("f0" * 32, 16)
+NEAR_PHASH = PHASH ^ 0b111  # 3 bits away, within OCR_CACHE_PHASH_DISTANCE
+
+
+@pytest.fixture
+def cache():
+    return OCRCache(backend=MemoryCacheBackend())
+
+
+def _fingerprint(cache, image, owner="student-a", engine="auto", pixel_hash=None, phash=PHASH):
+    fingerprint = cache.fingerprint(image, engine=engine, owner=owner)
+    fingerprint.pixel_hash = pixel_hash or f"pixels-of-{image.decode()}"
+    fingerprint.perceptual_hash = phash
+    return fingerprint
+
+
+async def _store(cache, image=b"worksheet-a", **kwargs):
+    await cache.set(image, _fingerprint(cache, image, **kwargs), RESULT)
+
+
+async def test_near_duplicate_served_to_same_user(cache):
+    await _store(cache)
+
+    fingerprint = _fingerprint(cache, b"worksheet-a-again", phash=NEAR_PHASH)
+    assert await cache.get_similar(b"worksheet-a-again", fingerprint) == RESULT
+
+
+async def test_near_duplicate_not_served_to_other_user(cache):
+    await _store(cache)
+
+    fingerprint = _fingerprint(cache, b"worksheet-b", owner="student-b", phash=NEAR_PHASH)
+    assert await cache.get_similar(b"worksheet-b", fingerprint) is None
+
+
+async def test_near_duplicate_needs_owner(cache):
+    await _store(cache, owner=None)
+
+    fingerprint = _fingerprint(cache, b"worksheet-a-again", owner=None, phash=NEAR_PHASH)
+    assert await cache.get_similar(b"worksheet-a-again", fingerprint) is None
+
+
+async def test_exact_matches_shared_between_users(cache):
+    await _store(cache)
+
+    fingerprint = _fingerprint(cache, b"worksheet-a", owner="student-b")
+    assert await cache.get_exact(fingerprint) == RESULT
+    fingerprint = _fingerprint(
+        cache, b"other-bytes", owner="student-b", pixel_hash="pixels-of-worksheet-a"
+    )
+    assert await cache.get_similar(b"other-bytes", fingerprint) == RESULT
+
+
+async def test_entries_keyed_by_engine(cache):
+    await _store(cache, engine="tesseract")
+
+    fingerprint = _fingerprint(cache, b"worksheet-a", engine="google_vision")
+    assert await cache.get_exact(fingerprint) is None
+    assert await cache.get_similar(b"worksheet-a", fingerprint) is None
+
+    fingerprint = _fingerprint(cache, b"worksheet-a", engine="tesseract")
+    assert await cache.get_exact(fingerprint) == RESULT
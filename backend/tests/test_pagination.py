@@ -0,0 +1,70 @@
+"""
+Keyset pagination: cursors round-trip, malformed cursors are a 400, and paging
+through rows that share a created_at returns every row exactly once
+"""
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi import HTTPException, Response
+from sqlalchemy import select
+
+from app.core.pagination import (
+    NEXT_CURSOR_HEADER, decode_cursor, encode_cursor, next_page, paginate
+)
+from app.models import Document
+
+CREATED_AT = datetime(2024, 5, 1, 12, 30, 15, 123456)
+
+
+def test_cursor_round_trip():
+    cursor = encode_cursor(CREATED_AT, "row-1")
+
+    assert "=" not in cursor
+    assert decode_cursor(cursor) == (CREATED_AT, "row-1")
+
+
+@pytest.mark.parametrize("cursor", ["not-a-cursor", "e30", encode_cursor(CREATED_AT, "x")[:-3]])
+def test_malformed_cursor_is_rejected(cursor):
+    with pytest.raises(HTTPException) as error:
+        decode_cursor(cursor)
+    assert error.value.status_code == 400
+
+
+async def _pages(db, limit):
+    pages, cursor = [], None
+    while True:
+        response = Response()
+        rows = (await db.scalars(paginate(select(Document), Document, cursor, limit))).all()
+        pages.append([document.id for document in next_page(rows, limit, response)])
+        cursor = response.headers.get(NEXT_CURSOR_HEADER)
+        if cursor is None:
+            return pages
+
+
+@pytest.mark.parametrize("limit", [1, 2, 3, 7])
+async def test_pages_cover_ties_on_created_at(db, user, limit):
+    # Five rows share one timestamp, so pages must break ties on id
+    timestamps = [CREATED_AT] * 5 + [CREATED_AT - timedelta(seconds=1)] * 2
+    documents = [
+        Document(
+            id=f"document-{index}",
+            user_id=user.id,
+            subject="mathematics",
+            raw_image_uri=f"uploads/{index}.jpg",
+            created_at=created_at
+        )
+        for index, created_at in enumerate(timestamps)
+    ]
+    db.add_all(documents)
+    await db.commit()
+
+    pages = await _pages(db, limit)
+
+    expected = sorted(
+        documents, key=lambda document: (document.created_at, document.id), reverse=True
+    )
+    assert [row_id for page in pages for row_id in page] == [
+        document.id for document in expected
+    ]
+    assert all(len(page) <= limit for page in pages)
+    assert len(pages) == -(-len(documents) // limit)
@@ -0,0 +1,102 @@
+"""
+Statement counts of the list and dashboard endpoints
+Each endpoint must run a fixed number of queries however many rows it returns
+"""
+import pytest
+from fastapi import Response
+
+from app.api.endpoints.content import list_document_content
+from app.api.endpoints.documents import list_documents
+from app.api.endpoints.progress import get_user_dashboard
+from app.core.database import count_queries
+from app.models import Document, LearningContent, UserProgress
+
+ROW_COUNTS = [1, 10]
+
+
+async def _add_documents(db, user, count):
+    documents = [
+        Document(
+            user_id=user.id,
+            subject="mathematics",
+            raw_image_uri=f"uploads/{index}.jpg",
+            ocr_data={"raw_text": f"page {index}"},
+            processing_status="completed"
+        )
+        for index in range(count)
+    ]
+    db.add_all(documents)
+    await db.flush()
+    return documents
+
+
+def _content(document, index):
+    return LearningContent(
+        document_id=document.id,
+        user_id=document.user_id,
+        content_type="quiz" if index % 2 else "game",
+        subject="mathematics",
+        title=f"Content {index}",
+        content_json={"questions": []}
+    )
+
+
+@pytest.mark.parametrize("count", ROW_COUNTS)
+async def test_list_documents_query_count(db, user, count):
+    for document in await _add_documents(db, user, count):
+        db.add_all([_content(document, 0), _content(document, 1)])
+    await db.commit()
+
+    with count_queries() as queries:
+        documents = await list_documents(
+            response=Response(), cursor=None, limit=20, include_ocr_data=False, db=db
+        )
+
+    assert len(documents) == count
+    assert all(len(document["generated_content"]["games"]) == 1 for document in documents)
+    # current user, the page, the page's content ids
+    assert queries.count == 3
+
+
+@pytest.mark.parametrize("count", ROW_COUNTS)
+async def test_list_document_content_query_count(db, user, count):
+    (document,) = await _add_documents(db, user, 1)
+    db.add_all([_content(document, index) for index in range(count)])
+    await db.commit()
+
+    with count_queries() as queries:
+        contents = await list_document_content(
+            document.id, content_type=None, include_content_json=False, db=db
+        )
+
+    assert len(contents) == count
+    assert all("content_json" not in content for content in contents)
+    assert queries.count == 1
+
+
+@pytest.mark.parametrize("count", ROW_COUNTS)
+async def test_dashboard_query_count(db, user, count):
+    (document,) = await _add_documents(db, user, 1)
+    contents = [_content(document, index) for index in range(count)]
+    db.add_all(contents)
+    await db.flush()
+    db.add_all([
+        UserProgress(user_id=user.id, content_id=content.id, score=80.0, time_spent_seconds=60)
+        for content in contents
+    ])
+    await db.commit()
+
+    # First access builds the stats row from the whole history
+    with count_queries() as queries:
+        dashboard = await get_user_dashboard(user.id, db=db)
+
+    assert dashboard["total_documents"] == 1
+    assert dashboard["total_games_played"] + dashboard["total_quizzes_completed"] == count
+    assert dashboard["average_score"] == 80.0
+    # stats lookup, history query, locked stats lookup, insert, lookup of the new row
+    assert queries.count == 5
+
+    # Later reads are a single row lookup
+    with count_queries() as queries:
+        assert await get_user_dashboard(user.id, db=db) == dashboard
+    assert queries.count == 1
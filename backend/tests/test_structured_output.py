@@ -0,0 +1,87 @@
+"""
+Structured output: tolerant JSON extraction from model replies, repair of just the
+invalid fragment, and dropping items that stay invalid
+"""
+import json
+
+import pytest
+
+from app.schemas.generation import QuizContent
+from app.services.structured_output import (
+    StructuredOutputError, StructuredOutputParser, extract_json
+)
+
+ENDPOINT = "quiz"
+
+
+def _question(question_id, question="What is 2 + 2?", **fields):
+    return {"id": question_id, "question": question, "correct_answer": "4", **fields}
+
+
+@pytest.fixture
+def parser():
+    return StructuredOutputParser()
+
+
+@pytest.mark.parametrize("reply, tolerant", [
+    ('{"a": [1, 2]}', False),
+    ('Here is the quiz:\n```json\n{"a": [1, 2]}\n```\nGood luck!', True),
+    ('Sure! {"a": [1, 2,],} Hope this helps', True),
+])
+def test_extract_json(reply, tolerant):
+    assert extract_json(reply) == ({"a": [1, 2]}, tolerant)
+
+
+def test_truncated_reply_is_retryable():
+    with pytest.raises(StructuredOutputError) as error:
+        extract_json('{"questions": [{"id": "1", "question": "What')
+    assert error.value.retryable
+
+
+async def test_valid_reply_is_normalized(parser):
+    reply = json.dumps({"questions": [_question(1, correct_answer=4)]})
+    quiz = await parser.parse(ENDPOINT, reply, QuizContent)
+
+    assert quiz["questions"][0]["id"] == "1"
+    assert quiz["questions"][0]["correct_answer"] == "4"
+    assert parser.snapshot()[ENDPOINT]["parsed"] == 1
+
+
+async def test_only_invalid_fragment_is_repaired(parser):
+    data = {"questions": [_question("1"), _question("2", question="")]}
+    prompts = []
+
+    async def repair(prompt):
+        prompts.append(prompt)
+        return json.dumps(_question("2", question="What is 3 + 1?"))
+
+    quiz = await parser.validate(ENDPOINT, data, QuizContent, repair=repair)
+
+    assert len(prompts) == 1
+    assert '"id": "2"' in prompts[0] and '"id": "1"' not in prompts[0]
+    assert "question:" in prompts[0]
+    assert [question["question"] for question in quiz["questions"]] == [
+        "What is 2 + 2?", "What is 3 + 1?"
+    ]
+    assert parser.snapshot()[ENDPOINT]["repaired"] == 1
+
+
+async def test_unrepairable_items_are_dropped(parser):
+    data = {"questions": [_question("1"), _question("2", question="")]}
+
+    async def failed_repair(prompt):
+        return "I can't do that"
+
+    quiz = await parser.validate(ENDPOINT, data, QuizContent, repair=failed_repair)
+
+    assert [question["id"] for question in quiz["questions"]] == ["1"]
+    assert parser.snapshot()[ENDPOINT]["dropped_items"] == 1
+
+
+async def test_fails_when_every_item_is_invalid(parser):
+    data = {"questions": [_question("1", question=""), {"id": "2"}]}
+
+    with pytest.raises(StructuredOutputError) as error:
+        await parser.validate(ENDPOINT, data, QuizContent)
+    assert not error.value.retryable
+    assert parser.snapshot()[ENDPOINT]["failures"] == 1
@@ -0,0 +1,121 @@
+"""
+Stats rows for users whose first requests race: both requests miss the row, one
+inserts it and the other takes it over instead of failing on the unique user_id,
+and the totals still match the rows they describe
+"""
+import asyncio
+
+import pytest
+from sqlalchemy import func, select
+
+from app.core.database import AsyncSessionLocal
+from app.models import Document, LearningContent, UserProgress, UserStats
+from app.services.user_stats import user_stats
+
+
+@pytest.fixture
+def inserted(monkeypatch):
+    """
+    Holds both racing requests after their first row lookup until each has missed the
+    row; yields the results of their inserts
+    """
+    barrier = asyncio.Barrier(2)
+    locked = user_stats._locked
+    insert = user_stats._insert
+    waiting = set()
+    results = []
+
+    async def racing_lookup(session, user_id):
+        stats = await locked(session, user_id)
+        if session not in waiting:
+            waiting.add(session)
+            await barrier.wait()
+        return stats
+
+    async def recording_insert(session, user_id, totals):
+        results.append(await insert(session, user_id, totals))
+        return results[-1]
+
+    monkeypatch.setattr(user_stats, "_locked", racing_lookup)
+    monkeypatch.setattr(user_stats, "_insert", recording_insert)
+    return results
+
+
+def _document(user, index=0):
+    return Document(
+        user_id=user.id,
+        subject="mathematics",
+        raw_image_uri=f"uploads/{index}.jpg",
+        processing_status="completed"
+    )
+
+
+async def _count(db, column):
+    return await db.scalar(select(func.count(column)))
+
+
+async def test_concurrent_first_access_creates_one_row(db, user, inserted):
+    db.add(_document(user))
+    await db.commit()
+
+    async def first_access():
+        async with AsyncSessionLocal() as session:
+            stats = await user_stats.get(session, user.id)
+            return stats.total_documents
+
+    assert await asyncio.gather(first_access(), first_access()) == [1, 1]
+    assert sorted(inserted) == [False, True]
+    assert await _count(db, UserStats.id) == 1
+
+
+async def test_concurrent_first_uploads_count_each_document_once(db, user, inserted):
+    async def upload(index):
+        async with AsyncSessionLocal() as session:
+            session.add(_document(user, index))
+            await user_stats.record_documents(session, user.id, 1)
+            await session.commit()
+
+    await asyncio.gather(upload(0), upload(1))
+
+    assert sorted(inserted) == [False, True]
+    stats = await db.scalar(select(UserStats))
+    assert stats.total_documents == await _count(db, Document.id) == 2
+
+
+async def test_concurrent_first_submissions_count_each_progress_once(db, user, inserted):
+    document = _document(user)
+    db.add(document)
+    await db.flush()
+    contents = [
+        LearningContent(
+            document_id=document.id,
+            user_id=user.id,
+            content_type=content_type,
+            subject="mathematics",
+            title=f"{content_type} 1",
+            content_json={"questions": []}
+        )
+        for content_type in ["game", "quiz"]
+    ]
+    db.add_all(contents)
+    await db.commit()
+
+    async def submit(content):
+        async with AsyncSessionLocal() as session:
+            progress = UserProgress(
+                user_id=user.id, content_id=content.id, score=60.0, time_spent_seconds=30
+            )
+            session.add(progress)
+            await user_stats.record_progress(session, progress, content)
+            await session.commit()
+
+    await asyncio.gather(*[submit(content) for content in contents])
+
+    assert sorted(inserted) == [False, True]
+    stats = await db.scalar(select(UserStats))
+    assert stats.progress_count == await _count(db, UserProgress.id) == 2
+    assert (stats.total_games_played, stats.total_quizzes_completed) == (1, 1)
+    assert stats.score_total == 120.0
+    assert stats.total_time_seconds == 60
+    assert stats.subject_breakdown == {"mathematics": 2}
+    assert len(stats.recent_activities) == 2
@@ -16,6 +16,33 @@ export default function DocumentDetail() {
     loadContents();
   }, [id]);
 
+  // Poll processing progress until the background pipeline finishes
+  useEffect(() => {
+    if (!document || !['pending', 'processing'].includes(document.processing_status)) {
+      return undefined;
+    }
+
+    const interval = setInterval(async () => {
+      try {
+        const response = await documentsAPI.getStatus(id);
+        const { status, progress_percentage } = response.data;
+        if (status === 'completed' || status === 'error') {
+          loadDocument();
+        } else {
+          setDocument((prev) => ({
+            ...prev,
+            processing_status: status,
+            processing_progress: progress_percentage,
+          }));
+        }
+      } catch (error) {
+        console.error('Error loading document status:', error);
+      }
+    }, 2000);
+
+    return () => clearInterval(interval);
+  }, [id, document?.processing_status]);
+
   const loadDocument = async () => {
     try {
       const response = await documentsAPI.get(id);
@@ -105,9 +132,34 @@ export default function DocumentDetail() {
             }`}
           >
             {document.processing_status}
+            {document.processing_status === 'processing' &&
+              ` (${document.processing_progress || 0}%)`}
           </span>
         </div>
 
+        {/* Original upload, served from storage via a presigned redirect */}
+        {document.raw_image_uri && (
+          <div className="mb-6">
+            {document.raw_image_uri.toLowerCase().endsWith('.pdf') ? (
+              <a
+                href={documentsAPI.imageUrl(id)}
+                target="_blank"
+                rel="noopener noreferrer"
+                className="text-primary-600 hover:underline font-medium"
+              >
+                View original PDF
+              </a>
+            ) : (
+              <img
+                src={documentsAPI.imageUrl(id)}
+                alt="Uploaded homework page"
+                loading="lazy"
+                className="max-h-96 rounded-xl border border-gray-200"
+              />
+            )}
+          </div>
+        )}
+
         {/* OCR Results */}
         {document.ocr_data && document.ocr_data.raw_text && (
           <div className="bg-gray-50 rounded-xl p-6">
@@ -15,6 +15,7 @@ export default function Upload() {
   const { getRootProps, getInputProps, isDragActive } = useDropzone({
     accept: {
       'image/*': ['.png', '.jpg', '.jpeg', '.webp'],
+      'application/pdf': ['.pdf'],
     },
     maxFiles: 1,
     onDrop: (acceptedFiles) => {
@@ -22,7 +23,11 @@ export default function Upload() {
         const file = acceptedFiles[0];
         setSelectedFile(file);
 
-        // Create preview
+        // Create preview (images only; PDFs are rendered server-side)
+        if (file.type === 'application/pdf') {
+          setPreview(null);
+          return;
+        }
         const reader = new FileReader();
         reader.onloadend = () => {
           setPreview(reader.result);
@@ -128,11 +133,18 @@ export default function Upload() {
           <div className="space-y-6">
             {/* Preview */}
             <div className="relative">
-              <img
-                src={preview}
-                alt="Preview"
-                className="w-full rounded-xl shadow-lg"
-              />
+              {preview ? (
+                <img
+                  src={preview}
+                  alt="Preview"
+                  className="w-full rounded-xl shadow-lg"
+                />
+              ) : (
+                <div className="w-full rounded-xl shadow-lg bg-gray-50 p-12 text-center">
+                  <FileImage className="w-16 h-16 mx-auto mb-4 text-gray-400" />
+                  <p className="font-medium text-gray-700">PDF document</p>
+                </div>
+              )}
               <button
                 onClick={clearFile}
                 className="absolute top-4 right-4 p-2 bg-red-500 text-white rounded-full hover:bg-red-600 transition-colors shadow-lg"
@@ -34,11 +34,18 @@ export const documentsAPI = {
     api.post('/documents/upload', formData, {
       headers: { 'Content-Type': 'multipart/form-data' },
     }),
-  list: (skip = 0, limit = 20) =>
-    api.get('/documents/', { params: { skip, limit } }),
+  uploadBatch: (formData) =>
+    api.post('/documents/batch', formData, {
+      headers: { 'Content-Type': 'multipart/form-data' },
+    }),
+  // Pages are cursor-based: pass the previous response's x-next-cursor header
+  list: (cursor = null, limit = 20) =>
+    api.get('/documents/', { params: { cursor, limit } }),
   get: (id) => api.get(`/documents/${id}`),
   getStatus: (id) => api.get(`/documents/${id}/status`),
   delete: (id) => api.delete(`/documents/${id}`),
+  deleteMany: (ids) => api.post('/documents/bulk-delete', { document_ids: ids }),
+  imageUrl: (id) => `${API_BASE_URL}/documents/${id}/image`,
 };
 
 // Content API
@@ -49,6 +56,8 @@ export const contentAPI = {
     api.post(`/content/${documentId}/quizzes`, { difficulty }),
   generateReview: (documentId, topics = []) =>
     api.post(`/content/${documentId}/review-materials`, { topics }),
+  generatePack: (documentId, contentTypes = ['quiz', 'game', 'review'], options = {}) =>
+    api.post(`/content/${documentId}/packs`, { content_types: contentTypes, ...options }),
   get: (contentId) => api.get(`/content/${contentId}`),
   listByDocument: (documentId) => api.get(`/content/document/${documentId}/all`),
 };
@@ -56,10 +65,11 @@ export const contentAPI = {
 // Progress API
 export const progressAPI = {
   submit: (data) => api.post('/progress/submit', data),
-  getUserProgress: (userId, skip = 0, limit = 50) =>
-    api.get(`/progress/user/${userId}`, { params: { skip, limit } }),
+  getUserProgress: (userId, cursor = null, limit = 50) =>
+    api.get(`/progress/user/${userId}`, { params: { cursor, limit } }),
   getDashboard: (userId) => api.get(`/progress/user/${userId}/dashboard`),
-  getContentProgress: (contentId) => api.get(`/progress/content/${contentId}`),
+  getContentProgress: (contentId, cursor = null, limit = 50) =>
+    api.get(`/progress/content/${contentId}`, { params: { cursor, limit } }),
 };
 
 export default api;